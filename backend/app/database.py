@@ -2,7 +2,7 @@ from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, DeclarativeBase
 import os
 
-DB_DIR = os.path.join(os.path.dirname(__file__), "..", "data")
+DB_DIR = os.getenv("CAFEPICK_DATA_DIR", os.path.join(os.path.dirname(__file__), "..", "data"))
 os.makedirs(DB_DIR, exist_ok=True)
 DB_PATH = os.path.join(DB_DIR, "cafepick.db")
 DATABASE_URL = f"sqlite:///{DB_PATH}"
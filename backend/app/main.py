@@ -1,11 +1,29 @@
-from fastapi import FastAPI
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from app.database import engine, Base
 from app.routes import cafes, areas
+from app.services import recommend_cache, refresher, resilience, shards, warmup
+from app.services.google_places import PlacesUnavailable, places_status
+from app.services.serialize import dumps, json_response
 
-Base.metadata.create_all(bind=engine)
+# Upstream calls made while serving a request give up once this has passed.
+REQUEST_DEADLINE_SECONDS = float(os.getenv("CAFEPICK_REQUEST_DEADLINE_SECONDS", "8"))
 
-app = FastAPI(title="CaféPick API", version="1.0.0")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm up off the event loop so /healthz answers while caches fill.
+    loop = asyncio.get_running_loop()
+    app.state.warmup = loop.run_in_executor(None, warmup.run_warmup)
+    # From here on Cafe Nomad is only called in the background.
+    refresher.start()
+    yield
+    refresher.stop()
+
+
+app = FastAPI(title="CaféPick API", version="1.0.0", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -15,6 +33,19 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+@app.middleware("http")
+async def request_deadline(request: Request, call_next):
+    with resilience.deadline(REQUEST_DEADLINE_SECONDS):
+        return await call_next(request)
+
+
+@app.exception_handler(PlacesUnavailable)
+async def places_unavailable(request: Request, exc: PlacesUnavailable):
+    # Nothing cached or local to fall back to: tell clients to retry, not that we broke.
+    return json_response(dumps({"detail": "Places is unavailable"}), status_code=503)
+
+
 app.include_router(cafes.router, prefix="/api")
 app.include_router(areas.router, prefix="/api")
 
@@ -22,3 +53,29 @@ app.include_router(areas.router, prefix="/api")
 @app.get("/")
 def root():
     return {"message": "CaféPick API is running"}
+
+
+@app.get("/healthz")
+def healthz():
+    return {"status": "ok"}
+
+
+@app.get("/readyz")
+def readyz():
+    state = warmup.state()
+    body = {"status": "ready" if state["ready"] else "warming", **state}
+    return json_response(dumps(body), status_code=200 if state["ready"] else 503)
+
+
+@app.get("/statusz")
+def statusz():
+    return json_response(
+        dumps(
+            {
+                "cafenomad": refresher.status(),
+                "places": places_status(),
+                "recommend_cache": recommend_cache.status(),
+                "shards": shards.get_manager().status(),
+            }
+        )
+    )
@@ -0,0 +1,15 @@
+from sqlalchemy import Column, String, Float, Integer, Text
+from app.database import Base
+
+
+class AreaSummary(Base):
+    """Per-city (district "") and per-district cafe counts, kept by the importer."""
+
+    __tablename__ = "area_summaries"
+
+    city = Column(String, primary_key=True)
+    district = Column(String, primary_key=True)  # "" for the whole city
+    cafe_count = Column(Integer, nullable=False, default=0)
+    mrt_counts = Column(Text)  # JSON {station: cafe count}
+    attributes = Column(Text)  # JSON {attribute: {value: cafe count}}
+    updated_at = Column(Float, nullable=False)
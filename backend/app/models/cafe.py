@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Float, Text, Boolean
+from sqlalchemy import Column, String, Float, Text, Boolean, Integer
 from app.database import Base
 
 
@@ -35,3 +35,16 @@ class Cafe(Base):
     # Special features
     limited_time = Column(String)  # "yes", "no", "maybe"
     standing_desk = Column(String)  # "yes", "no"
+
+    # Precomputed nearest transit station (scripts/compute_nearest_stations.py)
+    nearest_station_id = Column(String, index=True)
+    nearest_station = Column(String)
+    nearest_station_km = Column(Float)
+    nearest_station_walk_minutes = Column(Integer, index=True)
+    nearby_stations = Column(Text)  # JSON list of the next-nearest stations
+    station_version = Column(String)  # station set the columns were computed against
+    stations_computed_at = Column(Float)
+
+    # Catalog version (per city) of the import that last added or changed the
+    # row; see services/catalog_export.py.
+    version = Column(Integer, index=True)
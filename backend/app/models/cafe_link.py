@@ -0,0 +1,17 @@
+from sqlalchemy import Column, String, Float
+from app.database import Base
+
+
+class CafeLink(Base):
+    """A Google Places id resolved to the Cafe Nomad cafe it describes."""
+
+    __tablename__ = "cafe_links"
+
+    place_id = Column(String, primary_key=True)
+    cafe_id = Column(String, nullable=False, index=True)  # Cafe Nomad id (cafes.id)
+    city = Column(String, index=True)
+    score = Column(Float, nullable=False)
+    distance_m = Column(Float)
+    place_name = Column(String)
+    cafe_name = Column(String)
+    matched_at = Column(Float, nullable=False)
@@ -0,0 +1,17 @@
+from sqlalchemy import Column, String, Float, Integer
+from app.database import Base
+
+
+class CafeTombstone(Base):
+    """A cafe the importer removed from a city, kept so snapshot deltas can report it.
+
+    Keyed by (city, id): a cafe that moves between cities and is later deleted
+    leaves one tombstone in every city it left.
+    """
+
+    __tablename__ = "cafe_tombstones"
+
+    city = Column(String, primary_key=True)
+    id = Column(String, primary_key=True)  # Cafe Nomad id (cafes.id)
+    version = Column(Integer, nullable=False, index=True)  # catalog version of the removal
+    deleted_at = Column(Float, nullable=False)
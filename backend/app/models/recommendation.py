@@ -0,0 +1,14 @@
+from sqlalchemy import Column, String, Float, Text
+from app.database import Base
+
+
+class PrecomputedRecommendation(Base):
+    """Top recommendations for one filter set, written by scripts/precompute_recommendations.py."""
+
+    __tablename__ = "precomputed_recommendations"
+
+    key = Column(String, primary_key=True)  # recommend_cache.cache_key()
+    city = Column(String, nullable=False, index=True)
+    version = Column(String, nullable=False)  # recommend.data_version() it was built at
+    payload = Column(Text, nullable=False)  # JSON list of recommend_cafes entries
+    computed_at = Column(Float, nullable=False)
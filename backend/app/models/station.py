@@ -0,0 +1,17 @@
+from sqlalchemy import Column, String, Float, Boolean
+from app.database import Base
+
+
+class Station(Base):
+    __tablename__ = "stations"
+
+    id = Column(String, primary_key=True)  # Google Places id
+    name = Column(String, nullable=False, index=True)
+    city = Column(String, nullable=False, index=True)
+    latitude = Column(Float, nullable=False)
+    longitude = Column(Float, nullable=False)
+
+    # Stations are deactivated rather than deleted so the nearest-station job
+    # can tell which cafes a removal affects.
+    active = Column(Boolean, default=True)
+    updated_at = Column(Float, nullable=False, index=True)
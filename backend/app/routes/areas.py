@@ -1,16 +1,37 @@
-from typing import Optional
-from fastapi import APIRouter, Query
+from typing import Dict, Optional
+from fastapi import APIRouter, Query, Request
+from app.services import area_summary
 from app.services.google_places import CITY_NAMES, CITY_COORDS, get_city_districts
+from app.services.serialize import EncodedBody, dumps, encoded_response
 
 router = APIRouter(tags=["areas"])
 
+# Area payloads are serialized and compressed once per summary version (see
+# area_summary.version()). Key None is the all-cities list.
+_AREA_BODIES: Dict[Optional[str], EncodedBody] = {}
+_BODIES_VERSION: Dict[str, object] = {"version": None}
 
-@router.get("/areas")
-def get_areas(city: Optional[str] = Query(None)):
-    """Get cities list for Places API usage (no districts/mrt from Places)."""
+
+def _cafe_count(city: str) -> Optional[int]:
+    summary = area_summary.summary_for(city)
+    return summary.cafe_count if summary is not None else None
+
+
+def _build_areas(city: Optional[str]) -> dict:
     if city:
         if city not in CITY_COORDS:
             return {"areas": []}
+        summary = area_summary.summary_for(city)
+        if summary is not None:
+            area = summary.to_area(CITY_NAMES.get(city, city))
+            counted = {d["name"] for d in area["districts"]}
+            # Keep the full district list even where no cafe is listed yet.
+            area["districts"] += [
+                {"name": d, "cafe_count": 0, "mrt_stations": [], "attributes": {}}
+                for d in get_city_districts(city)
+                if d not in counted
+            ]
+            return {"areas": [area]}
         districts = [
             {"name": d, "mrt_stations": []} for d in get_city_districts(city)
         ]
@@ -30,10 +51,25 @@ def get_areas(city: Optional[str] = Query(None)):
         {
             "city": c,
             "city_name": CITY_NAMES.get(c, c),
-            "cafe_count": None,
+            "cafe_count": _cafe_count(c),
             "districts": [],
             "mrt_stations": [],
         }
         for c in CITY_COORDS.keys()
     ]
     return {"areas": result}
+
+
+@router.get("/areas")
+def get_areas(request: Request, city: Optional[str] = Query(None)):
+    """Cities with cafe counts, districts and MRT stations from the area summaries."""
+    key = city if city in CITY_COORDS else (None if not city else "")
+    version = area_summary.version()
+    if _BODIES_VERSION["version"] != version:
+        _AREA_BODIES.clear()
+        _BODIES_VERSION["version"] = version
+    body = _AREA_BODIES.get(key)
+    if body is None:
+        body = EncodedBody(dumps(_build_areas(city)))
+        _AREA_BODIES[key] = body
+    return encoded_response(body, request)
@@ -1,27 +1,41 @@
-from fastapi import APIRouter, Query, HTTPException
-from typing import Optional
+from fastapi import APIRouter, Depends, Path, Query, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from typing import List, Optional
+from pydantic import BaseModel, Field
+from sqlalchemy.orm import Session
+from app.database import get_db
+from app.models.cafe import Cafe
+from app.services import ratelimit, recommend_cache
+from app.services.catalog_export import export_city
+from app.services.cafenomad import CITIES
+from app.services.catchments import get_catchments
+from app.services.entity_match import attach_local
+from app.services.hours import now_slot, parse_open_at
+from app.services.serialize import (
+    dumps,
+    encoded_response,
+    join_array,
+    join_object,
+    json_response,
+)
+from app.services.shards import derived, get_snapshot, loaded_snapshots
+from app.services.tiles import MAX_TILE_ZOOM, ClusterIndex
 from app.services.google_places import (
     search_places,
-    search_places_near,
-    find_nearest_mrt,
     search_transit_points,
     has_cafes_near_transit,
 )
+from app.services.recommend import recommend_cafes
+from app.services.place_recommend import (
+    search_candidates,
+    recommend,
+    recommend_batch,
+    stream_recommendations,
+)
 
 router = APIRouter(tags=["cafes"])
 
 
-def _walk_distance_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
-    # Keep this route independent from private service helpers.
-    from math import radians, sin, cos, atan2, sqrt
-
-    earth_km = 6371.0
-    dlat = radians(lat2 - lat1)
-    dlng = radians(lng2 - lng1)
-    a = sin(dlat / 2) ** 2 + cos(radians(lat1)) * cos(radians(lat2)) * sin(dlng / 2) ** 2
-    return earth_km * 2 * atan2(sqrt(a), sqrt(1 - a))
-
-
 @router.get("/cafes")
 def get_cafes(
     city: Optional[str] = None,
@@ -31,14 +45,131 @@ def get_cafes(
     offset: int = Query(0, ge=0),
 ):
     if not city:
-        return {"total": 0, "cafes": []}
+        return json_response(dumps({"total": 0, "cafes": []}))
 
     keyword = query or district
     cafes = search_places(city, keyword, limit=limit + offset)
     total = len(cafes)
-    cafes = cafes[offset : offset + limit]
+    cafes = attach_local(city, cafes[offset : offset + limit])
 
-    return {"total": total, "cafes": cafes}
+    return json_response(dumps({"total": total, "cafes": cafes}))
+
+
+@router.get("/cafes/catalog")
+def get_catalog_cafes(
+    city: str = "taipei",
+    district: Optional[str] = None,
+    mrt_station: Optional[str] = None,
+    has_wifi: Optional[bool] = None,
+    has_socket: Optional[bool] = None,
+    reservable: Optional[bool] = None,
+    quiet_level: Optional[str] = None,
+    max_price: Optional[float] = None,
+    limited_time: Optional[str] = None,
+    open_now: bool = False,
+    open_at: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
+    offset: int = Query(0, ge=0),
+):
+    """Cafe Nomad catalog with attribute filters, served from pre-serialized records.
+
+    open_at takes a Taipei-local ISO datetime or a time today ("14:30").
+    Cafes whose hours could not be parsed never match open_now / open_at.
+    """
+    open_slot = None
+    if open_at:
+        try:
+            open_slot = parse_open_at(open_at)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid open_at")
+    elif open_now:
+        open_slot = now_slot()
+
+    snap = get_snapshot(city)
+    if snap is None:
+        return json_response(dumps({"total": 0, "cafes": []}))
+
+    filters = {
+        "district": district,
+        "mrt_station": mrt_station,
+        "has_wifi": has_wifi,
+        "has_socket": has_socket,
+        "reservable": reservable,
+        "quiet_level": quiet_level,
+        "max_price": max_price,
+        "limited_time": limited_time,
+    }
+    positions = snap.filter_positions(filters, open_slot)
+    page = positions[offset : offset + limit]
+    return json_response(
+        join_object([("total", dumps(len(positions))), ("cafes", snap.render(page))])
+    )
+
+
+@router.get("/cafes/search")
+def search_cafes(
+    q: str = Query(..., min_length=1, max_length=100),
+    city: Optional[str] = None,
+    prefix: bool = False,
+    limit: int = Query(10, ge=1, le=50),
+):
+    """Typo-tolerant name search over the Cafe Nomad catalog; prefix=true for autocomplete.
+
+    Without a city, every city currently in memory is searched."""
+    if city:
+        snap = get_snapshot(city)
+        snaps = [snap] if snap is not None else []
+    else:
+        snaps = loaded_snapshots()
+    hits = []
+    for snap in snaps:
+        for position, score in snap.name_index.search(q, limit=limit, prefix=prefix):
+            hits.append((score, snap, position))
+    hits.sort(key=lambda hit: -hit[0])
+    results = join_array(
+        join_object([("score", dumps(score)), ("cafe", snap.fragments[position])])
+        for score, snap, position in hits[:limit]
+    )
+    return json_response(join_object([("query", dumps(q)), ("results", results)]))
+
+
+@router.get("/cafes/tiles/{z}/{x}/{y}")
+def get_cafe_tile(
+    request: Request,
+    z: int = Path(..., ge=0, le=MAX_TILE_ZOOM),
+    x: int = Path(..., ge=0),
+    y: int = Path(..., ge=0),
+    city: str = "taipei",
+):
+    """Clustered catalog cafes in one Web Mercator map tile.
+
+    clusters are [lat, lng, count, expansion_zoom], points are
+    [id, name, lat, lng]; tiles are cached and carry an ETag.
+    """
+    if x >= 2**z or y >= 2**z:
+        raise HTTPException(status_code=400, detail="Tile out of range")
+    index = derived(city, "tiles", lambda snap: ClusterIndex(snap.cafes))
+    if index is None:
+        raise HTTPException(status_code=404, detail="Unknown city")
+    return encoded_response(index.tile(z, x, y), request, max_age=300)
+
+
+@router.get("/cafes/snapshot")
+def get_city_snapshot(
+    request: Request,
+    city: str = "taipei",
+    since: Optional[int] = Query(None, ge=0),
+    db: Session = Depends(get_db),
+):
+    """The city's imported catalog, versioned, for clients that filter locally.
+
+    cafes are arrays in the order of fields. With since=<version> only cafes
+    changed after it and deleted ids are listed; full=true means the client
+    must replace its copy instead.
+    """
+    if city not in CITIES:
+        raise HTTPException(status_code=404, detail="Unknown city")
+    return encoded_response(export_city(db, city, since), request, max_age=60)
 
 
 @router.get("/cafes/recommend")
@@ -53,49 +184,106 @@ def get_recommendations(
     top_n: int = Query(5, ge=1, le=10),
 ):
     keyword = query or district
-    if transit_lat is not None and transit_lng is not None:
-        cafes = search_places_near(
-            city=city,
-            latitude=transit_lat,
-            longitude=transit_lng,
-            district=keyword,
-            limit=min(max(top_n * 3, top_n), 20),
-        )
-    else:
-        cafes = search_places(city, keyword, limit=top_n)
+    cafes = search_candidates(
+        city, keyword, query, transit_lat, transit_lng, top_n, transit_name, max_walk_minutes
+    )
+    enriched = recommend(cafes, transit_lat, transit_lng, transit_name, max_walk_minutes, top_n)
+    return json_response(dumps({"recommendations": enriched}))
 
-    if query:
-        q = query.strip().lower()
-        cafes.sort(
-            key=lambda c: 0 if q and q in (c.get("name") or "").lower() else 1
-        )
-    enriched = []
-    for cafe in cafes:
-        if cafe.get("latitude") and cafe.get("longitude"):
-            if transit_lat is not None and transit_lng is not None and transit_name:
-                dist = _walk_distance_km(
-                    cafe["latitude"], cafe["longitude"], transit_lat, transit_lng
-                )
-                walk_minutes = int(round((dist / 5) * 60))
-                if max_walk_minutes is not None and walk_minutes > max_walk_minutes:
-                    continue
-                cafe = dict(cafe)
-                cafe["transit_name"] = transit_name
-                cafe["transit_distance_km"] = round(dist, 2)
-                cafe["transit_walk_minutes"] = walk_minutes
-            else:
-                mrt = find_nearest_mrt(cafe["latitude"], cafe["longitude"])
-                if mrt:
-                    if max_walk_minutes is not None and mrt["walk_minutes"] > max_walk_minutes:
-                        continue
-                    cafe = dict(cafe)
-                    cafe["mrt_station"] = mrt["name"]
-                    cafe["mrt_distance_km"] = mrt["distance_km"]
-                    cafe["mrt_walk_minutes"] = mrt["walk_minutes"]
-        enriched.append({"cafe": cafe, "score": None, "distance_km": None})
-        if len(enriched) >= top_n:
-            break
-    return {"recommendations": enriched}
+
+@router.get("/cafes/recommend/local")
+def get_local_recommendations(
+    city: Optional[str] = None,
+    district: Optional[str] = None,
+    wifi: Optional[float] = Query(None, ge=0, le=5),
+    socket: Optional[float] = Query(None, ge=0, le=5),
+    quiet: Optional[float] = Query(None, ge=0, le=5),
+    cheap: Optional[float] = Query(None, ge=0, le=5),
+    mrt: Optional[str] = None,
+    limited_time: Optional[str] = None,
+    max_walk_minutes: Optional[int] = Query(None, ge=1, le=60),
+    latitude: Optional[float] = None,
+    longitude: Optional[float] = None,
+    top_n: int = Query(3, ge=1, le=10),
+    db: Session = Depends(get_db),
+):
+    """Score-ranked recommendations from the local catalog (recommend.py).
+
+    Common filter sets are answered from precomputed results (recommend_cache.py).
+    """
+    filters = {
+        "city": city,
+        "district": district,
+        "wifi": wifi,
+        "socket": socket,
+        "quiet": quiet,
+        "cheap": cheap,
+        "mrt": mrt,
+        "limited_time": limited_time,
+        "max_walk_minutes": max_walk_minutes,
+        "latitude": latitude,
+        "longitude": longitude,
+    }
+    cached = recommend_cache.lookup(filters, top_n)
+    if cached is not None:
+        return json_response(join_object([("recommendations", cached)]))
+    return json_response(dumps({"recommendations": recommend_cafes(db, filters, top_n)}))
+
+
+@router.get("/cafes/recommend/stream")
+def stream_recommendations_ndjson(
+    city: str = "taipei",
+    district: Optional[str] = None,
+    query: Optional[str] = None,
+    transit_lat: Optional[float] = None,
+    transit_lng: Optional[float] = None,
+    transit_name: Optional[str] = None,
+    max_walk_minutes: Optional[int] = Query(None, ge=1, le=60),
+    top_n: int = Query(5, ge=1, le=10),
+):
+    """Same results as /cafes/recommend, one NDJSON line per cafe once it is sure to be one.
+
+    Lines arrive in completion order; each carries its `rank` for sorting.
+    """
+    keyword = query or district
+    cafes = search_candidates(
+        city, keyword, query, transit_lat, transit_lng, top_n, transit_name, max_walk_minutes
+    )
+
+    def lines():
+        for entry in stream_recommendations(
+            cafes, transit_lat, transit_lng, transit_name, max_walk_minutes, top_n
+        ):
+            yield dumps(entry) + b"\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+class RecommendSpec(BaseModel):
+    id: Optional[str] = None
+    city: str = "taipei"
+    district: Optional[str] = None
+    query: Optional[str] = None
+    transit_lat: Optional[float] = None
+    transit_lng: Optional[float] = None
+    transit_name: Optional[str] = None
+    max_walk_minutes: Optional[int] = Field(None, ge=1, le=60)
+    top_n: int = Field(5, ge=1, le=10)
+
+
+class RecommendBatch(BaseModel):
+    specs: List[RecommendSpec] = Field(..., min_length=1, max_length=20)
+
+
+@router.post("/cafes/recommend/batch")
+def get_batch_recommendations(batch: RecommendBatch):
+    """Recommendations for several locations at once, keyed by spec id (or list index)."""
+    specs = []
+    for i, spec in enumerate(batch.specs):
+        data = spec.model_dump()
+        data["id"] = spec.id if spec.id is not None else str(i)
+        specs.append(data)
+    return json_response(dumps({"results": recommend_batch(specs)}))
 
 
 @router.get("/transit")
@@ -109,24 +297,73 @@ def get_transit_points(
 ):
     points = search_transit_points(city, district, query=query, limit=limit)
     if only_with_cafes:
+        try:
+            catchments = get_catchments()
+        except Exception:
+            catchments = None
         filtered = []
         for point in points:
             lat = point.get("latitude")
             lng = point.get("longitude")
             if lat is None or lng is None:
                 continue
-            if has_cafes_near_transit(
-                city=city,
-                district=district,
-                transit_lat=lat,
-                transit_lng=lng,
-                max_walk_minutes=max_walk_minutes,
-            ):
+            # Precomputed catchments answer local stations without a Places call.
+            nearby = None
+            if catchments is not None:
+                station_id = catchments.station_for(point.get("id", ""), lat, lng)
+                if station_id is not None:
+                    nearby = catchments.has_cafes_within(station_id, max_walk_minutes)
+            if nearby is None:
+                # Fan-out that only filters the list: yields to interactive calls.
+                with ratelimit.lane("enrichment"):
+                    nearby = has_cafes_near_transit(
+                        city=city,
+                        transit_lat=lat,
+                        transit_lng=lng,
+                        max_walk_minutes=max_walk_minutes,
+                    )
+            if nearby:
                 filtered.append(point)
         points = filtered
-    return {"transit_points": points}
+    return json_response(dumps({"transit_points": points}))
+
+
+@router.get("/transit/{station_id}/cafes")
+def get_station_cafes(
+    station_id: str,
+    max_walk_minutes: int = Query(10, ge=1, le=20),
+    limit: int = Query(50, ge=1, le=200),
+    db: Session = Depends(get_db),
+):
+    """Local catalog cafes within walking distance of a station, nearest first."""
+    hits = get_catchments().cafes_within(station_id, max_walk_minutes)[:limit]
+    rows = {c.id: c for c in db.query(Cafe).filter(Cafe.id.in_([cid for cid, _ in hits]))}
+    cafes = []
+    for cafe_id, minutes in hits:
+        row = rows.get(cafe_id)
+        if row is None:
+            continue
+        cafes.append(
+            {
+                "id": row.id,
+                "name": row.name,
+                "address": row.address,
+                "latitude": row.latitude,
+                "longitude": row.longitude,
+                "wifi": row.wifi,
+                "socket": row.socket,
+                "quiet": row.quiet,
+                "limited_time": row.limited_time,
+                "walk_minutes": minutes,
+            }
+        )
+    return json_response(dumps({"station_id": station_id, "cafes": cafes}))
 
 
 @router.get("/cafes/{cafe_id}")
 def get_cafe(cafe_id: str):
+    for snap in loaded_snapshots():
+        fragment = snap.fragment(cafe_id)
+        if fragment is not None:
+            return json_response(fragment)
     raise HTTPException(status_code=404, detail="Cafe not found")
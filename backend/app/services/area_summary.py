@@ -0,0 +1,237 @@
+"""
+Materialized area summaries: per-city and per-district cafe counts, MRT
+station lists and attribute distributions.
+
+Summaries are maintained incrementally instead of being recomputed per
+request: the Cafe Nomad cache applies the diff between the old and new city
+lists on every refresh, and scripts/import_cafenomad.py applies each
+inserted / updated row and stores the result in the area_summaries table.
+/api/areas and build_area read them directly.
+"""
+
+import json
+import threading
+import time
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from app.database import SessionLocal
+from app.models.area import AreaSummary
+from app.models.cafe import Cafe
+
+ATTRIBUTES = ("quiet_level", "has_wifi", "has_socket", "limited_time", "standing_desk", "price_band")
+# Upper bounds of the price bands, in NTD.
+PRICE_BANDS = (120, 180, 240)
+STORED_REFRESH_SECONDS = 60
+
+
+def _price_band(price) -> str:
+    if not price:
+        return "unknown"
+    for bound in PRICE_BANDS:
+        if price <= bound:
+            return f"<={bound}"
+    return f">{PRICE_BANDS[-1]}"
+
+
+def _facts(cafe) -> Tuple[str, str, Tuple[str, ...]]:
+    """(district, mrt station, attribute values) for a dict, CafeRecord or Cafe row."""
+    get = cafe.get if hasattr(cafe, "get") else lambda field: getattr(cafe, field, None)
+    values = []
+    for attr in ATTRIBUTES:
+        value = _price_band(get("price")) if attr == "price_band" else get(attr)
+        values.append(str(value).lower() if isinstance(value, bool) else (value or ""))
+    return (get("district") or "", (get("mrt_station") or "").strip(), tuple(values))
+
+
+class _Scope:
+    def __init__(self):
+        self.count = 0
+        self.mrts: Counter = Counter()
+        self.attributes: Dict[str, Counter] = {attr: Counter() for attr in ATTRIBUTES}
+
+    def apply(self, mrt: str, values: Tuple[str, ...], delta: int) -> None:
+        self.count += delta
+        if mrt:
+            self.mrts[mrt] += delta
+            if self.mrts[mrt] <= 0:
+                del self.mrts[mrt]
+        for attr, value in zip(ATTRIBUTES, values):
+            counter = self.attributes[attr]
+            counter[value] += delta
+            if counter[value] <= 0:
+                del counter[value]
+
+    def attribute_counts(self) -> Dict[str, Dict[str, int]]:
+        return {attr: dict(sorted(counter.items())) for attr, counter in self.attributes.items()}
+
+
+class CitySummary:
+    def __init__(self, city: str):
+        self.city = city
+        self.scopes: Dict[str, _Scope] = {"": _Scope()}
+
+    @classmethod
+    def build(cls, city: str, cafes: Iterable) -> "CitySummary":
+        summary = cls(city)
+        for cafe in cafes:
+            summary.add(cafe)
+        return summary
+
+    @property
+    def cafe_count(self) -> int:
+        return self.scopes[""].count
+
+    def _apply(self, facts: Tuple[str, str, Tuple[str, ...]], delta: int) -> None:
+        district, mrt, values = facts
+        self.scopes[""].apply(mrt, values, delta)
+        if district:
+            scope = self.scopes.setdefault(district, _Scope())
+            scope.apply(mrt, values, delta)
+            if scope.count <= 0:
+                del self.scopes[district]
+
+    def add(self, cafe) -> None:
+        self._apply(_facts(cafe), 1)
+
+    def remove(self, cafe) -> None:
+        self._apply(_facts(cafe), -1)
+
+    def replace(self, old, new) -> None:
+        old_facts, new_facts = _facts(old), _facts(new)
+        if old_facts != new_facts:
+            self._apply(old_facts, -1)
+            self._apply(new_facts, 1)
+
+    def to_area(self, city_name: str) -> dict:
+        city_scope = self.scopes[""]
+        districts = [
+            {
+                "name": name,
+                "cafe_count": scope.count,
+                "mrt_stations": sorted(scope.mrts),
+                "attributes": scope.attribute_counts(),
+            }
+            for name, scope in sorted(self.scopes.items())
+            if name
+        ]
+        return {
+            "city": self.city,
+            "city_name": city_name,
+            "cafe_count": city_scope.count,
+            "districts": districts,
+            "mrt_stations": sorted(city_scope.mrts),
+            "attributes": city_scope.attribute_counts(),
+        }
+
+
+# Summaries of the live Cafe Nomad cache, maintained by cafenomad.refresh_city.
+_SUMMARIES: Dict[str, CitySummary] = {}
+_VERSION = {"live": 0}
+_LOCK = threading.Lock()
+
+
+def update_city(city: str, old: Optional[List], new: List) -> CitySummary:
+    """Bring the live summary for `city` from list `old` to list `new`."""
+    with _LOCK:
+        summary = _SUMMARIES.get(city)
+        if summary is None or old is None:
+            summary = CitySummary.build(city, new)
+        else:
+            before = {cafe["id"]: cafe for cafe in old}
+            for cafe in new:
+                previous = before.pop(cafe["id"], None)
+                if previous is None:
+                    summary.add(cafe)
+                else:
+                    summary.replace(previous, cafe)
+            for cafe in before.values():
+                summary.remove(cafe)
+        _SUMMARIES[city] = summary
+        _VERSION["live"] += 1
+        return summary
+
+
+def get_summary(city: str) -> Optional[CitySummary]:
+    return _SUMMARIES.get(city)
+
+
+# --- area_summaries table -------------------------------------------------
+
+
+def load_summary(db: Session, city: str) -> Optional[CitySummary]:
+    rows = db.query(AreaSummary).filter(AreaSummary.city == city).all()
+    if not rows:
+        return None
+    summary = CitySummary(city)
+    for row in rows:
+        scope = summary.scopes.setdefault(row.district, _Scope())
+        scope.count = row.cafe_count
+        scope.mrts = Counter(json.loads(row.mrt_counts or "{}"))
+        stored = json.loads(row.attributes or "{}")
+        scope.attributes = {attr: Counter(stored.get(attr, {})) for attr in ATTRIBUTES}
+    return summary
+
+
+def load_or_build_summary(db: Session, city: str) -> CitySummary:
+    """The stored summary, or one built from the city's cafes rows (first import)."""
+    summary = load_summary(db, city)
+    if summary is None:
+        summary = CitySummary.build(city, db.query(Cafe).filter(Cafe.city == city).all())
+    return summary
+
+
+def save_summary(db: Session, summary: CitySummary) -> None:
+    """Replace the city's rows; the caller commits."""
+    now = time.time()
+    db.query(AreaSummary).filter(AreaSummary.city == summary.city).delete()
+    for district, scope in summary.scopes.items():
+        db.add(
+            AreaSummary(
+                city=summary.city,
+                district=district,
+                cafe_count=scope.count,
+                mrt_counts=json.dumps(dict(scope.mrts), ensure_ascii=False),
+                attributes=json.dumps(
+                    {attr: dict(counter) for attr, counter in scope.attributes.items()},
+                    ensure_ascii=False,
+                ),
+                updated_at=now,
+            )
+        )
+
+
+_STORED: Dict[str, object] = {"summaries": {}, "marker": None, "checked": 0.0}
+
+
+def stored_summaries() -> Dict[str, CitySummary]:
+    """Summaries from the area_summaries table, re-read when the importer changes them."""
+    now = time.time()
+    if now - _STORED["checked"] < STORED_REFRESH_SECONDS:
+        return _STORED["summaries"]  # type: ignore[return-value]
+    db = SessionLocal()
+    try:
+        marker = db.query(func.count(AreaSummary.city), func.max(AreaSummary.updated_at)).one()
+        if tuple(marker) != _STORED["marker"]:
+            cities = [c for (c,) in db.query(AreaSummary.city).distinct()]
+            _STORED["summaries"] = {city: load_summary(db, city) for city in cities}
+            _STORED["marker"] = tuple(marker)
+    except Exception:
+        # Table not created yet (fresh database); live summaries still work.
+        pass
+    finally:
+        db.close()
+    _STORED["checked"] = now
+    return _STORED["summaries"]  # type: ignore[return-value]
+
+
+def summary_for(city: str) -> Optional[CitySummary]:
+    """Live summary when the city is cached, else the imported one."""
+    return _SUMMARIES.get(city) or stored_summaries().get(city)
+
+
+def version() -> tuple:
+    """Changes whenever any summary summary_for() could return changes."""
+    stored_summaries()
+    return (_VERSION["live"], _STORED["marker"])
@@ -1,10 +1,15 @@
+import json
+import os
+import sys
+import threading
 import time
-from collections import defaultdict
-from typing import Dict, List
+import zlib
+from typing import Dict, List, Optional, Tuple
 import httpx
+from app.services import area_summary, shared_cache
 from app.services.normalize import normalize_mrt, extract_district
 
-CAFENOMAD_API = "https://cafenomad.tw/api/v1.2/cafes"
+CAFENOMAD_API = os.getenv("CAFENOMAD_API", "https://cafenomad.tw/api/v1.2/cafes").rstrip("/")
 
 CITIES = [
     "taipei",
@@ -52,6 +57,19 @@ CITY_NAMES = {
 
 _CACHE: Dict[str, Dict[str, object]] = {}
 _CACHE_TTL_SECONDS = 300
+# Shared-cache lifetime; entries carry their own "ts", so past the TTL they
+# are stale but still servable while a refresh is pending.
+_STALE_TTL_SECONDS = 86400
+# Evicted cities (shards.py): fetch time and the records' source fields as
+# compressed JSON, so reloading a cold city does not wait on Cafe Nomad.
+# Copies are only kept while as fresh as a live entry (one TTL), and their
+# size counts toward the shard manager's memory cap.
+_PARKED: Dict[str, Tuple[float, bytes]] = {}
+# One upstream fetch per city at a time.
+_FETCH_LOCKS: Dict[str, threading.Lock] = {}
+# Set by the background refresher: expired entries are served as-is and the
+# refresher replaces them, so requests never wait on Cafe Nomad.
+_SERVE_STALE = {"enabled": False}
 
 
 def _to_float(val) -> float:
@@ -115,89 +133,326 @@ def _map_fields(item: dict, city: str) -> dict:
     }
 
 
-def fetch_cafes(city: str) -> List[dict]:
+# Score values repeat heavily across cafes; share one float object per value.
+_FLOATS: Dict[float, float] = {}
+
+
+def _score(val) -> float:
+    score = _to_float(val)
+    return _FLOATS.setdefault(score, score)
+
+
+def _intern(val) -> str:
+    return sys.intern(val) if isinstance(val, str) else ""
+
+
+class CafeRecord:
+    """Compact form of the _map_fields dict, used for the cached catalog.
+
+    Only the source fields are stored (in slots, with repeated strings
+    interned and scores shared); price, quiet_level, has_wifi and has_socket
+    are derived on access. Supports the dict-style reads the filters use,
+    and to_dict() gives back the exact _map_fields shape for output.
+    """
+
+    __slots__ = (
+        "id",
+        "name",
+        "city",
+        "address",
+        "district",
+        "latitude",
+        "longitude",
+        "url",
+        "mrt",
+        "mrt_station",
+        "open_time",
+        "wifi",
+        "socket",
+        "quiet",
+        "tasty",
+        "cheap",
+        "music",
+        "seat",
+        "limited_time",
+        "standing_desk",
+    )
+
+    # Key order of the _map_fields dict.
+    FIELDS = (
+        "id",
+        "name",
+        "city",
+        "address",
+        "district",
+        "latitude",
+        "longitude",
+        "url",
+        "mrt",
+        "mrt_station",
+        "open_time",
+        "wifi",
+        "socket",
+        "quiet",
+        "tasty",
+        "cheap",
+        "music",
+        "seat",
+        "price",
+        "quiet_level",
+        "has_wifi",
+        "has_socket",
+        "reservable",
+        "bus_stop",
+        "limited_time",
+        "standing_desk",
+    )
+
+    _KEYS = frozenset(FIELDS)
+
+    # Cafe Nomad has no data for these.
+    reservable = None
+    bus_stop = None
+
+    @classmethod
+    def from_item(cls, item: dict, city: str) -> "CafeRecord":
+        record = cls()
+        address = item.get("address", "")
+        mrt_raw = _intern(item.get("mrt", ""))
+        record.id = item.get("id", "")
+        record.name = item.get("name", "")
+        record.city = _intern(city)
+        record.address = address
+        record.district = _intern(extract_district(address))
+        record.latitude = _to_float(item.get("latitude"))
+        record.longitude = _to_float(item.get("longitude"))
+        record.url = _intern(item.get("url", ""))
+        record.mrt = mrt_raw
+        record.mrt_station = _intern(normalize_mrt(mrt_raw))
+        record.open_time = _intern(item.get("open_time", ""))
+        for field in ("wifi", "socket", "quiet", "tasty", "cheap", "music", "seat"):
+            setattr(record, field, _score(item.get(field)))
+        record.limited_time = _intern(item.get("limited_time", ""))
+        record.standing_desk = _intern(item.get("standing_desk", ""))
+        return record
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "CafeRecord":
+        """Inverse of to_dict(), for records read back from the shared cache."""
+        record = cls()
+        for field in ("id", "name", "address", "latitude", "longitude"):
+            setattr(record, field, data.get(field))
+        for field in (
+            "city",
+            "district",
+            "url",
+            "mrt",
+            "mrt_station",
+            "open_time",
+            "limited_time",
+            "standing_desk",
+        ):
+            setattr(record, field, _intern(data.get(field)))
+        for field in ("wifi", "socket", "quiet", "tasty", "cheap", "music", "seat"):
+            setattr(record, field, _score(data.get(field)))
+        return record
+
+    @property
+    def price(self) -> float:
+        return _price_from_cheap(self.cheap)
+
+    @property
+    def quiet_level(self) -> str:
+        return _quiet_level(self.quiet)
+
+    @property
+    def has_wifi(self) -> bool:
+        return self.wifi > 0
+
+    @property
+    def has_socket(self) -> bool:
+        return self.socket > 0
+
+    def get(self, key: str, default=None):
+        if key not in self._KEYS:
+            return default
+        return getattr(self, key)
+
+    def __getitem__(self, key: str):
+        if key not in self._KEYS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def to_dict(self) -> dict:
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+
+def to_record(cafe) -> Optional[CafeRecord]:
+    if cafe is None or isinstance(cafe, CafeRecord):
+        return cafe
+    return CafeRecord.from_dict(cafe)
+
+
+def serve_stale(enabled: bool = True) -> None:
+    _SERVE_STALE["enabled"] = enabled
+
+
+def cached_at(city: str) -> Optional[float]:
+    cached = _CACHE.get(city)
+    return cached["ts"] if cached else None  # type: ignore[return-value]
+
+
+def evict(city: str) -> None:
+    """Drop the in-process records, keeping a compressed copy to reload them from.
+
+    Until the copy is a TTL old, the next fetch_cafes restores it instead of
+    fetching the city; after that the city is fetched again as if never loaded.
+    """
+    cached = _CACHE.pop(city, None)
+    if cached:
+        rows = [[getattr(cafe, field) for field in CafeRecord.__slots__] for cafe in cached["data"]]
+        data = json.dumps(rows, ensure_ascii=False, separators=(",", ":")).encode()
+        _PARKED[city] = (cached["ts"], zlib.compress(data))  # type: ignore[arg-type]
+
+
+def _expire_parked(now: float) -> None:
+    for city, (ts, _) in list(_PARKED.items()):
+        if now - ts >= _CACHE_TTL_SECONDS:
+            _PARKED.pop(city, None)
+
+
+def parked_bytes() -> int:
+    _expire_parked(time.time())
+    return sum(len(data) for _, data in list(_PARKED.values()))
+
+
+def drop_parked(nbytes: int) -> int:
+    """Drop the oldest parked copies until `nbytes` are freed; returns the bytes freed."""
+    freed = 0
+    for city, (_, data) in sorted(list(_PARKED.items()), key=lambda item: item[1][0]):
+        if freed >= nbytes:
+            break
+        if _PARKED.pop(city, None) is not None:
+            freed += len(data)
+    return freed
+
+
+def _restore(city: str) -> None:
+    """Move an evicted city's parked copy back into _CACHE; the caller holds its fetch lock."""
+    _expire_parked(time.time())
+    parked = _PARKED.pop(city, None)
+    if parked is None or city in _CACHE:
+        return
+    ts, data = parked
+    rows = json.loads(zlib.decompress(data))
+    cafes = [CafeRecord.from_dict(dict(zip(CafeRecord.__slots__, row))) for row in rows]
+    _CACHE[city] = {"ts": ts, "data": cafes}
+
+
+def _load_shared(city: str) -> Optional[Dict[str, object]]:
+    shared = shared_cache.get("cafenomad", city)
+    if not shared:
+        return None
+    if shared["data"] and not isinstance(shared["data"][0], CafeRecord):
+        # The SQLite backend hands back plain dicts.
+        shared = {"ts": shared["ts"], "data": [to_record(c) for c in shared["data"]]}
+    return shared
+
+
+def refresh_city(city: str, min_ts: float = 0.0) -> List[CafeRecord]:
+    """Fetch `city` from Cafe Nomad unless an entry newer than `min_ts` exists.
+
+    Concurrent callers for the same city share one upstream request, and an
+    entry another worker already refreshed through the shared cache is
+    adopted instead of refetched.
+    """
+    lock = _FETCH_LOCKS.setdefault(city, threading.Lock())
+    with lock:
+        _restore(city)
+        cached = _CACHE.get(city)
+        if cached and cached["ts"] > min_ts:
+            return cached["data"]  # type: ignore[return-value]
+        shared = _load_shared(city)
+        if shared and shared["ts"] > min_ts:
+            if not cached or cached["ts"] != shared["ts"]:
+                _CACHE[city] = shared
+                area_summary.update_city(city, cached["data"] if cached else None, shared["data"])
+            return _CACHE[city]["data"]  # type: ignore[return-value]
+
+        url = f"{CAFENOMAD_API}/{city}"
+        resp = httpx.get(url, timeout=30)
+        resp.raise_for_status()
+        data = resp.json()
+
+        cafes = [CafeRecord.from_item(item, city) for item in data]
+        _CACHE[city] = {"ts": time.time(), "data": cafes}
+        area_summary.update_city(city, cached["data"] if cached else None, cafes)
+        shared_cache.put("cafenomad", city, _CACHE[city], _STALE_TTL_SECONDS)
+        return cafes
+
+
+def fetch_cafes(city: str) -> List[CafeRecord]:
     if not city:
         return []
 
+    shared_cache.sync_local("cafenomad", _CACHE)
     now = time.time()
     cached = _CACHE.get(city)
-    if cached and (now - cached["ts"]) < _CACHE_TTL_SECONDS:
+    if cached is None and city in _PARKED:
+        with _FETCH_LOCKS.setdefault(city, threading.Lock()):
+            _restore(city)
+        cached = _CACHE.get(city)
+    if cached and (_SERVE_STALE["enabled"] or (now - cached["ts"]) < _CACHE_TTL_SECONDS):
         return cached["data"]  # type: ignore[return-value]
 
-    url = f"{CAFENOMAD_API}/{city}"
-    resp = httpx.get(url, timeout=30)
-    resp.raise_for_status()
-    data = resp.json()
+    # Cold city (or no refresher running): fetch now, once per city.
+    return refresh_city(city, min_ts=now - _CACHE_TTL_SECONDS)
+
 
-    cafes = [_map_fields(item, city) for item in data]
-    _CACHE[city] = {"ts": now, "data": cafes}
-    return cafes
+def matches_filters(cafe: dict, filters: dict) -> bool:
+    if filters.get("district") and cafe.get("district") != filters["district"]:
+        return False
+    if filters.get("mrt_station"):
+        if filters["mrt_station"] not in (cafe.get("mrt_station") or ""):
+            return False
+    if filters.get("mrt"):
+        normalized = normalize_mrt(filters["mrt"])
+        if normalized and normalized not in (cafe.get("mrt_station") or ""):
+            return False
+    if filters.get("bus_stop"):
+        needle = filters["bus_stop"]
+        haystack = " ".join(
+            [
+                cafe.get("bus_stop") or "",
+                cafe.get("address") or "",
+                cafe.get("name") or "",
+                cafe.get("mrt_station") or "",
+            ]
+        )
+        if needle not in haystack:
+            return False
+    if filters.get("has_wifi") is True and not cafe.get("has_wifi"):
+        return False
+    if filters.get("has_socket") is True and not cafe.get("has_socket"):
+        return False
+    if filters.get("reservable") is True and not cafe.get("reservable"):
+        return False
+    if filters.get("quiet_level") and cafe.get("quiet_level") != filters["quiet_level"]:
+        return False
+    if filters.get("max_price") is not None:
+        if cafe.get("price") is None or cafe.get("price") > filters["max_price"]:
+            return False
+    if filters.get("limited_time"):
+        if cafe.get("limited_time") != filters["limited_time"]:
+            return False
+    return True
 
 
 def filter_cafes(cafes: List[dict], filters: dict) -> List[dict]:
-    result = []
-    for cafe in cafes:
-        if filters.get("district") and cafe.get("district") != filters["district"]:
-            continue
-        if filters.get("mrt_station"):
-            if filters["mrt_station"] not in (cafe.get("mrt_station") or ""):
-                continue
-        if filters.get("mrt"):
-            normalized = normalize_mrt(filters["mrt"])
-            if normalized and normalized not in (cafe.get("mrt_station") or ""):
-                continue
-        if filters.get("bus_stop"):
-            needle = filters["bus_stop"]
-            haystack = " ".join(
-                [
-                    cafe.get("bus_stop") or "",
-                    cafe.get("address") or "",
-                    cafe.get("name") or "",
-                    cafe.get("mrt_station") or "",
-                ]
-            )
-            if needle not in haystack:
-                continue
-        if filters.get("has_wifi") is True and not cafe.get("has_wifi"):
-            continue
-        if filters.get("has_socket") is True and not cafe.get("has_socket"):
-            continue
-        if filters.get("reservable") is True and not cafe.get("reservable"):
-            continue
-        if filters.get("quiet_level") and cafe.get("quiet_level") != filters["quiet_level"]:
-            continue
-        if filters.get("max_price") is not None:
-            if cafe.get("price") is None or cafe.get("price") > filters["max_price"]:
-                continue
-        if filters.get("limited_time"):
-            if cafe.get("limited_time") != filters["limited_time"]:
-                continue
-        result.append(cafe)
-    return result
+    return [cafe for cafe in cafes if matches_filters(cafe, filters)]
 
 
 def build_area(city: str) -> dict:
     cafes = fetch_cafes(city)
-    district_mrts = defaultdict(set)
-    all_mrts = set()
-
-    for cafe in cafes:
-        mrt_name = (cafe.get("mrt_station") or "").strip()
-        district = cafe.get("district") or ""
-        if mrt_name:
-            all_mrts.add(mrt_name)
-            if district:
-                district_mrts[district].add(mrt_name)
-
-    districts = [
-        {"name": d_name, "mrt_stations": sorted(district_mrts[d_name])}
-        for d_name in sorted(district_mrts.keys())
-    ]
-
-    return {
-        "city": city,
-        "city_name": CITY_NAMES.get(city, city),
-        "cafe_count": len(cafes),
-        "districts": districts,
-        "mrt_stations": sorted(all_mrts),
-    }
+    summary = area_summary.get_summary(city) or area_summary.update_city(city, None, cafes)
+    return summary.to_area(CITY_NAMES.get(city, city))
@@ -0,0 +1,87 @@
+"""
+Versioned exports of the imported catalog, for /api/cafes/snapshot.
+
+scripts/import_cafenomad.py stamps every cafe it adds or changes with the
+city's next catalog version and leaves a CafeTombstone for every cafe that
+disappeared from Cafe Nomad. A city's version is the highest stamp in
+either table, so it only moves when the catalog actually changed.
+
+A full export lists every cafe of the city; since=<version> lists only the
+cafes stamped after that version and the ids deleted after it, so a client
+holding the city can catch up with a few rows. Cafes are columnar (the
+field names once, then one array per cafe) to keep repeated keys out of the
+payload. Encoded bodies, with their gzip / brotli variants and ETag, are
+cached per (city, version, since), so repeat requests cost two indexed
+MAX() queries.
+"""
+
+import threading
+from typing import Dict, Optional, Tuple
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from app.models.cafe import Cafe
+from app.models.cafe_tombstone import CafeTombstone
+from app.services.cafenomad import CafeRecord
+from app.services.serialize import EncodedBody, dumps
+
+# Same fields, in the same order, as the /cafes/catalog records.
+FIELDS = CafeRecord.FIELDS
+MAX_CACHED_EXPORTS = 256
+
+_CACHE: Dict[Tuple[str, int, Optional[int]], EncodedBody] = {}
+_LOCK = threading.Lock()
+
+
+def city_version(db: Session, city: str) -> int:
+    cafes = db.query(func.max(Cafe.version)).filter(Cafe.city == city).scalar()
+    deleted = (
+        db.query(func.max(CafeTombstone.version)).filter(CafeTombstone.city == city).scalar()
+    )
+    return max(cafes or 0, deleted or 0)
+
+
+def _build(db: Session, city: str, version: int, since: Optional[int]) -> EncodedBody:
+    query = db.query(Cafe).filter(Cafe.city == city)
+    deleted = []
+    if since is not None:
+        query = query.filter(Cafe.version > since)
+        deleted = [
+            cafe_id
+            for (cafe_id,) in db.query(CafeTombstone.id)
+            .filter(CafeTombstone.city == city, CafeTombstone.version > since)
+            .order_by(CafeTombstone.id)
+        ]
+    rows = [[getattr(cafe, field) for field in FIELDS] for cafe in query.order_by(Cafe.id)]
+    return EncodedBody(
+        dumps(
+            {
+                "city": city,
+                "version": version,
+                "since": since,
+                "full": since is None,
+                "fields": FIELDS,
+                "cafes": rows,
+                "deleted": deleted,
+            }
+        )
+    )
+
+
+def export_city(db: Session, city: str, since: Optional[int] = None) -> EncodedBody:
+    """The city's catalog, or only what changed after version `since`.
+
+    A `since` of 0 or newer than the current version (a client that synced
+    against another database) gets the full export instead.
+    """
+    version = city_version(db, city)
+    if since is not None and not 0 < since <= version:
+        since = None
+    key = (city, version, since)
+    body = _CACHE.get(key)
+    if body is None:
+        body = _build(db, city, version, since)
+        with _LOCK:
+            if len(_CACHE) >= MAX_CACHED_EXPORTS:
+                _CACHE.pop(next(iter(_CACHE)), None)
+            _CACHE[key] = body
+    return body
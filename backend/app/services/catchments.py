@@ -0,0 +1,167 @@
+"""
+Precomputed walk-radius catchments: for every local station and walk-minute
+tier, the ids of cafes inside it.
+
+Built from the local catalog (cafes + stations tables) and kept up to date
+incrementally: cafes whose nearest-station columns were recomputed since the
+last refresh are re-slotted, and a changed station set triggers a rebuild.
+"Does station X have a cafe within N minutes" is then a dict lookup.
+"""
+
+import threading
+import time
+from typing import Dict, List, Optional, Set, Tuple
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from app.database import SessionLocal
+from app.models.cafe import Cafe
+from app.services.stations import (
+    StationIndex,
+    load_station_index,
+    station_version,
+    walk_km,
+    walk_minutes,
+)
+
+TIERS = (5, 10, 15, 20)
+# Proximity for mapping a Places transit point onto a local station.
+MATCH_KM = 0.1
+REFRESH_SECONDS = 60
+
+
+class CatchmentIndex:
+    def __init__(self, stations: StationIndex):
+        self.stations = stations
+        # station_id -> tier -> cafe ids (cumulative: tier 10 includes tier 5)
+        self.by_station: Dict[str, Dict[int, Set[str]]] = {}
+        # cafe_id -> station_id -> walk minutes, for incremental removal
+        self.by_cafe: Dict[str, Dict[str, int]] = {}
+
+    def add_cafe(self, cafe_id: str, lat: float, lng: float) -> None:
+        self.remove_cafe(cafe_id)
+        reach: Dict[str, int] = {}
+        for station, km in self.stations.within(lat, lng, walk_km(TIERS[-1] + 0.5)):
+            minutes = walk_minutes(km)
+            if minutes > TIERS[-1]:
+                continue
+            reach[station["id"]] = minutes
+            tiers = self.by_station.setdefault(station["id"], {t: set() for t in TIERS})
+            for tier in TIERS:
+                if minutes <= tier:
+                    tiers[tier].add(cafe_id)
+        if reach:
+            self.by_cafe[cafe_id] = reach
+
+    def remove_cafe(self, cafe_id: str) -> None:
+        for station_id in self.by_cafe.pop(cafe_id, {}):
+            for ids in self.by_station.get(station_id, {}).values():
+                ids.discard(cafe_id)
+
+    def count(self, station_id: str, tier: int) -> int:
+        return len(self.by_station.get(station_id, {}).get(tier, ()))
+
+    def cafes_within(self, station_id: str, minutes: int) -> List[Tuple[str, int]]:
+        """(cafe_id, walk_minutes) within `minutes`, nearest first."""
+        tier = next((t for t in TIERS if t >= minutes), TIERS[-1])
+        ids = self.by_station.get(station_id, {}).get(tier, ())
+        hits = [(cid, self.by_cafe[cid][station_id]) for cid in ids]
+        hits = [h for h in hits if h[1] <= minutes]
+        hits.sort(key=lambda h: h[1])
+        return hits
+
+    def has_cafes_within(self, station_id: str, minutes: int) -> Optional[bool]:
+        """None when the answer lies beyond the largest tier."""
+        tiers = self.by_station.get(station_id)
+        if tiers is None:
+            return False if minutes <= TIERS[-1] else None
+        for tier in reversed(TIERS):
+            if tier <= minutes and tiers[tier]:
+                return True
+        if minutes > TIERS[-1]:
+            return None
+        tier = next(t for t in TIERS if t >= minutes)
+        if not tiers[tier]:
+            return False
+        return any(self.by_cafe[cid][station_id] <= minutes for cid in tiers[tier])
+
+    def station_for(self, point_id: str, lat: float, lng: float) -> Optional[str]:
+        if point_id in self.stations.by_id:
+            return point_id
+        hits = self.stations.nearest(lat, lng, k=1)
+        if hits and hits[0][1] <= MATCH_KM:
+            return hits[0][0]["id"]
+        return None
+
+
+_STATE: Dict[str, object] = {
+    "index": None,
+    "station_version": None,
+    "watermark": 0.0,
+    "cafe_count": 0,
+    "checked": 0.0,
+}
+_LOCK = threading.Lock()
+
+
+def _located_cafes(db: Session, since: Optional[float] = None):
+    query = db.query(Cafe.id, Cafe.latitude, Cafe.longitude, Cafe.stations_computed_at).filter(
+        Cafe.latitude.isnot(None), Cafe.longitude.isnot(None)
+    )
+    if since is not None:
+        query = query.filter(Cafe.stations_computed_at > since)
+    return query.all()
+
+
+def rebuild(db: Session) -> CatchmentIndex:
+    index = CatchmentIndex(load_station_index(db))
+    watermark = 0.0
+    rows = _located_cafes(db)
+    for cafe_id, lat, lng, computed_at in rows:
+        if lat and lng:
+            index.add_cafe(cafe_id, lat, lng)
+        watermark = max(watermark, computed_at or 0.0)
+    _STATE.update(
+        index=index,
+        station_version=station_version(db),
+        watermark=watermark,
+        cafe_count=len(rows),
+    )
+    return index
+
+
+def refresh(db: Session) -> CatchmentIndex:
+    index = _STATE["index"]
+    count = db.query(func.count(Cafe.id)).filter(
+        Cafe.latitude.isnot(None), Cafe.longitude.isnot(None)
+    ).scalar()
+    if (
+        index is None
+        or _STATE["station_version"] != station_version(db)
+        or count < _STATE["cafe_count"]
+    ):
+        return rebuild(db)
+
+    watermark = _STATE["watermark"]
+    for cafe_id, lat, lng, computed_at in _located_cafes(db, since=watermark):
+        if lat and lng:
+            index.add_cafe(cafe_id, lat, lng)
+        else:
+            index.remove_cafe(cafe_id)
+        watermark = max(watermark, computed_at or 0.0)
+    _STATE.update(watermark=watermark, cafe_count=count)
+    return index
+
+
+def get_catchments() -> CatchmentIndex:
+    now = time.time()
+    if _STATE["index"] is not None and now - _STATE["checked"] < REFRESH_SECONDS:
+        return _STATE["index"]  # type: ignore[return-value]
+    with _LOCK:
+        if _STATE["index"] is None or now - _STATE["checked"] >= REFRESH_SECONDS:
+            db = SessionLocal()
+            try:
+                refresh(db)
+            finally:
+                db.close()
+            _STATE["checked"] = now
+    return _STATE["index"]  # type: ignore[return-value]
@@ -0,0 +1,242 @@
+"""
+Entity resolution between Cafe Nomad cafes and Google Places results.
+
+Candidates are blocked on (grid cell, name bigram): a Places record is only
+compared with cafes in the 3x3 cells around it that share at least one
+bigram of the normalized name, never with the whole city. Candidate pairs
+are scored on name similarity (bigram Dice, or containment of one
+normalized name in the other) and distance, and assigned one-to-one, best
+score first. Accepted pairs are stored in the cafe_links table.
+
+scripts/match_places.py matches a whole city; attach_local() resolves the
+Places results of a request against the loaded city shard, reusing stored
+links and saving new ones as they are found.
+"""
+
+import math
+import time
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from sqlalchemy.orm import Session
+from app.database import SessionLocal
+from app.models.cafe_link import CafeLink
+from app.services import shards
+from app.services.normalize import name_ngrams, normalize_name
+
+GRID_DEGREES = 0.005
+MAX_MATCH_KM = 0.3
+MIN_NAME_SIMILARITY = 0.5
+MIN_SCORE = 0.6
+NAME_WEIGHT = 0.75
+
+# Cafe Nomad attributes copied onto matched Places results.
+LOCAL_FIELDS = (
+    "wifi",
+    "socket",
+    "quiet",
+    "tasty",
+    "cheap",
+    "music",
+    "seat",
+    "has_wifi",
+    "has_socket",
+    "quiet_level",
+    "price",
+    "limited_time",
+    "standing_desk",
+    "open_time",
+    "mrt_station",
+)
+
+
+def _field(record, key: str):
+    """Read `key` from a dict, a CafeRecord or a Cafe row."""
+    if hasattr(record, "get"):
+        return record.get(key)
+    return getattr(record, key, None)
+
+
+def _cell(lat: float, lng: float) -> Tuple[int, int]:
+    return (math.floor(lat / GRID_DEGREES), math.floor(lng / GRID_DEGREES))
+
+
+def _distance_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    dlat = math.radians(lat2 - lat1)
+    dlng = math.radians(lng2 - lng1)
+    a = (
+        math.sin(dlat / 2) ** 2
+        + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlng / 2) ** 2
+    )
+    return 6371.0 * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+
+def name_similarity(a: str, b: str, a_grams: Set[str], b_grams: Set[str]) -> float:
+    if not a or not b:
+        return 0.0
+    if a == b:
+        return 1.0
+    if min(len(a), len(b)) >= 2 and (a in b or b in a):
+        return 0.9
+    if not a_grams or not b_grams:
+        return 0.0
+    return 2 * len(a_grams & b_grams) / (len(a_grams) + len(b_grams))
+
+
+def match_score(similarity: float, km: float) -> float:
+    return NAME_WEIGHT * similarity + (1 - NAME_WEIGHT) * max(0.0, 1 - km / MAX_MATCH_KM)
+
+
+class MatchIndex:
+    """Cafe Nomad records blocked by (grid cell, name bigram)."""
+
+    def __init__(self, cafes: Iterable):
+        self.cafes: Dict[str, object] = {}
+        self.names: Dict[str, Tuple[str, Set[str]]] = {}
+        self.blocks: Dict[Tuple[Tuple[int, int], str], List[str]] = defaultdict(list)
+        for cafe in cafes:
+            self.add(cafe)
+
+    def add(self, cafe) -> None:
+        cafe_id = _field(cafe, "id")
+        lat, lng = _field(cafe, "latitude"), _field(cafe, "longitude")
+        if not cafe_id or not lat or not lng:
+            return
+        normalized = normalize_name(_field(cafe, "name") or "")
+        grams = name_ngrams(normalized)
+        self.cafes[cafe_id] = cafe
+        self.names[cafe_id] = (normalized, grams)
+        cell = _cell(lat, lng)
+        for gram in grams:
+            self.blocks[(cell, gram)].append(cafe_id)
+
+    def candidates(self, lat: float, lng: float, grams: Set[str]) -> Set[str]:
+        cx, cy = _cell(lat, lng)
+        found: Set[str] = set()
+        for x in (cx - 1, cx, cx + 1):
+            for y in (cy - 1, cy, cy + 1):
+                for gram in grams:
+                    found.update(self.blocks.get(((x, y), gram), ()))
+        return found
+
+    def scored(self, place) -> List[Tuple[float, str, float]]:
+        """(score, cafe_id, km) of acceptable matches for one Places record."""
+        lat, lng = _field(place, "latitude"), _field(place, "longitude")
+        if not lat or not lng:
+            return []
+        normalized = normalize_name(_field(place, "name") or "")
+        grams = name_ngrams(normalized)
+        results = []
+        for cafe_id in self.candidates(lat, lng, grams):
+            cafe = self.cafes[cafe_id]
+            km = _distance_km(lat, lng, _field(cafe, "latitude"), _field(cafe, "longitude"))
+            if km > MAX_MATCH_KM:
+                continue
+            cafe_name, cafe_grams = self.names[cafe_id]
+            similarity = name_similarity(normalized, cafe_name, grams, cafe_grams)
+            if similarity < MIN_NAME_SIMILARITY:
+                continue
+            score = match_score(similarity, km)
+            if score >= MIN_SCORE:
+                results.append((score, cafe_id, km))
+        return results
+
+
+def match_all(index: MatchIndex, places: Iterable, taken: Optional[Set[str]] = None) -> List[Dict]:
+    """One-to-one matches between `places` and the index, best score first.
+
+    Cafes in `taken` are already linked to another place and are skipped.
+    """
+    places_by_id = {_field(p, "id"): p for p in places if _field(p, "id")}
+    pairs = []
+    for place_id, place in places_by_id.items():
+        for score, cafe_id, km in index.scored(place):
+            pairs.append((score, place_id, cafe_id, km))
+    pairs.sort(key=lambda pair: (-pair[0], pair[1], pair[2]))
+
+    used_places: Set[str] = set()
+    used_cafes: Set[str] = set(taken or ())
+    links = []
+    for score, place_id, cafe_id, km in pairs:
+        if place_id in used_places or cafe_id in used_cafes:
+            continue
+        used_places.add(place_id)
+        used_cafes.add(cafe_id)
+        links.append(
+            {
+                "place_id": place_id,
+                "cafe_id": cafe_id,
+                "score": round(score, 3),
+                "distance_m": round(km * 1000, 1),
+                "place_name": _field(places_by_id[place_id], "name"),
+                "cafe_name": _field(index.cafes[cafe_id], "name"),
+            }
+        )
+    return links
+
+
+def save_links(db: Session, city: str, links: List[Dict]) -> None:
+    """Insert or replace links; the caller commits."""
+    now = time.time()
+    for link in links:
+        db.merge(CafeLink(city=city, matched_at=now, **link))
+
+
+def load_links(db: Session, place_ids: List[str]) -> Dict[str, str]:
+    if not place_ids:
+        return {}
+    rows = db.query(CafeLink.place_id, CafeLink.cafe_id).filter(CafeLink.place_id.in_(place_ids))
+    return {place_id: cafe_id for place_id, cafe_id in rows}
+
+
+def linked_cafes(db: Session, cafe_ids: Iterable[str]) -> Set[str]:
+    """The cafes among `cafe_ids` already linked to some place."""
+    cafe_ids = list(cafe_ids)
+    if not cafe_ids:
+        return set()
+    rows = db.query(CafeLink.cafe_id).filter(CafeLink.cafe_id.in_(cafe_ids))
+    return {cafe_id for (cafe_id,) in rows}
+
+
+def _match_index(city: str) -> Optional[MatchIndex]:
+    # Only cities already in memory: enrichment must not trigger a Cafe Nomad load.
+    if not shards.get_manager().is_loaded(city):
+        return None
+    return shards.derived(city, "match_index", lambda snap: MatchIndex(snap.cafes))
+
+
+def attach_local(city: str, places: List[Dict]) -> List[Dict]:
+    """Add a "local" dict of Cafe Nomad attributes to Places results that
+    resolve to a Cafe Nomad cafe. Results without a match are left as-is."""
+    index = _match_index(city)
+    if index is None or not places:
+        return places
+    db = SessionLocal()
+    try:
+        known = load_links(db, [p["id"] for p in places if p.get("id")])
+        # Fallback results built from Cafe Nomad itself already carry "local".
+        unknown = [p for p in places if p.get("id") and "local" not in p and p["id"] not in known]
+        if unknown:
+            # Links stay one-to-one: cafes linked to any other place are off the table.
+            candidates = {cafe_id for p in unknown for _, cafe_id, _ in index.scored(p)}
+            taken = set(known.values()) | linked_cafes(db, candidates)
+            new_links = match_all(index, unknown, taken=taken)
+            if new_links:
+                save_links(db, city, new_links)
+                db.commit()
+            known.update({link["place_id"]: link["cafe_id"] for link in new_links})
+    except Exception:
+        # Links are an enrichment; a locked or missing table must not fail the search.
+        db.rollback()
+        return places
+    finally:
+        db.close()
+
+    enriched = []
+    for place in places:
+        cafe = index.cafes.get(known.get(place.get("id"), ""))
+        if cafe is not None and "local" not in place:
+            place = dict(place)
+            place["local"] = {"cafenomad_id": _field(cafe, "id")}
+            place["local"].update({key: _field(cafe, key) for key in LOCAL_FIELDS})
+        enriched.append(place)
+    return enriched
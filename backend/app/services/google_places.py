@@ -1,11 +1,18 @@
+import heapq
 import os
 import re
 import math
+import time
 import httpx
 from typing import List, Dict, Optional, Tuple
+from app.services import places_cache, ratelimit, resilience, shared_cache, shards
+from app.services.catchments import get_catchments
+from app.services.entity_match import LOCAL_FIELDS
 
-PLACES_TEXT_ENDPOINT = "https://places.googleapis.com/v1/places:searchText"
-PLACES_NEARBY_ENDPOINT = "https://places.googleapis.com/v1/places:searchNearby"
+# PLACES_API_BASE points the app at a stand-in such as scripts/fake_upstream.py.
+PLACES_API_BASE = os.getenv("PLACES_API_BASE", "https://places.googleapis.com/v1").rstrip("/")
+PLACES_TEXT_ENDPOINT = f"{PLACES_API_BASE}/places:searchText"
+PLACES_NEARBY_ENDPOINT = f"{PLACES_API_BASE}/places:searchNearby"
 
 CITY_COORDS = {
     "taipei": (25.0330, 121.5654),
@@ -188,6 +195,37 @@ CITY_DISTRICTS = {
 }
 
 _MRT_CACHE: Dict[Tuple[float, float], Dict[str, object]] = {}
+_PLACES_CACHE: Dict[str, Dict[str, object]] = {}
+_PLACES_CACHE_TTL_SECONDS = 600
+_PLACES_CACHE_MAX_ENTRIES = 2048
+_MRT_CACHE_TTL_SECONDS = 86400
+# Local fallback for a keyword search around a point: the Places locationBias radius.
+LOCAL_NEAR_KM = 2.5
+_CAFE_FIELDS = (
+    "places.id,places.displayName,places.formattedAddress,places.location,places.rating,"
+    "places.userRatingCount,places.priceLevel,places.websiteUri"
+)
+# Per attempt; a request deadline (see resilience) can cut it shorter.
+PLACES_TIMEOUT_SECONDS = 10.0
+PLACES_HEDGING = os.getenv("PLACES_HEDGING", "1") != "0"
+PLACES_BREAKER = resilience.CircuitBreaker("places")
+_PLACES_LATENCY = resilience.LatencyTracker()
+_PLACES_HEDGES = resilience.HedgeBudget()
+# One bucket for every Places call in this process; see ratelimit for the lanes.
+PLACES_LIMITER = ratelimit.PriorityLimiter(
+    rate=float(os.getenv("PLACES_RATE_PER_SECOND", "10")),
+    burst=float(os.getenv("PLACES_BURST", "20")),
+    queue_limits={"interactive": 50, "enrichment": 100, "background": 20},
+)
+
+
+class PlacesUnavailable(RuntimeError):
+    """Places failed, timed out, is rate limited or is behind an open circuit,
+    and there is no cached answer."""
+
+
+class PlacesRequestError(RuntimeError):
+    """Places rejected the request (4xx other than 429)."""
 
 
 def _api_key() -> str:
@@ -229,45 +267,104 @@ def get_city_districts(city: str) -> List[str]:
 
 
 def _post_places(url: str, payload: dict, field_mask: str) -> dict:
+    key = places_cache.make_key(url, payload, field_mask)
+    shared_cache.sync_local("places", _PLACES_CACHE)
+    now = time.time()
+    cached = _PLACES_CACHE.get(key)
+    if cached and (now - cached["ts"]) < _PLACES_CACHE_TTL_SECONDS:
+        return cached["data"]  # type: ignore[return-value]
+
+    stored = places_cache.get(key)
+    if stored is not None:
+        _remember_places(key, now, stored)
+        return stored
+
+    if not PLACES_BREAKER.allow():
+        return _stale_or_raise(key, resilience.CircuitOpen("Places circuit is open"))
     headers = {
         "Content-Type": "application/json",
         "X-Goog-Api-Key": _api_key(),
         "X-Goog-FieldMask": field_mask,
     }
-    resp = httpx.post(url, json=payload, headers=headers, timeout=30)
+    try:
+        if PLACES_HEDGING:
+            data = resilience.hedged_call(
+                lambda: _send(url, payload, headers), _PLACES_LATENCY, _PLACES_HEDGES
+            )
+        else:
+            data = _send(url, payload, headers)
+    except PlacesRequestError:
+        # Places answered; the request itself was wrong.
+        PLACES_BREAKER.record_success()
+        raise
+    except ratelimit.RateLimited as e:
+        # Our own budget ran out; says nothing about Places' health.
+        PLACES_BREAKER.release()
+        return _stale_or_raise(key, e)
+    except Exception as e:
+        left = resilience.remaining()
+        if left is not None and left <= 0:
+            PLACES_BREAKER.release()
+        else:
+            PLACES_BREAKER.record_failure()
+        return _stale_or_raise(key, e)
+    PLACES_BREAKER.record_success()
+
+    places_cache.put(key, url, field_mask, data)
+    _remember_places(key, now, data)
+    return data
+
+
+def _send(url: str, payload: dict, headers: dict) -> dict:
+    PLACES_LIMITER.acquire()
+    timeout = resilience.timeout_for(PLACES_TIMEOUT_SECONDS)
+    started = time.monotonic()
+    resp = httpx.post(url, json=payload, headers=headers, timeout=timeout)
+    if resp.status_code == 429 or resp.status_code >= 500:
+        raise PlacesUnavailable(f"Places API error {resp.status_code}: {resp.text}")
     if resp.status_code >= 400:
-        raise RuntimeError(f"Places API error {resp.status_code}: {resp.text}")
+        raise PlacesRequestError(f"Places API error {resp.status_code}: {resp.text}")
+    _PLACES_LATENCY.record(time.monotonic() - started)
     return resp.json()
 
 
-def search_places(city: str, district: Optional[str] = None, limit: int = 20) -> List[Dict]:
-    if city not in CITY_COORDS:
-        return []
-    lat, lng = CITY_COORDS[city]
+def _stale_or_raise(key: str, error: Exception) -> dict:
+    """An expired cached answer for `key`, or PlacesUnavailable."""
+    stale = places_cache.get(key, allow_stale=True)
+    if stale is not None:
+        return stale
+    raise PlacesUnavailable(str(error)) from error
 
-    payload = {
-        "textQuery": _text_query(city, district),
-        "locationBias": {
-            "circle": {
-                "center": {"latitude": lat, "longitude": lng},
-                "radius": 8000.0,
-            }
-        },
-        "includedType": "cafe",
-        "maxResultCount": min(max(limit, 1), 20),
-        "languageCode": "zh-TW",
-        "regionCode": "TW",
+
+def places_status() -> Dict[str, object]:
+    p95 = _PLACES_LATENCY.percentile(95)
+    return {
+        "breaker": PLACES_BREAKER.status(),
+        "p95_ms": None if p95 is None else round(p95 * 1000, 1),
+        "hedging": PLACES_HEDGING,
+        "calls": _PLACES_HEDGES.calls,
+        "hedges": _PLACES_HEDGES.hedges,
+        "hedge_wins": _PLACES_HEDGES.hedge_wins,
+        "limiter": PLACES_LIMITER.status(),
     }
 
-    data = _post_places(
-        PLACES_TEXT_ENDPOINT,
-        payload,
-        "places.id,places.displayName,places.formattedAddress,places.location,places.rating,places.userRatingCount,places.priceLevel,places.websiteUri",
-    )
 
-    places = data.get("places", [])
+def _remember_places(key: str, ts: float, data: dict) -> None:
+    _PLACES_CACHE.pop(key, None)
+    _PLACES_CACHE[key] = {"ts": ts, "data": data}
+    if len(_PLACES_CACHE) > _PLACES_CACHE_MAX_ENTRIES:
+        _PLACES_CACHE.pop(next(iter(_PLACES_CACHE)))
+
+
+def clear_places_cache() -> None:
+    places_cache.clear()
+    _PLACES_CACHE.clear()
+    shared_cache.invalidate("places")
+
+
+def _to_cafes(data: dict, city: str, district: Optional[str]) -> List[Dict]:
     results = []
-    for p in places:
+    for p in data.get("places", []):
         loc = p.get("location") or {}
         address = p.get("formattedAddress", "")
         inferred_district = _extract_district(address)
@@ -289,6 +386,37 @@ def search_places(city: str, district: Optional[str] = None, limit: int = 20) ->
     return results
 
 
+def search_places(city: str, district: Optional[str] = None, limit: int = 20) -> List[Dict]:
+    if city not in CITY_COORDS:
+        return []
+    lat, lng = CITY_COORDS[city]
+
+    payload = {
+        "textQuery": _text_query(city, district),
+        "locationBias": {
+            "circle": {
+                "center": {"latitude": lat, "longitude": lng},
+                "radius": 8000.0,
+            }
+        },
+        "includedType": "cafe",
+        "maxResultCount": min(max(limit, 1), 20),
+        "languageCode": "zh-TW",
+        "regionCode": "TW",
+    }
+
+    try:
+        data = _post_places(
+            PLACES_TEXT_ENDPOINT,
+            payload,
+            _CAFE_FIELDS,
+        )
+    except PlacesUnavailable:
+        return _local_cafes(city, district, limit=limit)
+
+    return _to_cafes(data, city, district)
+
+
 def search_places_near(
     city: str,
     latitude: float,
@@ -313,59 +441,99 @@ def search_places_near(
         "regionCode": "TW",
     }
 
-    data = _post_places(
-        PLACES_TEXT_ENDPOINT,
-        payload,
-        "places.id,places.displayName,places.formattedAddress,places.location,places.rating,places.userRatingCount,places.priceLevel,places.websiteUri",
-    )
+    try:
+        data = _post_places(
+            PLACES_TEXT_ENDPOINT,
+            payload,
+            _CAFE_FIELDS,
+        )
+    except PlacesUnavailable:
+        return _local_cafes(city, district, latitude, longitude, limit)
 
-    places = data.get("places", [])
-    results = []
-    for p in places:
-        loc = p.get("location") or {}
-        address = p.get("formattedAddress", "")
-        inferred_district = _extract_district(address)
-        results.append(
-            {
-                "id": p.get("id", ""),
-                "name": (p.get("displayName") or {}).get("text", ""),
-                "address": address,
-                "latitude": loc.get("latitude"),
-                "longitude": loc.get("longitude"),
-                "rating": p.get("rating"),
-                "user_ratings_total": p.get("userRatingCount"),
-                "price_level": p.get("priceLevel"),
-                "url": p.get("websiteUri"),
-                "city": city,
-                "district": district or inferred_district or "",
+    return _to_cafes(data, city, district)
+
+
+def search_cafes_within(
+    city: str, latitude: float, longitude: float, radius_m: float, limit: int = 20
+) -> List[Dict]:
+    """The `limit` cafes nearest to a point, strictly inside `radius_m` (searchNearby)."""
+    if city not in CITY_COORDS:
+        return []
+    payload = {
+        "locationRestriction": {
+            "circle": {
+                "center": {"latitude": latitude, "longitude": longitude},
+                "radius": float(radius_m),
             }
-        )
-    return results
+        },
+        "includedTypes": ["cafe", "coffee_shop"],
+        "maxResultCount": min(max(limit, 1), 20),
+        "rankPreference": "DISTANCE",
+        "languageCode": "zh-TW",
+        "regionCode": "TW",
+    }
+    try:
+        data = _post_places(PLACES_NEARBY_ENDPOINT, payload, _CAFE_FIELDS)
+    except PlacesUnavailable:
+        return [
+            c
+            for c in _local_cafes(city, None, latitude, longitude, limit)
+            if _haversine_km(latitude, longitude, c["latitude"], c["longitude"]) * 1000 <= radius_m
+        ]
+    return _to_cafes(data, city, None)
+
+
+def search_places_in_box(
+    city: str,
+    query: str,
+    latitude: float,
+    longitude: float,
+    radius_m: float,
+    page_size: int = 20,
+    page_token: Optional[str] = None,
+) -> Tuple[List[Dict], Optional[str]]:
+    """One page of a text search restricted to the box around a circle.
+
+    searchText only restricts to rectangles, so callers drop the corners.
+    Returns the page and the token for the next one (None on the last).
+    """
+    if city not in CITY_COORDS:
+        return [], None
+    dlat = radius_m / 111320.0
+    dlng = radius_m / (111320.0 * math.cos(math.radians(latitude)))
+    payload = {
+        "textQuery": _text_query(city, query),
+        "locationRestriction": {
+            "rectangle": {
+                "low": {"latitude": latitude - dlat, "longitude": longitude - dlng},
+                "high": {"latitude": latitude + dlat, "longitude": longitude + dlng},
+            }
+        },
+        "includedType": "cafe",
+        "pageSize": min(max(page_size, 1), 20),
+        "languageCode": "zh-TW",
+        "regionCode": "TW",
+    }
+    if page_token:
+        payload["pageToken"] = page_token
+    try:
+        data = _post_places(PLACES_TEXT_ENDPOINT, payload, _CAFE_FIELDS + ",nextPageToken")
+    except PlacesUnavailable:
+        if page_token:
+            return [], None
+        return _local_cafes(city, query, latitude, longitude, page_size), None
+    return _to_cafes(data, city, None), data.get("nextPageToken")
 
 
 def has_cafes_near_transit(
     city: str,
     transit_lat: float,
     transit_lng: float,
-    district: Optional[str] = None,
     max_walk_minutes: int = 10,
 ) -> bool:
-    cafes = search_places_near(
-        city=city,
-        latitude=transit_lat,
-        longitude=transit_lng,
-        district=district,
-        limit=5,
-    )
-    max_km = (max_walk_minutes / 60.0) * 5.0
-    for cafe in cafes:
-        lat = cafe.get("latitude")
-        lng = cafe.get("longitude")
-        if lat is None or lng is None:
-            continue
-        if _haversine_km(lat, lng, transit_lat, transit_lng) <= max_km:
-            return True
-    return False
+    # One nearest cafe inside the walk radius answers the question.
+    radius_m = (max_walk_minutes / 60.0) * 5.0 * 1000
+    return bool(search_cafes_within(city, transit_lat, transit_lng, radius_m, limit=1))
 
 
 def search_transit_points(
@@ -376,6 +544,16 @@ def search_transit_points(
 ) -> List[Dict]:
     if city not in CITY_COORDS:
         return []
+    try:
+        return _places_transit_points(city, district, query, limit)
+    except PlacesUnavailable:
+        lat, lng = CITY_COORDS[city]
+        return _local_stations(city, lat, lng, limit)
+
+
+def _places_transit_points(
+    city: str, district: Optional[str], query: Optional[str], limit: int
+) -> List[Dict]:
     lat, lng = CITY_COORDS[city]
 
     payload_base = {
@@ -447,6 +625,40 @@ def search_transit_points(
     return list(by_name.values())
 
 
+def search_stations_near(latitude: float, longitude: float, radius: float = 3000.0) -> List[Dict]:
+    payload = {
+        "locationRestriction": {
+            "circle": {
+                "center": {"latitude": latitude, "longitude": longitude},
+                "radius": radius,
+            }
+        },
+        "includedTypes": ["subway_station", "light_rail_station", "train_station"],
+        "maxResultCount": 20,
+        "languageCode": "zh-TW",
+        "regionCode": "TW",
+    }
+    data = _post_places(
+        PLACES_NEARBY_ENDPOINT,
+        payload,
+        "places.id,places.displayName,places.location",
+    )
+    stations = []
+    for p in data.get("places", []):
+        loc = p.get("location") or {}
+        if loc.get("latitude") is None or loc.get("longitude") is None:
+            continue
+        stations.append(
+            {
+                "id": p.get("id", ""),
+                "name": (p.get("displayName") or {}).get("text", ""),
+                "latitude": loc["latitude"],
+                "longitude": loc["longitude"],
+            }
+        )
+    return stations
+
+
 def _nearby_transit(lat: float, lng: float) -> Optional[Dict[str, object]]:
     payload = {
         "locationRestriction": {
@@ -529,13 +741,110 @@ def _text_transit(lat: float, lng: float) -> Optional[Dict[str, object]]:
 
 def find_nearest_mrt(lat: float, lng: float) -> Optional[Dict[str, object]]:
     key = (round(lat, 4), round(lng, 4))
+    shared_cache.sync_local("mrt", _MRT_CACHE)
     cached = _MRT_CACHE.get(key)
     if cached:
         return cached
 
-    result = _nearby_transit(lat, lng)
-    if not result:
-        result = _text_transit(lat, lng)
+    shared_key = f"{key[0]},{key[1]}"
+    shared = shared_cache.get("mrt", shared_key)
+    if shared:
+        _MRT_CACHE[key] = shared
+        return shared
+
+    try:
+        result = _nearby_transit(lat, lng)
+        if not result:
+            result = _text_transit(lat, lng)
+    except PlacesUnavailable:
+        # Not cached, so Places answers again once it recovers.
+        return _local_nearest_station(lat, lng)
     if result:
         _MRT_CACHE[key] = result
+        shared_cache.put("mrt", shared_key, result, _MRT_CACHE_TTL_SECONDS)
     return result
+
+
+def _local_cafes(
+    city: str,
+    district: Optional[str],
+    latitude: Optional[float] = None,
+    longitude: Optional[float] = None,
+    limit: int = 20,
+) -> List[Dict]:
+    """Cafe Nomad cafes in the shape of Places results, while Places is down.
+
+    Only cities already in memory are used, so an outage never adds a Cafe
+    Nomad load on top. The results already carry "local" attributes.
+    """
+    snap = shards.get_snapshot(city, touch=False) if shards.get_manager().is_loaded(city) else None
+    if snap is None:
+        return []
+    cafes = snap.cafes
+    positions = [i for i, c in enumerate(cafes) if c.get("latitude") and c.get("longitude")]
+    near = latitude is not None and longitude is not None
+
+    def km(i: int) -> float:
+        cafe = cafes[i]
+        return _haversine_km(latitude, longitude, cafe.get("latitude"), cafe.get("longitude"))
+
+    if district and district in get_city_districts(city):
+        positions = [i for i in positions if cafes[i].get("district") == district]
+    elif district and near:
+        # A name search around a point narrows the nearby cafes, not the whole city.
+        nearby = [i for i in positions if km(i) <= LOCAL_NEAR_KM]
+        positions = [i for i, _ in snap.name_index.search_within(district, nearby, len(nearby))]
+    elif district:
+        positions = [i for i, _ in snap.name_index.search(district, limit)]
+    if near:
+        positions = heapq.nsmallest(limit, positions, key=km)
+    cafes = [cafes[i] for i in positions]
+    results = []
+    for cafe in cafes[:limit]:
+        local = {"cafenomad_id": cafe.get("id")}
+        local.update({key: cafe.get(key) for key in LOCAL_FIELDS})
+        results.append(
+            {
+                "id": cafe.get("id"),
+                "name": cafe.get("name"),
+                "address": cafe.get("address"),
+                "latitude": cafe.get("latitude"),
+                "longitude": cafe.get("longitude"),
+                "rating": None,
+                "user_ratings_total": None,
+                "price_level": None,
+                "url": cafe.get("url") or None,
+                "city": city,
+                "district": cafe.get("district") or district or "",
+                "source": "cafenomad",
+                "local": local,
+            }
+        )
+    return results
+
+
+def _local_stations(city: str, lat: float, lng: float, limit: int) -> List[Dict]:
+    try:
+        hits = get_catchments().stations.within(lat, lng, 12.0)
+    except Exception:
+        return []
+    return [
+        {"id": s["id"], "name": s["name"], "latitude": s["latitude"], "longitude": s["longitude"]}
+        for s, _ in hits
+        if s.get("city") in (None, city)
+    ][:limit]
+
+
+def _local_nearest_station(lat: float, lng: float) -> Optional[Dict[str, object]]:
+    try:
+        hits = get_catchments().stations.nearest(lat, lng, k=1)
+    except Exception:
+        return None
+    if not hits or hits[0][1] > 8.0:
+        return None
+    station, distance_km = hits[0]
+    return {
+        "name": station["name"],
+        "distance_km": round(distance_km, 2),
+        "walk_minutes": int(round((distance_km / 5) * 60)),
+    }
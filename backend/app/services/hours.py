@@ -0,0 +1,184 @@
+"""
+Opening-hours parsing into a weekly bitset.
+
+A week is 7 days x 96 fifteen-minute slots; bit (day * 96 + slot) is set when
+the cafe is open, with Monday as day 0. Free-text Cafe Nomad values such as
+"07:00-22:00", "週一至週五 08:00-18:00, 週六日 10:00-20:00",
+"11:30-21:00(週一至週四) 11:30-22:00(週五至週日)" or "12:00~02:00 週二公休"
+are handled; anything unparseable or ambiguous maps to None.
+"""
+
+import re
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+SLOT_MINUTES = 15
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES
+WEEK_SLOTS = 7 * SLOTS_PER_DAY
+MASK_BYTES = WEEK_SLOTS // 8
+ALL_WEEK = (1 << WEEK_SLOTS) - 1
+TAIPEI_TZ = timezone(timedelta(hours=8))
+
+_DAY_CHARS = {"一": 0, "二": 1, "三": 2, "四": 3, "五": 4, "六": 5, "日": 6, "天": 6}
+_DAY_WORD_DAYS = {
+    "平日": range(0, 5),
+    "假日": range(5, 7),
+    "週末": range(5, 7),
+    "周末": range(5, 7),
+    "每天": range(7),
+    "每日": range(7),
+}
+_DAY_RANGE = re.compile(r"(?:週|周|星期|禮拜)([一二三四五六日天])\s*(?:至|到|~|～|-|－)\s*(?:週|周|星期|禮拜)?([一二三四五六日天])")
+_DAY_LIST = re.compile(r"(?:週|周|星期|禮拜)([一二三四五六日天、,]+)")
+_DAY_WORD = re.compile("|".join(_DAY_WORD_DAYS))
+_TIME_RANGE = re.compile(r"(\d{1,2})[:：](\d{2})\s*(?:-|－|~|～|至|到)\s*(\d{1,2})[:：](\d{2})")
+_SEGMENT_SPLIT = re.compile(r"[;；\n/|]")
+_DAY_WORDS = r"(?:週|周|星期|禮拜)[一二三四五六日天、,，至到~～\-－週周星期禮拜]+"
+_CLOSED_AFTER = re.compile(r"(" + _DAY_WORDS + r")\s*(?:公休|休息|店休|休|不營業)")
+_CLOSED_BEFORE = re.compile(r"(?:公休|店休|不營業)\s*[:：]?\s*(" + _DAY_WORDS + r")")
+_ALWAYS = re.compile(r"24\s*(?:小時|hr|hours?)", re.IGNORECASE)
+# Day specs and time ranges in reading order; a segment pairs each day group
+# with the time group next to it.
+_TOKEN = re.compile(
+    "|".join(
+        f"(?P<{name}>{pattern.pattern})"
+        for name, pattern in (
+            ("always", _ALWAYS),
+            ("time", _TIME_RANGE),
+            ("range", _DAY_RANGE),
+            ("list", _DAY_LIST),
+            ("word", _DAY_WORD),
+        )
+    ),
+    re.IGNORECASE,
+)
+
+
+def _days(segment: str) -> Optional[List[int]]:
+    days: List[int] = []
+    for start, end in _DAY_RANGE.findall(segment):
+        a, b = _DAY_CHARS[start], _DAY_CHARS[end]
+        days.extend(range(a, b + 1) if a <= b else list(range(a, 7)) + list(range(0, b + 1)))
+    stripped = _DAY_RANGE.sub("", segment)
+    for chars in _DAY_LIST.findall(stripped):
+        days.extend(_DAY_CHARS[c] for c in chars if c in _DAY_CHARS)
+    for word in _DAY_WORD.findall(stripped):
+        days.extend(_DAY_WORD_DAYS[word])
+    return sorted(set(days)) if days else None
+
+
+def _day_mask(day: int, start_min: int, end_min: int) -> int:
+    """Bits for [start, end) on `day`, wrapping past midnight into the next day."""
+    if end_min <= start_min:
+        end_min += 24 * 60
+    first = day * SLOTS_PER_DAY + start_min // SLOT_MINUTES
+    last = day * SLOTS_PER_DAY + -(-end_min // SLOT_MINUTES)
+    mask = 0
+    for slot in range(first, last):
+        mask |= 1 << (slot % WEEK_SLOTS)
+    return mask
+
+
+def _groups(segment: str) -> List[Tuple[str, list]]:
+    """Runs of adjacent day specs ("days", [day]) and times ("times", [(start, end)])."""
+    groups: List[Tuple[str, list]] = []
+    for match in _TOKEN.finditer(segment):
+        if match.group("always"):
+            kind, items = "times", [(0, 24 * 60)]
+        elif match.group("time"):
+            h1, m1, h2, m2 = _TIME_RANGE.fullmatch(match.group("time")).groups()
+            start = int(h1) * 60 + int(m1)
+            end = int(h2) * 60 + int(m2)
+            if start > 24 * 60 or end > 24 * 60:
+                continue
+            kind, items = "times", [(start % (24 * 60), end % (24 * 60) or 24 * 60)]
+        else:
+            kind, items = "days", _days(match.group(0)) or []
+        if groups and groups[-1][0] == kind:
+            groups[-1][1].extend(items)
+        else:
+            groups.append((kind, items))
+    return groups
+
+
+def _pair(groups: List[Tuple[str, list]]) -> Optional[List[Tuple[Optional[list], list]]]:
+    """(days, times) pairs for one segment; days None means every day.
+
+    Days either all precede their times ("週一至週五 08:00-18:00 週六 10:00-20:00")
+    or all follow them ("11:30-21:00(週一至週四) 11:30-22:00(週五至週日)"). Any
+    other layout can't be paired reliably and gives None.
+    """
+    day_groups = sum(1 for kind, _ in groups if kind == "days")
+    time_groups = len(groups) - day_groups
+    if not time_groups:
+        return []
+    if not day_groups:
+        return [(None, items) for _, items in groups]
+    if day_groups != time_groups:
+        return None
+    days_first = groups[0][0] == "days"
+    pairs = []
+    for i in range(0, len(groups), 2):
+        (first_kind, first), (_, second) = groups[i], groups[i + 1]
+        if (first_kind == "days") != days_first:
+            return None
+        pairs.append((first, second) if days_first else (second, first))
+    return pairs
+
+
+def parse_open_time(text: Optional[str]) -> Optional[int]:
+    """Weekly bitset for a free-text opening time, or None if unparseable.
+
+    Hours given for specific days replace hours given without days, so
+    "08:00-20:00；週日 10:00-18:00" opens late on Sunday only.
+    """
+    if not text or not text.strip():
+        return None
+
+    # day -> [(start_minute, end_minute)]; closures drop a day's own hours,
+    # including any overnight spill into the next day.
+    every_day: List[tuple] = []
+    by_day: Dict[int, List[tuple]] = {}
+    closed_days = set()
+    for segment in _SEGMENT_SPLIT.split(text):
+        for pattern in (_CLOSED_AFTER, _CLOSED_BEFORE):
+            for phrase in pattern.findall(segment):
+                closed_days.update(_days(phrase) or [])
+            segment = pattern.sub(" ", segment)
+        pairs = _pair(_groups(segment))
+        if pairs is None:
+            return None
+        for days, times in pairs:
+            if days is None:
+                every_day.extend(times)
+            else:
+                for day in days:
+                    by_day.setdefault(day, []).extend(times)
+    if not every_day and not by_day:
+        return None
+
+    mask = 0
+    for day in range(7):
+        if day not in closed_days:
+            for start, end in by_day.get(day, every_day):
+                mask |= _day_mask(day, start, end)
+    return mask
+
+
+def slot_of(moment: datetime) -> int:
+    local = moment.astimezone(TAIPEI_TZ) if moment.tzinfo else moment
+    return local.weekday() * SLOTS_PER_DAY + (local.hour * 60 + local.minute) // SLOT_MINUTES
+
+
+def now_slot() -> int:
+    return slot_of(datetime.now(TAIPEI_TZ))
+
+
+def parse_open_at(value: str) -> int:
+    """Slot for an ISO datetime ("2025-03-01T14:30") or a time today ("14:30")."""
+    value = value.strip()
+    match = re.fullmatch(r"(\d{1,2}):(\d{2})", value)
+    if match:
+        today = datetime.now(TAIPEI_TZ)
+        return slot_of(today.replace(hour=int(match.group(1)), minute=int(match.group(2))))
+    return slot_of(datetime.fromisoformat(value))
@@ -0,0 +1,150 @@
+"""
+Fuzzy cafe-name search over a city snapshot.
+
+Names are split into Latin and CJK runs; Latin runs are indexed as
+character trigrams (padded, so word starts count) and CJK runs as bigrams,
+which handles mixed names such as "Louisa Coffee 路易莎". Both the full name
+and its core (normalize_name: no branch suffix or generic words) are
+indexed, so "路易莎 信義" and "louisa" both find "路易莎咖啡 (信義門市)".
+
+search() ranks by gram overlap (Dice), which tolerates typos, with a bonus
+for substring hits. Candidates come from the query's rarest grams only, so
+very common grams ("咖啡", "cof") never force a scan of the whole city, and
+only those sharing the most of them are scored. prefix=True is
+autocomplete: names or words starting with the query, via binary search
+over sorted keys.
+"""
+
+import re
+import unicodedata
+from bisect import bisect_left
+from collections import Counter
+from typing import Dict, Iterable, List, Set, Tuple
+from app.services.normalize import normalize_name
+
+_RUNS = re.compile(r"[㐀-鿿豈-﫿]+|[^\W_]+", re.UNICODE)
+_CJK = re.compile(r"[㐀-鿿豈-﫿]")
+MIN_SIMILARITY = 0.3
+SUBSTRING_BONUS = 0.5
+# Grams in more names than this are only used when nothing rarer is.
+COMMON_GRAM_LIMIT = 500
+MAX_CANDIDATE_GRAMS = 6
+# Candidates sharing the most seed grams that get a full similarity score.
+MAX_SCORED = 200
+# Keys walked per prefix lookup; bounds one-letter queries on big cities.
+MAX_PREFIX_SCAN = 500
+
+
+def _fold(text: str) -> str:
+    return unicodedata.normalize("NFKC", text or "").lower()
+
+
+def _grams(text: str) -> Set[str]:
+    grams: Set[str] = set()
+    for run in _RUNS.findall(_fold(text)):
+        if _CJK.match(run):
+            if len(run) == 1:
+                grams.add(run)
+            grams.update(run[i : i + 2] for i in range(len(run) - 1))
+        else:
+            padded = f" {run} "
+            grams.update(padded[i : i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def _compact(text: str) -> str:
+    return "".join(_RUNS.findall(_fold(text)))
+
+
+class NameIndex:
+    def __init__(self, cafes: Iterable):
+        self.names: List[str] = []
+        self.grams: List[Set[str]] = []
+        self.compact: List[str] = []
+        postings: Dict[str, List[int]] = {}
+        keys: List[Tuple[str, int]] = []
+        for position, cafe in enumerate(cafes):
+            name = cafe.get("name") or ""
+            core = normalize_name(name)
+            grams = _grams(name) | _grams(core)
+            self.names.append(name)
+            self.grams.append(grams)
+            self.compact.append(_compact(name))
+            for gram in grams:
+                postings.setdefault(gram, []).append(position)
+            # Prefix keys: the whole name, its core, and every word / CJK run.
+            for key in {_compact(name), core, *_RUNS.findall(_fold(name))}:
+                if key:
+                    keys.append((key, position))
+        self.postings = postings
+        keys.sort()
+        self.prefix_keys = [key for key, _ in keys]
+        self.prefix_positions = [position for _, position in keys]
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def search(self, query: str, limit: int = 10, prefix: bool = False) -> List[Tuple[int, float]]:
+        """(position, score) of the best matches, best first."""
+        if prefix:
+            return self._prefix(query, limit)
+        query_grams = _grams(query)
+        if not query_grams:
+            return []
+        known = sorted(
+            (g for g in query_grams if g in self.postings), key=lambda g: len(self.postings[g])
+        )
+        if not known:
+            return []
+        rare = [g for g in known if len(self.postings[g]) <= COMMON_GRAM_LIMIT]
+        candidates: Counter = Counter()
+        if rare:
+            for gram in rare[:MAX_CANDIDATE_GRAMS]:
+                candidates.update(self.postings[gram])
+        else:
+            # Only common grams ("咖啡"): the rarest one, as far as it goes.
+            candidates.update(self.postings[known[0]][:MAX_SCORED])
+
+        scored = (position for position, _ in candidates.most_common(MAX_SCORED))
+        return self._ranked(query, query_grams, scored, limit)
+
+    def search_within(
+        self, query: str, positions: Iterable[int], limit: int = 10
+    ) -> List[Tuple[int, float]]:
+        """search() restricted to `positions` (e.g. cafes near a point), scoring each of them."""
+        query_grams = _grams(query)
+        if not query_grams:
+            return []
+        return self._ranked(query, query_grams, positions, limit)
+
+    def _ranked(
+        self, query: str, query_grams: Set[str], positions: Iterable[int], limit: int
+    ) -> List[Tuple[int, float]]:
+        needle = _compact(query)
+        scored = []
+        for position in positions:
+            grams = self.grams[position]
+            score = 2 * len(query_grams & grams) / (len(query_grams) + len(grams))
+            if needle and needle in self.compact[position]:
+                score += SUBSTRING_BONUS
+            if score >= MIN_SIMILARITY:
+                scored.append((position, round(score, 3)))
+        scored.sort(key=lambda hit: (-hit[1], len(self.names[hit[0]]), hit[0]))
+        return scored[:limit]
+
+    def _prefix(self, query: str, limit: int) -> List[Tuple[int, float]]:
+        needle = _compact(query)
+        if not needle:
+            return []
+        seen: Dict[int, float] = {}
+        i = bisect_left(self.prefix_keys, needle)
+        end = min(len(self.prefix_keys), i + MAX_PREFIX_SCAN)
+        while i < end and self.prefix_keys[i].startswith(needle):
+            position = self.prefix_positions[i]
+            # Shorter completions rank first.
+            score = round(len(needle) / len(self.prefix_keys[i]), 3)
+            if score > seen.get(position, 0.0):
+                seen[position] = score
+            i += 1
+        hits = sorted(seen.items(), key=lambda hit: (-hit[1], len(self.names[hit[0]]), hit[0]))
+        return hits[:limit]
@@ -2,9 +2,12 @@
 Utilities for normalizing Cafe Nomad data:
 - MRT station name cleanup (strip exit numbers, walking directions)
 - District extraction from addresses
+- Cafe name normalization and n-grams, for matching records across sources
 """
 
 import re
+import unicodedata
+from typing import Set
 
 # Pattern to strip MRT exit numbers, walking directions, etc.
 # Examples:
@@ -73,6 +76,43 @@ def extract_district(address: str) -> str:
     return ""
 
 
+# Generic words that say nothing about which cafe it is. Longest first.
+_NAME_STOPWORDS = [
+    "咖啡專賣店", "咖啡工作室", "咖啡廳", "咖啡館", "咖啡店", "咖啡屋", "咖啡",
+    "coffee", "cafe", "café", "caffe", "espresso", "bar", "shop", "house", "studio",
+]
+# Branch suffixes: "(信義店)", "- 大安店", "忠孝店"
+_BRANCH = re.compile(r"[\(（【\[].*?[\)）】\]]|[-－–|｜].*$|\S{1,6}(?:分店|門市)$")
+_NAME_JUNK = re.compile(r"[\s\W_]+", re.UNICODE)
+
+
+def normalize_name(name: str) -> str:
+    """Reduce a cafe name to the part that identifies it.
+
+    Example: "Simple Kaffa 興波咖啡 (華山店)" → "simplekaffa興波"
+    """
+    if not name:
+        return ""
+    value = unicodedata.normalize("NFKC", name).lower()
+    core = _BRANCH.sub(" ", value)
+    # A name that is all branch suffix keeps its text.
+    value = core if core.strip() else value
+    for word in _NAME_STOPWORDS:
+        value = value.replace(word, " ")
+    value = _NAME_JUNK.sub("", value)
+    if not value:
+        # Nothing but generic words ("咖啡廳"): fall back to the plain text.
+        value = _NAME_JUNK.sub("", unicodedata.normalize("NFKC", name).lower())
+    return value
+
+
+def name_ngrams(normalized: str, n: int = 2) -> Set[str]:
+    """Character n-grams of a normalized name (CJK has no word breaks)."""
+    if len(normalized) <= n:
+        return {normalized} if normalized else set()
+    return {normalized[i : i + n] for i in range(len(normalized) - n + 1)}
+
+
 # Mapping for quiet score to human-readable labels
 QUIET_LABELS = {
     "lively": {"label": "熱鬧", "min": 0, "max": 2},
@@ -0,0 +1,291 @@
+"""
+Places-backed recommendation pipeline behind /api/cafes/recommend.
+
+Candidates come from one Places search (with Cafe Nomad attributes attached
+where entity_match links them); each is then enriched with its walk time to
+the chosen transit point or its nearest MRT station. The streaming variant
+enriches candidates concurrently and yields each entry as soon as it is sure
+to be in the result; the batch variant shares searches and station lookups
+across many specs.
+"""
+
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from math import radians, sin, cos, atan2, sqrt
+from typing import Callable, Dict, Iterator, List, Optional
+from app.services import ratelimit
+from app.services.entity_match import attach_local
+from app.services.google_places import search_places, search_places_near, find_nearest_mrt
+from app.services.resilience import submit
+from app.services.search_plan import find_near
+
+# Parallel MRT lookups per streaming request.
+STREAM_WORKERS = 6
+# Parallel specs per batch request.
+BATCH_WORKERS = 8
+
+
+def _walk_distance_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    earth_km = 6371.0
+    dlat = radians(lat2 - lat1)
+    dlng = radians(lng2 - lng1)
+    a = sin(dlat / 2) ** 2 + cos(radians(lat1)) * cos(radians(lat2)) * sin(dlng / 2) ** 2
+    return earth_km * 2 * atan2(sqrt(a), sqrt(1 - a))
+
+
+def candidate_limit(top_n: int, near_transit: bool) -> int:
+    if near_transit:
+        return min(max(top_n * 3, top_n), 20)
+    return top_n
+
+
+def fetch_candidates(
+    city: str,
+    keyword: Optional[str],
+    transit_lat: Optional[float],
+    transit_lng: Optional[float],
+    limit: int,
+) -> List[Dict]:
+    if transit_lat is not None and transit_lng is not None:
+        places = search_places_near(
+            city=city,
+            latitude=transit_lat,
+            longitude=transit_lng,
+            district=keyword,
+            limit=limit,
+        )
+    else:
+        places = search_places(city, keyword, limit=limit)
+    return attach_local(city, places)
+
+
+def rank_by_query(cafes: List[Dict], query: Optional[str]) -> List[Dict]:
+    if not query:
+        return cafes
+    q = query.strip().lower()
+    return sorted(
+        cafes, key=lambda c: 0 if q and q in (c.get("name") or "").lower() else 1
+    )
+
+
+def search_candidates(
+    city: str,
+    keyword: Optional[str],
+    query: Optional[str],
+    transit_lat: Optional[float],
+    transit_lng: Optional[float],
+    top_n: int,
+    transit_name: Optional[str] = None,
+    max_walk_minutes: Optional[int] = None,
+) -> List[Dict]:
+    near_transit = transit_lat is not None and transit_lng is not None
+    if near_transit and transit_name:
+        # Walk times are measured from this point, so the search is planned around it.
+        places = find_near(city, keyword, transit_lat, transit_lng, max_walk_minutes, top_n)
+        return rank_by_query(attach_local(city, places), query)
+    limit = candidate_limit(top_n, near_transit)
+    return rank_by_query(fetch_candidates(city, keyword, transit_lat, transit_lng, limit), query)
+
+
+def enrich(
+    cafe: Dict,
+    transit_lat: Optional[float],
+    transit_lng: Optional[float],
+    transit_name: Optional[str],
+    max_walk_minutes: Optional[int],
+    nearest_mrt: Callable = find_nearest_mrt,
+) -> Optional[Dict]:
+    """Recommendation entry for one candidate, or None if it is too far away."""
+    if cafe.get("latitude") and cafe.get("longitude"):
+        if transit_lat is not None and transit_lng is not None and transit_name:
+            dist = _walk_distance_km(
+                cafe["latitude"], cafe["longitude"], transit_lat, transit_lng
+            )
+            walk_minutes = int(round((dist / 5) * 60))
+            if max_walk_minutes is not None and walk_minutes > max_walk_minutes:
+                return None
+            cafe = dict(cafe)
+            cafe["transit_name"] = transit_name
+            cafe["transit_distance_km"] = round(dist, 2)
+            cafe["transit_walk_minutes"] = walk_minutes
+        else:
+            with ratelimit.lane("enrichment"):
+                mrt = nearest_mrt(cafe["latitude"], cafe["longitude"])
+            if mrt:
+                if max_walk_minutes is not None and mrt["walk_minutes"] > max_walk_minutes:
+                    return None
+                cafe = dict(cafe)
+                cafe["mrt_station"] = mrt["name"]
+                cafe["mrt_distance_km"] = mrt["distance_km"]
+                cafe["mrt_walk_minutes"] = mrt["walk_minutes"]
+    return {"cafe": cafe, "score": None, "distance_km": None}
+
+
+def recommend(
+    cafes: List[Dict],
+    transit_lat: Optional[float],
+    transit_lng: Optional[float],
+    transit_name: Optional[str],
+    max_walk_minutes: Optional[int],
+    top_n: int,
+    nearest_mrt: Callable = find_nearest_mrt,
+) -> List[Dict]:
+    enriched = []
+    for cafe in cafes:
+        entry = enrich(cafe, transit_lat, transit_lng, transit_name, max_walk_minutes, nearest_mrt)
+        if entry is None:
+            continue
+        enriched.append(entry)
+        if len(enriched) >= top_n:
+            break
+    return enriched
+
+
+def stream_recommendations(
+    cafes: List[Dict],
+    transit_lat: Optional[float],
+    transit_lng: Optional[float],
+    transit_name: Optional[str],
+    max_walk_minutes: Optional[int],
+    top_n: int,
+) -> Iterator[Dict]:
+    """Yield the same entries as recommend(), each as soon as it is certain to be one.
+
+    `rank` is the candidate's search position. An enriched candidate is sent
+    once fewer than top_n earlier candidates can still survive, so the set
+    matches recommend() while the order follows completion.
+    """
+    if not cafes:
+        return
+    pool = ThreadPoolExecutor(max_workers=min(STREAM_WORKERS, len(cafes)))
+    try:
+        futures = {
+            submit(pool, enrich, cafe, transit_lat, transit_lng, transit_name, max_walk_minutes): rank
+            for rank, cafe in enumerate(cafes)
+        }
+        # rank -> entry (None: dropped) for every finished candidate not sent yet.
+        finished: Dict[int, Optional[Dict]] = {}
+        dropped = [False] * len(cafes)
+        sent = 0
+        for future in as_completed(futures):
+            rank = futures[future]
+            entry = future.result()
+            if entry is None:
+                dropped[rank] = True
+            else:
+                finished[rank] = entry
+            for ready in sorted(finished):
+                # Earlier candidates still pending or kept can push this one out.
+                if ready - sum(dropped[:ready]) >= top_n:
+                    break
+                entry = finished.pop(ready)
+                entry["rank"] = ready
+                yield entry
+                sent += 1
+            if sent >= top_n:
+                break
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+class _SingleFlight:
+    """Runs each key's work once per batch; concurrent callers share the result."""
+
+    def __init__(self):
+        self._futures: Dict[object, Future] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn: Callable):
+        with self._lock:
+            future = self._futures.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._futures[key] = future
+        if owner:
+            try:
+                future.set_result(fn())
+            except Exception as e:
+                future.set_exception(e)
+        return future.result()
+
+
+def recommend_batch(specs: List[Dict]) -> Dict[str, Dict]:
+    """Recommendations for many specs, keyed by spec id.
+
+    Specs that differ only in top_n / query / walk limit share one Places
+    search (fetched at the largest size any of them needs), and nearest-MRT
+    lookups are de-duplicated across the whole batch.
+    """
+    groups: Dict[tuple, int] = {}
+    for spec in specs:
+        key = _search_key(spec)
+        groups[key] = max(groups.get(key, 0), _search_limit(spec))
+
+    searches = _SingleFlight()
+    lookups = _SingleFlight()
+
+    def nearest_mrt(lat: float, lng: float):
+        return lookups.do((round(lat, 4), round(lng, 4)), lambda: find_nearest_mrt(lat, lng))
+
+    def run(spec: Dict) -> Dict:
+        key = _search_key(spec)
+        shared = searches.do(key, lambda: _fetch(key, groups[key]))
+        cafes = rank_by_query(shared[: _search_limit(spec)], spec.get("query"))
+        return {
+            "recommendations": recommend(
+                cafes,
+                spec.get("transit_lat"),
+                spec.get("transit_lng"),
+                spec.get("transit_name"),
+                spec.get("max_walk_minutes"),
+                spec["top_n"],
+                nearest_mrt,
+            )
+        }
+
+    results: Dict[str, Dict] = {}
+    with ThreadPoolExecutor(max_workers=max(1, min(BATCH_WORKERS, len(specs)))) as pool:
+        futures = {spec["id"]: submit(pool, run, spec) for spec in specs}
+        for spec_id, future in futures.items():
+            try:
+                results[spec_id] = future.result()
+            except Exception as e:
+                results[spec_id] = {"recommendations": [], "error": str(e)}
+    return results
+
+
+def _planned(spec: Dict) -> bool:
+    near_transit = spec.get("transit_lat") is not None and spec.get("transit_lng") is not None
+    return near_transit and bool(spec.get("transit_name"))
+
+
+def _search_limit(spec: Dict) -> int:
+    if _planned(spec):
+        return spec["top_n"]
+    near_transit = spec.get("transit_lat") is not None and spec.get("transit_lng") is not None
+    return candidate_limit(spec["top_n"], near_transit)
+
+
+def _search_key(spec: Dict) -> tuple:
+    keyword = spec.get("query") or spec.get("district")
+    # Planned searches depend on the walk limit (it is their radius), so it is part of the key.
+    if _planned(spec):
+        return (
+            "near",
+            spec["city"],
+            keyword,
+            spec["transit_lat"],
+            spec["transit_lng"],
+            spec.get("max_walk_minutes"),
+        )
+    return ("text", spec["city"], keyword, spec.get("transit_lat"), spec.get("transit_lng"))
+
+
+def _fetch(key: tuple, limit: int) -> List[Dict]:
+    if key[0] == "near":
+        _, city, keyword, transit_lat, transit_lng, max_walk_minutes = key
+        places = find_near(city, keyword, transit_lat, transit_lng, max_walk_minutes, limit)
+        return attach_local(city, places)
+    _, city, keyword, transit_lat, transit_lng = key
+    return fetch_candidates(city, keyword, transit_lat, transit_lng, limit)
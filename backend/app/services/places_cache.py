@@ -0,0 +1,134 @@
+"""
+Persistent on-disk cache for Places API responses.
+
+Entries are keyed by endpoint, payload and field mask and stored in a
+memory-mapped SQLite file, so a restarted or reloaded worker answers the warm
+set without calling Google again. Reads are a single primary-key lookup.
+
+Environment:
+- PLACES_CACHE_PATH       (default data/places_cache.db)
+- PLACES_CACHE_TTL        seconds an entry stays fresh (default 86400)
+- PLACES_CACHE_MAX_MB     size cap before least-recently-used eviction (default 64)
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+from app.database import DB_DIR
+
+CACHE_PATH = os.getenv("PLACES_CACHE_PATH", os.path.join(DB_DIR, "places_cache.db"))
+CACHE_TTL_SECONDS = float(os.getenv("PLACES_CACHE_TTL", "86400"))
+CACHE_MAX_BYTES = int(float(os.getenv("PLACES_CACHE_MAX_MB", "64")) * 1024 * 1024)
+# Stale entries are kept this long past expiry as a fallback for outages.
+STALE_GRACE_SECONDS = 7 * 86400
+# Skip last_access writes for entries touched recently.
+_ACCESS_RESOLUTION_SECONDS = 60
+_EVICT_CHECK_EVERY = 100
+
+_local = threading.local()
+_lock = threading.Lock()
+_writes_since_check = 0
+
+
+def _conn() -> sqlite3.Connection:
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(CACHE_PATH, timeout=5, isolation_level=None)
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA mmap_size=268435456")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS places_cache ("
+            " key TEXT PRIMARY KEY, endpoint TEXT NOT NULL, field_mask TEXT NOT NULL,"
+            " body BLOB NOT NULL, size INTEGER NOT NULL, created_at REAL NOT NULL,"
+            " expires_at REAL NOT NULL, last_access REAL NOT NULL)"
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS ix_places_cache_last_access ON places_cache (last_access)"
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS ix_places_cache_expires_at ON places_cache (expires_at)"
+        )
+        _local.conn = conn
+    return conn
+
+
+def make_key(endpoint: str, payload: dict, field_mask: str) -> str:
+    canonical = json.dumps([endpoint, payload, field_mask], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(canonical.encode("utf-8")).hexdigest()
+
+
+def get(key: str, allow_stale: bool = False) -> Optional[dict]:
+    now = time.time()
+    conn = _conn()
+    row = conn.execute(
+        "SELECT body, expires_at, last_access FROM places_cache WHERE key = ?", (key,)
+    ).fetchone()
+    if row is None:
+        return None
+    body, expires_at, last_access = row
+    if expires_at < now and not allow_stale:
+        return None
+    if now - last_access > _ACCESS_RESOLUTION_SECONDS:
+        conn.execute("UPDATE places_cache SET last_access = ? WHERE key = ?", (now, key))
+    return json.loads(body)
+
+
+def put(key: str, endpoint: str, field_mask: str, data: dict) -> None:
+    global _writes_since_check
+    now = time.time()
+    body = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    _conn().execute(
+        "INSERT OR REPLACE INTO places_cache"
+        " (key, endpoint, field_mask, body, size, created_at, expires_at, last_access)"
+        " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        (key, endpoint, field_mask, body, len(body), now, now + CACHE_TTL_SECONDS, now),
+    )
+    with _lock:
+        _writes_since_check += 1
+        check = _writes_since_check >= _EVICT_CHECK_EVERY
+        if check:
+            _writes_since_check = 0
+    if check:
+        evict()
+
+
+def evict(max_bytes: int = CACHE_MAX_BYTES) -> int:
+    """Drop long-expired entries, then least-recently-used ones down to 90% of the cap."""
+    conn = _conn()
+    removed = conn.execute(
+        "DELETE FROM places_cache WHERE expires_at < ?", (time.time() - STALE_GRACE_SECONDS,)
+    ).rowcount
+    total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM places_cache").fetchone()[0]
+    if total <= max_bytes:
+        return removed
+
+    target = int(max_bytes * 0.9)
+    victims = []
+    for key, size in conn.execute("SELECT key, size FROM places_cache ORDER BY last_access"):
+        if total <= target:
+            break
+        victims.append((key,))
+        total -= size
+    conn.executemany("DELETE FROM places_cache WHERE key = ?", victims)
+    return removed + len(victims)
+
+
+def compact() -> dict:
+    removed = evict()
+    conn = _conn()
+    conn.execute("PRAGMA incremental_vacuum")
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    entries, size = conn.execute(
+        "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM places_cache"
+    ).fetchone()
+    return {"removed": removed, "entries": entries, "bytes": size}
+
+
+def clear() -> None:
+    _conn().execute("DELETE FROM places_cache")
@@ -0,0 +1,153 @@
+"""
+Process-wide token bucket with priority lanes for outbound upstream calls.
+
+Every call takes a token from one shared bucket. Callers say which lane
+they are in with the lane() context manager (a ContextVar, so it follows
+the request into thread pools started with resilience.submit()); the
+default is "interactive".
+
+- interactive: the user is waiting on this call
+- enrichment: fan-out that decorates a response (transit checks, MRT lookups)
+- background: warm-ups and precompute jobs
+
+A lane never takes a token while a higher lane is waiting, and lower lanes
+leave a reserve in the bucket, so a background job running flat out still
+leaves interactive requests an immediate burst. Each lane has a bounded
+queue; a full queue, or a wait longer than the lane allows (or than the
+request deadline), raises RateLimited so the caller can fall back instead
+of piling up.
+"""
+
+import contextvars
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+from app.services import resilience
+
+LANES = ("interactive", "enrichment", "background")
+# Share of the burst each lane leaves untouched for the lanes above it.
+LANE_RESERVE = {"interactive": 0.0, "enrichment": 0.1, "background": 0.5}
+# Longest a call waits for a token, before the request deadline.
+LANE_MAX_WAIT = {"interactive": 2.0, "enrichment": 5.0, "background": 60.0}
+
+_LANE: contextvars.ContextVar[str] = contextvars.ContextVar("cafepick_lane", default="interactive")
+
+
+class RateLimited(RuntimeError):
+    pass
+
+
+@contextmanager
+def lane(name: str) -> Iterator[None]:
+    if name not in LANES:
+        raise ValueError(f"unknown lane: {name}")
+    token = _LANE.set(name)
+    try:
+        yield
+    finally:
+        _LANE.reset(token)
+
+
+def current_lane() -> str:
+    return _LANE.get()
+
+
+class _LaneStats:
+    __slots__ = ("granted", "rejected", "timed_out", "wait_total", "wait_max")
+
+    def __init__(self):
+        self.granted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+
+class PriorityLimiter:
+    def __init__(self, rate: float, burst: float, queue_limits: Dict[str, int]):
+        self.rate = rate
+        self.burst = burst
+        self.queue_limits = queue_limits
+        self.tokens = burst
+        self._updated = time.monotonic()
+        self._queues: Dict[str, deque] = {name: deque() for name in LANES}
+        self._stats: Dict[str, _LaneStats] = {name: _LaneStats() for name in LANES}
+        self._cond = threading.Condition()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _needed(self, name: str) -> float:
+        return 1.0 + LANE_RESERVE[name] * self.burst
+
+    def _higher_waiting(self, name: str) -> bool:
+        return any(self._queues[other] for other in LANES[: LANES.index(name)])
+
+    def _grant(self, name: str, waited: float) -> None:
+        self.tokens -= 1.0
+        stats = self._stats[name]
+        stats.granted += 1
+        stats.wait_total += waited
+        stats.wait_max = max(stats.wait_max, waited)
+
+    def acquire(self, name: Optional[str] = None) -> None:
+        """Take a token for the current (or given) lane, waiting if allowed."""
+        name = name or current_lane()
+        started = time.monotonic()
+        max_wait = LANE_MAX_WAIT[name]
+        left = resilience.remaining()
+        if left is not None:
+            max_wait = min(max_wait, left)
+        with self._cond:
+            self._refill()
+            queue = self._queues[name]
+            if not queue and not self._higher_waiting(name) and self.tokens >= self._needed(name):
+                self._grant(name, 0.0)
+                return
+            if len(queue) >= self.queue_limits[name]:
+                self._stats[name].rejected += 1
+                raise RateLimited(f"{name} queue is full")
+            ticket = object()
+            queue.append(ticket)
+            try:
+                while True:
+                    self._refill()
+                    ready = queue[0] is ticket and not self._higher_waiting(name)
+                    if ready and self.tokens >= self._needed(name):
+                        self._grant(name, time.monotonic() - started)
+                        return
+                    left = started + max_wait - time.monotonic()
+                    if left <= 0:
+                        self._stats[name].timed_out += 1
+                        raise RateLimited(f"no {name} token within {max_wait:.1f}s")
+                    # Sleep until enough tokens should have accrued, or until woken.
+                    short = max(self._needed(name) - self.tokens, 0.0) / self.rate
+                    self._cond.wait(min(left, max(short, 0.001)))
+            finally:
+                queue.remove(ticket)
+                self._cond.notify_all()
+
+    def status(self) -> Dict[str, object]:
+        with self._cond:
+            self._refill()
+            return {
+                "rate_per_second": self.rate,
+                "burst": self.burst,
+                "tokens": round(self.tokens, 2),
+                "lanes": {
+                    name: {
+                        "waiting": len(self._queues[name]),
+                        "queue_limit": self.queue_limits[name],
+                        "granted": s.granted,
+                        "rejected": s.rejected,
+                        "timed_out": s.timed_out,
+                        "avg_wait_ms": round(s.wait_total / s.granted * 1000, 1) if s.granted else 0.0,
+                        "max_wait_ms": round(s.wait_max * 1000, 1),
+                    }
+                    for name, s in self._stats.items()
+                },
+            }
@@ -1,6 +1,35 @@
+"""
+Score-based recommendations over the local catalog (cafes table).
+
+recommend_cafes() returns the same top-k as scoring every matching cafe and
+sorting (recommend_cafes_sql, the reference implementation), but runs a
+threshold algorithm over per-city sorted orders instead: cafes are visited
+best-first by wifi / socket / quiet / cheap / seat and by distance rings
+around the user, each visited cafe is scored exactly, and the scan stops
+once the best score an unvisited cafe could still reach cannot displace the
+current k-th result. Ties break by rowid, which is also the order the SQL
+path sorts in. A city's sorted orders are rebuilt whenever its
+data_version() changes, including after an import by another process.
+"""
+
+import heapq
 import math
+import threading
+from collections import defaultdict, namedtuple
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+from sqlalchemy import func, literal_column
 from sqlalchemy.orm import Session
 from app.models.cafe import Cafe
+from app.models.cafe_tombstone import CafeTombstone
+
+CRITERIA = ("wifi", "socket", "quiet", "cheap")
+# Cafes taken from each sorted order per round.
+ROUND_SIZE = 16
+GRID_DEGREES = 0.01
+# Beyond this the distance bonus is 0.
+MAX_BONUS_KM = 5.0
+
+_ROWID = literal_column("cafes.rowid")
 
 
 def _haversine(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
@@ -17,97 +46,354 @@ def _haversine(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
     return R * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
 
 
-def recommend_cafes(db: Session, filters: dict, top_n: int = 3) -> list:
+def _distance_bonus(distance: Optional[float]) -> float:
+    # Closer = higher bonus (max 2 points within 500m)
+    if distance is None:
+        return 0.0
+    if distance < 0.5:
+        return 2.0
+    if distance < 1.0:
+        return 1.5
+    if distance < 2.0:
+        return 1.0
+    if distance < 5.0:
+        return 0.5
+    return 0.0
+
+
+def _total(filters: dict, values: Dict[str, float], seat_bonus: float, distance_bonus: float) -> float:
+    """Final score from the parts. Non-decreasing in every argument, so it also
+    gives an upper bound when fed upper bounds."""
+    score = 0.0
+    weight_sum = 0.0
+
+    # Score based on requested criteria (weighted matching)
+    for key in CRITERIA:
+        requested = filters.get(key)
+        if requested is not None and requested > 0:
+            # How well does this cafe meet the requirement? (0-1)
+            match_ratio = min(values[key] / requested, 1.0) if requested else 1.0
+            weight = requested  # Higher requirement = higher weight
+            score += match_ratio * weight
+            weight_sum += weight
+
+    score += seat_bonus
+    score += distance_bonus
+
+    # Normalize score
+    return score / weight_sum if weight_sum > 0 else score
+
+
+def _score(cafe, filters: dict) -> Tuple[float, Optional[float]]:
+    """(final score, distance km) for a Cafe row or an index row."""
+    values = {key: getattr(cafe, key) for key in CRITERIA}
+
+    # Bonus for seat availability
+    seat_bonus = 0.5 if cafe.seat and cafe.seat > 3 else 0.0
+
+    # Distance bonus (if user location provided)
+    distance = None
+    if (
+        filters.get("latitude")
+        and filters.get("longitude")
+        and cafe.latitude
+        and cafe.longitude
+    ):
+        distance = _haversine(
+            filters["latitude"],
+            filters["longitude"],
+            cafe.latitude,
+            cafe.longitude,
+        )
+    return _total(filters, values, seat_bonus, _distance_bonus(distance)), distance
+
+
+def _entry(cafe: Cafe, score: float, distance: Optional[float]) -> dict:
+    return {
+        "cafe": {
+            "id": cafe.id,
+            "name": cafe.name,
+            "address": cafe.address,
+            "latitude": cafe.latitude,
+            "longitude": cafe.longitude,
+            "wifi": cafe.wifi,
+            "socket": cafe.socket,
+            "quiet": cafe.quiet,
+            "mrt": cafe.mrt,
+            "limited_time": cafe.limited_time,
+            "nearest_station": cafe.nearest_station,
+            "nearest_station_walk_minutes": cafe.nearest_station_walk_minutes,
+        },
+        "score": round(score, 2),
+        "distance_km": round(distance, 2) if distance else None,
+    }
+
+
+def recommend_cafes_sql(db: Session, filters: dict, top_n: int = 3) -> list:
     """
     Recommendation algorithm v1: score-based matching.
 
     Each cafe gets a score based on how well it matches the user's criteria.
-    Higher score = better match.
+    Higher score = better match. Scores every matching cafe; recommend_cafes
+    returns the same result without doing so.
     """
     query = db.query(Cafe)
 
     # Apply hard filters
     if filters.get("city"):
         query = query.filter(Cafe.city == filters["city"])
+    if filters.get("district"):
+        query = query.filter(Cafe.district == filters["district"])
     if filters.get("mrt"):
         query = query.filter(Cafe.mrt.contains(filters["mrt"]))
     if filters.get("limited_time") == "no":
         query = query.filter(Cafe.limited_time == "no")
+    if filters.get("max_walk_minutes") is not None:
+        # Precomputed by scripts/compute_nearest_stations.py
+        query = query.filter(Cafe.nearest_station_walk_minutes <= filters["max_walk_minutes"])
 
-    cafes = query.all()
+    cafes = query.order_by(_ROWID).all()
     if not cafes:
         return []
 
     scored = []
     for cafe in cafes:
-        score = 0.0
-        weight_sum = 0.0
-
-        # Score based on requested criteria (weighted matching)
-        criteria = [
-            ("wifi", cafe.wifi),
-            ("socket", cafe.socket),
-            ("quiet", cafe.quiet),
-            ("cheap", cafe.cheap),
-        ]
-
-        for key, cafe_val in criteria:
-            requested = filters.get(key)
-            if requested is not None and requested > 0:
-                # How well does this cafe meet the requirement? (0-1)
-                match_ratio = min(cafe_val / requested, 1.0) if requested else 1.0
-                weight = requested  # Higher requirement = higher weight
-                score += match_ratio * weight
-                weight_sum += weight
-
-        # Bonus for seat availability
-        if cafe.seat and cafe.seat > 3:
-            score += 0.5
-
-        # Distance bonus (if user location provided)
-        distance = None
-        if (
-            filters.get("latitude")
-            and filters.get("longitude")
-            and cafe.latitude
-            and cafe.longitude
-        ):
-            distance = _haversine(
-                filters["latitude"],
-                filters["longitude"],
-                cafe.latitude,
-                cafe.longitude,
-            )
-            # Closer = higher bonus (max 2 points within 500m)
-            if distance < 0.5:
-                score += 2.0
-            elif distance < 1.0:
-                score += 1.5
-            elif distance < 2.0:
-                score += 1.0
-            elif distance < 5.0:
-                score += 0.5
-
-        # Normalize score
-        final_score = score / weight_sum if weight_sum > 0 else score
-
-        scored.append({
-        "cafe": {
-            "id": cafe.id,
-            "name": cafe.name,
-            "address": cafe.address,
-            "latitude": cafe.latitude,
-            "longitude": cafe.longitude,
-            "wifi": cafe.wifi,
-            "socket": cafe.socket,
-            "quiet": cafe.quiet,
-            "mrt": cafe.mrt,
-            "limited_time": cafe.limited_time,
-        },
-        "score": round(final_score, 2),
-        "distance_km": round(distance, 2) if distance else None,
-    })
+        final_score, distance = _score(cafe, filters)
+        scored.append(_entry(cafe, final_score, distance))
 
     # Sort by score descending
     scored.sort(key=lambda x: x["score"], reverse=True)
     return scored[:top_n]
+
+
+# --- threshold top-k --------------------------------------------------------
+
+_Row = namedtuple(
+    "_Row",
+    "rowid id wifi socket quiet cheap seat latitude longitude district mrt limited_time"
+    " walk_minutes",
+)
+
+_ASCII_LOWER = str.maketrans("ABCDEFGHIJKLMNOPQRSTUVWXYZ", "abcdefghijklmnopqrstuvwxyz")
+
+
+class _CityIndex:
+    def __init__(self, rows: List[_Row]):
+        self.rows = rows
+        n = len(rows)
+        # Best-first orders; sort is stable, so equal values stay in rowid order.
+        self.orders = {
+            key: sorted(range(n), key=lambda i, k=key: -(getattr(rows[i], k) or 0))
+            for key in CRITERIA + ("seat",)
+        }
+        self.grid: Dict[Tuple[int, int], List[int]] = defaultdict(list)
+        self.max_abs_lat = 0.0
+        for i, row in enumerate(rows):
+            if row.latitude and row.longitude:
+                self.grid[_cell(row.latitude, row.longitude)].append(i)
+                self.max_abs_lat = max(self.max_abs_lat, abs(row.latitude))
+        self.located = sum(len(ids) for ids in self.grid.values())
+        xs = [x for x, _ in self.grid] or [0]
+        ys = [y for _, y in self.grid] or [0]
+        self.bounds = (min(xs), max(xs), min(ys), max(ys))
+
+    def rings(self, lat: float, lng: float) -> Iterator[Tuple[List[int], float]]:
+        """Cafes by grid ring around (lat, lng), each batch with a lower bound
+        on the distance (km) of every cafe not yet yielded."""
+        cx, cy = _cell(lat, lng)
+        # km per GRID_DEGREES along the shorter axis, with a little slack.
+        cos_lat = math.cos(math.radians(min(89.0, max(self.max_abs_lat, abs(lat)) + 0.1)))
+        step_km = 6371 * math.radians(GRID_DEGREES) * cos_lat * 0.99
+        min_x, max_x, min_y, max_y = self.bounds
+        reach = max(abs(cx - min_x), abs(cx - max_x), abs(cy - min_y), abs(cy - max_y))
+        for r in range(reach + 1):
+            batch: List[int] = []
+            for x in range(cx - r, cx + r + 1):
+                for y in range(cy - r, cy + r + 1):
+                    if max(abs(x - cx), abs(y - cy)) == r:
+                        batch.extend(self.grid.get((x, y), ()))
+            yield batch, r * step_km
+
+
+def _cell(lat: float, lng: float) -> Tuple[int, int]:
+    return (math.floor(lat / GRID_DEGREES), math.floor(lng / GRID_DEGREES))
+
+
+# city -> (data_version it was built at, index)
+_INDEXES: Dict[Optional[str], Tuple[str, _CityIndex]] = {}
+_LOCK = threading.Lock()
+
+
+def data_version(db: Session, city: Optional[str]) -> str:
+    """Changes whenever recommend_cafes could answer differently for `city` (None: all).
+
+    Imports stamp added / changed cafes and tombstones with a catalog version,
+    and the nearest-station job bumps stations_computed_at, so this also sees
+    changes made by other processes.
+    """
+    cafes = db.query(
+        func.count(Cafe.id), func.max(Cafe.stations_computed_at), func.max(Cafe.version)
+    )
+    deleted = db.query(func.max(CafeTombstone.version))
+    if city:
+        cafes = cafes.filter(Cafe.city == city)
+        deleted = deleted.filter(CafeTombstone.city == city)
+    count, computed, version = cafes.one()
+    return f"{max(version or 0, deleted.scalar() or 0)}:{count}:{computed or 0}"
+
+
+def _load_index(db: Session, city: Optional[str]) -> _CityIndex:
+    version = data_version(db, city)
+    cached = _INDEXES.get(city)
+    if cached and cached[0] == version:
+        return cached[1]
+    with _LOCK:
+        cached = _INDEXES.get(city)
+        if cached and cached[0] == version:
+            return cached[1]
+        query = db.query(
+            _ROWID,
+            Cafe.id,
+            Cafe.wifi,
+            Cafe.socket,
+            Cafe.quiet,
+            Cafe.cheap,
+            Cafe.seat,
+            Cafe.latitude,
+            Cafe.longitude,
+            Cafe.district,
+            Cafe.mrt,
+            Cafe.limited_time,
+            Cafe.nearest_station_walk_minutes,
+        )
+        if city:
+            query = query.filter(Cafe.city == city)
+        index = _CityIndex([_Row(*row) for row in query.order_by(_ROWID)])
+        _INDEXES[city] = (version, index)
+        return index
+
+
+def invalidate_index(city: Optional[str]) -> None:
+    """Drop the city's sorted orders so the next call reads the table again."""
+    with _LOCK:
+        _INDEXES.pop(city, None)
+
+
+def _matcher(filters: dict):
+    """Python version of recommend_cafes_sql's hard filters (minus city)."""
+    district = filters.get("district")
+    mrt = filters.get("mrt")
+    # SQLite LIKE folds ASCII case only.
+    needle = mrt.translate(_ASCII_LOWER) if mrt else None
+    limited_no = filters.get("limited_time") == "no"
+    max_walk = filters.get("max_walk_minutes")
+
+    def matches(row: _Row) -> bool:
+        if district and row.district != district:
+            return False
+        if needle and (row.mrt is None or needle not in row.mrt.translate(_ASCII_LOWER)):
+            return False
+        if limited_no and row.limited_time != "no":
+            return False
+        if max_walk is not None and (row.walk_minutes is None or row.walk_minutes > max_walk):
+            return False
+        return True
+
+    return matches
+
+
+def top_k(index: _CityIndex, filters: dict, k: int) -> List[Tuple[float, float, Optional[float], _Row]]:
+    """(rounded score, exact score, distance, row) of the k best rows, best first."""
+    rows = index.rows
+    if k <= 0 or not rows:
+        return []
+    matches = _matcher(filters)
+    active = [key for key in CRITERIA if (filters.get(key) or 0) > 0] + ["seat"]
+    rings = None
+    if filters.get("latitude") and filters.get("longitude"):
+        rings = index.rings(filters["latitude"], filters["longitude"])
+    ring_bound_km = 0.0
+
+    # Min-heap of the current best k, keyed so the worst result is on top.
+    heap: List[Tuple[float, int, float, Optional[float], int]] = []
+    seen: Set[int] = set()
+    located_seen = 0
+
+    def visit(i: int) -> None:
+        seen.add(i)
+        row = rows[i]
+        if not matches(row):
+            return
+        score, distance = _score(row, filters)
+        item = (round(score, 2), -row.rowid, score, distance, i)
+        if len(heap) < k:
+            heapq.heappush(heap, item)
+        elif item[:2] > heap[0][:2]:
+            heapq.heapreplace(heap, item)
+
+    depth = 0
+    n = len(rows)
+    while depth < n:
+        stop = min(depth + ROUND_SIZE, n)
+        for key in active:
+            for i in index.orders[key][depth:stop]:
+                if i not in seen:
+                    visit(i)
+        depth = stop
+
+        distance_bound = 0.0
+        if rings is not None:
+            if ring_bound_km < MAX_BONUS_KM and located_seen < index.located:
+                batch, ring_bound_km = next(rings, ([], MAX_BONUS_KM))
+                for i in batch:
+                    located_seen += 1
+                    if i not in seen:
+                        visit(i)
+            if located_seen < index.located:
+                distance_bound = _distance_bonus(ring_bound_km)
+        if depth >= n or len(heap) < k:
+            continue
+
+        # Best score any unseen cafe could still reach.
+        frontier = {key: getattr(rows[index.orders[key][depth]], key) or 0 for key in CRITERIA}
+        next_seat = rows[index.orders["seat"][depth]].seat
+        threshold = _total(
+            filters,
+            frontier,
+            0.5 if next_seat and next_seat > 3 else 0.0,
+            distance_bound,
+        )
+        bound = round(threshold, 2)
+        if heap[0][0] > bound:
+            break
+        if heap[0][0] == bound and heap[0][4] <= len(seen):
+            # Unseen cafes can at best tie the k-th result, and ties go to the
+            # lower rowid: visit the unseen rows before the k-th one and stop.
+            # (Only once that is cheap; otherwise the bound may still drop.)
+            i = 0
+            while i < heap[0][4]:
+                if i not in seen:
+                    visit(i)
+                i += 1
+            break
+
+    best = sorted(heap, key=lambda item: (-item[0], -item[1]))
+    return [(rounded, score, distance, rows[i]) for rounded, _, score, distance, i in best]
+
+
+def recommend_cafes(db: Session, filters: dict, top_n: int = 3) -> list:
+    """Top `top_n` cafes for `filters`; same result as recommend_cafes_sql."""
+    mrt = filters.get("mrt")
+    if mrt and ("%" in mrt or "_" in mrt):
+        # LIKE wildcards in the needle; leave those to SQLite.
+        return recommend_cafes_sql(db, filters, top_n)
+    index = _load_index(db, filters.get("city") or None)
+    best = top_k(index, filters, top_n)
+    if not best:
+        return []
+    cafes = {c.id: c for c in db.query(Cafe).filter(Cafe.id.in_([row.id for *_, row in best]))}
+    return [
+        _entry(cafes[row.id], score, distance)
+        for _, score, distance, row in best
+        if row.id in cafes
+    ]
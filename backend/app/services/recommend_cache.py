@@ -0,0 +1,180 @@
+"""
+Precomputed /cafes/recommend/local results for the hottest filter sets.
+
+Most requests are one of a few preference combinations (PRESETS: wifi /
+socket / quiet, no location, no MRT) for a city's busiest districts.
+precompute_city() runs recommend_cafes for every such combination and
+stores the top MAX_TOP_N entries in the precomputed_recommendations table,
+tagged with the city's data_version(); scripts/precompute_recommendations.py
+and the importer call it.
+
+Workers load the table into a dict of pre-serialized entries, keeping only
+entries whose tag still matches the city's current data version, so an
+import or a nearest-station refresh retires them without any explicit
+invalidation. A request with a current entry is answered by one dict lookup
+and a byte join; anything else falls back to live scoring and is counted in
+status(), which shows which filter sets would be worth adding to PRESETS.
+"""
+
+import json
+import threading
+import time
+from collections import Counter
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from app.database import SessionLocal
+from app.models.cafe import Cafe
+from app.models.recommendation import PrecomputedRecommendation
+from app.services.recommend import CRITERIA, data_version, invalidate_index, recommend_cafes
+from app.services.serialize import dumps, join_array
+
+# /cafes/recommend/local allows top_n up to 10.
+MAX_TOP_N = 10
+# Districts precomputed per city, busiest first; "" is the whole city.
+TOP_DISTRICTS = 12
+PRESETS = [
+    {"wifi": 4, "socket": 4, "quiet": 4},
+    {"wifi": 3, "socket": 3, "quiet": 3},
+    {"wifi": 4, "socket": 4},
+    {"wifi": 4, "quiet": 4},
+    {"wifi": 4},
+    {"socket": 4},
+    {"quiet": 4},
+    {"cheap": 4},
+    {},
+]
+# How often a worker re-reads the table and the cities' data versions.
+CHECK_SECONDS = 10.0
+MAX_TRACKED_MISSES = 1000
+
+_STATE: Dict[str, object] = {"marker": None, "rows": {}, "checked": 0.0}
+# cache key -> pre-serialized entries, for entries whose tag is current.
+_HOT: Dict[str, List[bytes]] = {}
+_STATS = {"hits": 0, "misses": 0}
+_MISSES: Counter = Counter()
+_LOCK = threading.Lock()
+
+
+def cache_key(filters: dict) -> Optional[str]:
+    """Key for filters a precomputed entry can answer, else None.
+
+    Equivalent filters share a key: an unset criterion and 0 both mean "not
+    requested", and limited_time only matters when it is "no".
+    """
+    if not filters.get("city") or filters.get("mrt"):
+        return None
+    if filters.get("latitude") and filters.get("longitude"):
+        return None
+    return json.dumps(
+        [
+            filters["city"],
+            filters.get("district") or "",
+            *(float(filters.get(key) or 0) for key in CRITERIA),
+            filters.get("limited_time") == "no",
+            filters.get("max_walk_minutes"),
+        ],
+        ensure_ascii=False,
+    )
+
+
+def busiest_districts(db: Session, city: str, limit: int = TOP_DISTRICTS) -> List[str]:
+    rows = (
+        db.query(Cafe.district, func.count(Cafe.id))
+        .filter(Cafe.city == city, Cafe.district.isnot(None), Cafe.district != "")
+        .group_by(Cafe.district)
+        .order_by(func.count(Cafe.id).desc(), Cafe.district)
+        .limit(limit)
+    )
+    return [district for district, _ in rows]
+
+
+def precompute_city(
+    db: Session,
+    city: str,
+    districts: Optional[Iterable[str]] = None,
+    presets: Iterable[dict] = PRESETS,
+) -> int:
+    """Replace the city's precomputed entries; returns how many were stored."""
+    if districts is None:
+        districts = busiest_districts(db, city)
+    version = data_version(db, city)
+    now = time.time()
+    invalidate_index(city)
+    db.query(PrecomputedRecommendation).filter(PrecomputedRecommendation.city == city).delete()
+    stored = 0
+    for district in ["", *districts]:
+        for preset in presets:
+            filters = {"city": city, "district": district or None, **preset}
+            entries = recommend_cafes(db, filters, MAX_TOP_N)
+            db.add(
+                PrecomputedRecommendation(
+                    key=cache_key(filters),
+                    city=city,
+                    version=version,
+                    payload=json.dumps(entries, ensure_ascii=False),
+                    computed_at=now,
+                )
+            )
+            stored += 1
+    db.commit()
+    return stored
+
+
+def _refresh() -> None:
+    global _HOT
+    now = time.time()
+    if now - _STATE["checked"] < CHECK_SECONDS:
+        return
+    with _LOCK:
+        if now - _STATE["checked"] < CHECK_SECONDS:
+            return
+        db = SessionLocal()
+        try:
+            table = PrecomputedRecommendation
+            marker = tuple(db.query(func.count(table.key), func.max(table.computed_at)).one())
+            if marker != _STATE["marker"]:
+                _STATE["rows"] = {
+                    row.key: (row.city, row.version, [dumps(e) for e in json.loads(row.payload)])
+                    for row in db.query(table)
+                }
+                _STATE["marker"] = marker
+            rows = _STATE["rows"]
+            versions = {city: data_version(db, city) for city, _, _ in rows.values()}
+            _HOT = {
+                key: fragments
+                for key, (city, version, fragments) in rows.items()
+                if versions[city] == version
+            }
+        except Exception:
+            # Tables not created yet (fresh database); live scoring still works.
+            pass
+        finally:
+            db.close()
+        _STATE["checked"] = now
+
+
+def lookup(filters: dict, top_n: int) -> Optional[bytes]:
+    """Encoded recommendations list for `filters`, or None to score live."""
+    key = cache_key(filters)
+    if key is None or top_n > MAX_TOP_N:
+        return None
+    _refresh()
+    fragments = _HOT.get(key)
+    if fragments is None:
+        _STATS["misses"] += 1
+        if key in _MISSES or len(_MISSES) < MAX_TRACKED_MISSES:
+            _MISSES[key] += 1
+        return None
+    _STATS["hits"] += 1
+    return join_array(fragments[:top_n])
+
+
+def status() -> Dict[str, object]:
+    return {
+        "entries": len(_HOT),
+        "stored": len(_STATE["rows"]),  # type: ignore[arg-type]
+        "hits": _STATS["hits"],
+        "misses": _STATS["misses"],
+        "top_misses": [[json.loads(key), n] for key, n in _MISSES.most_common(10)],
+    }
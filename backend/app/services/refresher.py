@@ -0,0 +1,127 @@
+"""
+Background refresh of the Cafe Nomad cache.
+
+A daemon thread refreshes every loaded city shortly before its cache entry
+reaches the TTL (with jitter, so cities and workers do not refetch in lockstep) and
+rebuilds the city snapshot if one is loaded. Until a refresh lands, requests
+keep getting the previous data; a failing city backs off exponentially
+without affecting the others. status() reports each city's freshness for
+/statusz.
+"""
+
+import random
+import threading
+import time
+from typing import Dict, Optional
+from app.services import cafenomad
+from app.services.cafenomad import CITIES
+from app.services import shards
+
+# Refresh once an entry is this far into its TTL, +/- JITTER of the TTL.
+REFRESH_AT = 0.8
+JITTER = 0.1
+BACKOFF_BASE_SECONDS = 5.0
+BACKOFF_MAX_SECONDS = 600.0
+TICK_SECONDS = 1.0
+
+_STATUS: Dict[str, Dict[str, object]] = {
+    city: {
+        "next_refresh": 0.0,
+        "last_attempt": None,
+        "last_success": None,
+        "failures": 0,
+        "error": None,
+    }
+    for city in CITIES
+}
+_STOP = threading.Event()
+_THREAD: Dict[str, Optional[threading.Thread]] = {"thread": None}
+
+
+def _next_due(fetched_at: float) -> float:
+    ttl = cafenomad._CACHE_TTL_SECONDS
+    return fetched_at + ttl * (REFRESH_AT + random.uniform(-JITTER, JITTER))
+
+
+def _backoff(failures: int) -> float:
+    delay = min(BACKOFF_BASE_SECONDS * 2 ** (failures - 1), BACKOFF_MAX_SECONDS)
+    return delay * random.uniform(0.5, 1.0)
+
+
+def refresh(city: str) -> bool:
+    status = _STATUS[city]
+    now = time.time()
+    status["last_attempt"] = now
+    try:
+        # Only entries newer than the one being replaced count as fresh.
+        cafenomad.refresh_city(city, min_ts=cafenomad.cached_at(city) or 0.0)
+        if shards.get_manager().is_loaded(city):
+            shards.get_snapshot(city, touch=False)
+    except Exception as e:
+        status["failures"] = int(status["failures"]) + 1
+        status["error"] = str(e)
+        status["next_refresh"] = time.time() + _backoff(int(status["failures"]))
+        return False
+    status["failures"] = 0
+    status["error"] = None
+    status["last_success"] = time.time()
+    status["next_refresh"] = _next_due(cafenomad.cached_at(city) or time.time())
+    return True
+
+
+def _run() -> None:
+    while not _STOP.is_set():
+        now = time.time()
+        for city in CITIES:
+            if _STOP.is_set():
+                break
+            ts = cafenomad.cached_at(city)
+            if ts is None:
+                # Not loaded (or evicted by the shard manager): nothing to refresh.
+                continue
+            status = _STATUS[city]
+            if not status["failures"] and status["next_refresh"] < ts:
+                # Loaded since the last schedule, e.g. by a first request.
+                status["next_refresh"] = _next_due(ts)
+            if status["next_refresh"] <= now:
+                refresh(city)
+        _STOP.wait(TICK_SECONDS)
+
+
+def start() -> None:
+    """Start the refresher; from here on fetch_cafes serves stale entries."""
+    if _THREAD["thread"] is not None and _THREAD["thread"].is_alive():
+        return
+    for city in CITIES:
+        ts = cafenomad.cached_at(city)
+        # Cities load on first use; _run schedules them from then on.
+        _STATUS[city]["next_refresh"] = _next_due(ts) if ts is not None else 0.0
+    _STOP.clear()
+    cafenomad.serve_stale(True)
+    thread = threading.Thread(target=_run, name="cafenomad-refresher", daemon=True)
+    _THREAD["thread"] = thread
+    thread.start()
+
+
+def stop() -> None:
+    _STOP.set()
+    cafenomad.serve_stale(False)
+    thread = _THREAD["thread"]
+    if thread is not None:
+        thread.join(timeout=5)
+    _THREAD["thread"] = None
+
+
+def status() -> Dict[str, Dict[str, object]]:
+    now = time.time()
+    result = {}
+    for city, status in _STATUS.items():
+        ts = cafenomad.cached_at(city)
+        age = now - ts if ts is not None else None
+        result[city] = {
+            **status,
+            "age_seconds": round(age, 1) if age is not None else None,
+            "stale": age is None or age >= cafenomad._CACHE_TTL_SECONDS,
+            "next_refresh_in": round(max(0.0, float(status["next_refresh"]) - now), 1),
+        }
+    return result
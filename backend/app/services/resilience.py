@@ -0,0 +1,228 @@
+"""
+Deadlines, hedged calls and circuit breakers for upstream requests.
+
+A request deadline is set once (main.py does it for every request) and read
+through a ContextVar, so an upstream call made anywhere while serving that
+request caps its timeout at the time that is left, and is not started at
+all once it has passed. Thread pools that fan work out use submit() so their
+workers see the same deadline.
+
+hedged_call() sends a duplicate of a call that has been outstanding longer
+than the recent p95 latency and returns whichever answers first. Hedges are
+paid for out of a small budget earned per call, so a slow upstream sees at
+most a few percent more traffic, not double.
+
+CircuitBreaker fails fast after repeated failures and lets a single probe
+through after a cool-down; callers fall back to cached or local data while
+it is open.
+"""
+
+import contextvars
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, Optional, TypeVar
+
+T = TypeVar("T")
+
+_DEADLINE: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar(
+    "cafepick_deadline", default=None
+)
+# Hedges earned per call, and the most that can be saved up.
+HEDGE_RATIO = 0.05
+HEDGE_BURST = 5.0
+# No p95 until this many samples; DEFAULT_HEDGE_DELAY is used before that.
+MIN_LATENCY_SAMPLES = 20
+DEFAULT_HEDGE_DELAY = 1.0
+MIN_HEDGE_DELAY = 0.05
+
+_POOL = ThreadPoolExecutor(max_workers=32, thread_name_prefix="hedge")
+
+
+class DeadlineExceeded(RuntimeError):
+    pass
+
+
+class CircuitOpen(RuntimeError):
+    pass
+
+
+@contextmanager
+def deadline(seconds: float) -> Iterator[None]:
+    """Run the block with `seconds` to go; an earlier outer deadline wins."""
+    at = time.monotonic() + seconds
+    current = _DEADLINE.get()
+    token = _DEADLINE.set(at if current is None else min(current, at))
+    try:
+        yield
+    finally:
+        _DEADLINE.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """Seconds left before the current deadline, or None without one."""
+    at = _DEADLINE.get()
+    return None if at is None else at - time.monotonic()
+
+
+def timeout_for(default: float) -> float:
+    """Timeout for one upstream attempt: `default`, capped by the deadline."""
+    left = remaining()
+    if left is None:
+        return default
+    if left <= 0:
+        raise DeadlineExceeded("request deadline exceeded")
+    return min(default, left)
+
+
+def submit(pool: Executor, fn: Callable[..., T], *args) -> "Future[T]":
+    """pool.submit() that carries the caller's deadline into the worker."""
+    return pool.submit(contextvars.copy_context().run, fn, *args)
+
+
+class LatencyTracker:
+    """Recent successful call durations, for the hedge delay."""
+
+    def __init__(self, size: int = 200):
+        self._samples: deque = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, p: float) -> Optional[float]:
+        with self._lock:
+            if len(self._samples) < MIN_LATENCY_SAMPLES:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+class HedgeBudget:
+    """Hedges earned per call; also counts how often a hedge won."""
+
+    def __init__(self):
+        self.tokens = HEDGE_BURST
+        self.calls = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self._lock = threading.Lock()
+
+    def earn(self) -> None:
+        with self._lock:
+            self.calls += 1
+            self.tokens = min(HEDGE_BURST, self.tokens + HEDGE_RATIO)
+
+    def spend(self) -> bool:
+        with self._lock:
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            self.hedges += 1
+            return True
+
+
+def hedged_call(fn: Callable[[], T], latency: LatencyTracker, budget: HedgeBudget) -> T:
+    """fn(), duplicated once if it outlives the recent p95; first success wins."""
+    budget.earn()
+    delay = max(MIN_HEDGE_DELAY, latency.percentile(95) or DEFAULT_HEDGE_DELAY)
+    left = remaining()
+    primary = submit(_POOL, fn)
+    done, _ = wait([primary], timeout=delay if left is None else max(0.0, min(delay, left)))
+    if done or (left is not None and left <= delay) or not budget.spend():
+        return primary.result()
+
+    hedge = submit(_POOL, fn)
+    pending = {primary, hedge}
+    error: Optional[BaseException] = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                if future is hedge:
+                    budget.hedge_wins += 1
+                return future.result()
+            error = future.exception()
+    raise error  # type: ignore[misc]
+
+
+class CircuitBreaker:
+    """Closed -> open after repeated failures -> half-open probe -> closed.
+
+    Opens after `consecutive` failures in a row, or when at least half of
+    the last `window` calls failed (once `window // 2` have been made).
+    """
+
+    def __init__(self, name: str, consecutive: int = 5, window: int = 20, cooldown: float = 30.0):
+        self.name = name
+        self.consecutive = consecutive
+        self.cooldown = cooldown
+        self.state = "closed"
+        self.opened_at = 0.0
+        self.rejected = 0
+        self.opens = 0
+        self._failures_in_row = 0
+        self._outcomes: deque = deque(maxlen=window)
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.cooldown:
+                self.state = "half_open"
+                self._probing = False
+            if self.state == "closed":
+                return True
+            if self.state == "half_open" and not self._probing:
+                self._probing = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures_in_row = 0
+            self._outcomes.append(True)
+            if self.state == "half_open":
+                self.state = "closed"
+                self._outcomes.clear()
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures_in_row += 1
+            self._outcomes.append(False)
+            failed = self._outcomes.count(False)
+            if self.state == "half_open" or (
+                self.state == "closed"
+                and (
+                    self._failures_in_row >= self.consecutive
+                    or (
+                        len(self._outcomes) >= self._outcomes.maxlen // 2
+                        and failed * 2 >= len(self._outcomes)
+                    )
+                )
+            ):
+                self.state = "open"
+                self.opened_at = time.monotonic()
+                self.opens += 1
+            self._probing = False
+
+    def release(self) -> None:
+        """End a call that says nothing about upstream health (e.g. our own deadline)."""
+        with self._lock:
+            self._probing = False
+
+    def status(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                "state": self.state,
+                "opens": self.opens,
+                "rejected": self.rejected,
+                "recent_failures": self._outcomes.count(False),
+                "recent_calls": len(self._outcomes),
+            }
+
@@ -0,0 +1,94 @@
+"""
+Plans the Places calls behind a search around a transit point.
+
+With a walk limit, the limit becomes the search radius. place_recommend
+keeps a cafe when round(km / 5 * 60) <= max_walk_minutes, so the circle of
+walk_km(max_walk_minutes + 0.5) holds exactly the cafes it can keep:
+nothing outside it is fetched only to be dropped, and nothing inside it is
+crowded out by cafes that are.
+
+- No text query: one searchNearby ranked by distance, for top_n cafes. It
+  returns the nearest ones inside the circle; fewer than top_n means there
+  are no more.
+- A text query: searchText restricted to the circle's bounding box, a page
+  at a time. Corners outside the circle are dropped, and another page is
+  fetched only while fewer than top_n are left (at most MAX_PAGES).
+- No walk limit: the same, from WIDEN_START_M, doubling the radius up to
+  WIDEN_MAX_M only while fewer than top_n are found.
+"""
+
+import math
+from typing import Dict, List, Optional
+from app.services.google_places import search_cafes_within, search_places_in_box
+from app.services.stations import walk_km
+
+MAX_PAGES = 3
+WIDEN_START_M = 800.0
+WIDEN_MAX_M = 6400.0
+
+
+def _distance_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    dlat = math.radians(lat2 - lat1)
+    dlng = math.radians(lng2 - lng1)
+    a = (
+        math.sin(dlat / 2) ** 2
+        + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlng / 2) ** 2
+    )
+    return 6371.0 * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+
+def walk_radius_m(max_walk_minutes: float) -> float:
+    return walk_km(max_walk_minutes + 0.5) * 1000
+
+
+def _inside(cafes: List[Dict], latitude: float, longitude: float, radius_m: float) -> List[Dict]:
+    return [
+        c
+        for c in cafes
+        if c.get("latitude") is not None
+        and c.get("longitude") is not None
+        and _distance_km(latitude, longitude, c["latitude"], c["longitude"]) * 1000 <= radius_m
+    ]
+
+
+def _within(
+    city: str, query: Optional[str], latitude: float, longitude: float, radius_m: float, top_n: int
+) -> List[Dict]:
+    if not query:
+        cafes = search_cafes_within(city, latitude, longitude, radius_m, top_n)
+        return _inside(cafes, latitude, longitude, radius_m)[:top_n]
+    # The box is 4/pi times the circle; a page that size usually covers top_n.
+    page_size = min(20, math.ceil(top_n * 4 / math.pi))
+    found: List[Dict] = []
+    seen = set()
+    token = None
+    for _ in range(MAX_PAGES):
+        page, token = search_places_in_box(
+            city, query, latitude, longitude, radius_m, page_size=page_size, page_token=token
+        )
+        for cafe in _inside(page, latitude, longitude, radius_m):
+            if cafe["id"] not in seen:
+                seen.add(cafe["id"])
+                found.append(cafe)
+        if len(found) >= top_n or not token:
+            break
+    return found[:top_n]
+
+
+def find_near(
+    city: str,
+    query: Optional[str],
+    latitude: float,
+    longitude: float,
+    max_walk_minutes: Optional[int],
+    top_n: int,
+) -> List[Dict]:
+    """Up to top_n Places cafes around a point, fetching no more than that needs."""
+    if max_walk_minutes is not None:
+        return _within(city, query, latitude, longitude, walk_radius_m(max_walk_minutes), top_n)
+    radius_m = WIDEN_START_M
+    while True:
+        found = _within(city, query, latitude, longitude, radius_m, top_n)
+        if len(found) >= top_n or radius_m >= WIDEN_MAX_M:
+            return found
+        radius_m *= 2
@@ -0,0 +1,126 @@
+"""
+JSON encoding helpers for the response path:
+- A fast encoder (orjson when installed, compact stdlib json otherwise)
+- Byte-level assembly of pre-serialized fragments
+- Pre-compressed gzip / brotli variants and ETags for static payloads
+"""
+
+import gzip
+import hashlib
+import json
+from typing import Dict, Iterable, Optional
+from fastapi import Request, Response
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional speedup
+    brotli = None
+
+# Payloads smaller than this are not worth compressing.
+COMPRESS_MIN_BYTES = 1024
+
+
+def encode_default(obj):
+    """Encoder fallback: compact records (cafenomad.CafeRecord) serialize via to_dict()."""
+    to_dict = getattr(obj, "to_dict", None)
+    if to_dict is None:
+        raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+    return to_dict()
+
+
+def dumps(obj) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj, default=encode_default)
+    return json.dumps(
+        obj, ensure_ascii=False, separators=(",", ":"), default=encode_default
+    ).encode("utf-8")
+
+
+def join_array(fragments: Iterable[bytes]) -> bytes:
+    return b"[" + b",".join(fragments) + b"]"
+
+
+def join_object(parts: Iterable[tuple]) -> bytes:
+    """Assemble a JSON object from (key, already-encoded value) pairs."""
+    return b"{" + b",".join(dumps(k) + b":" + v for k, v in parts) + b"}"
+
+
+class EncodedBody:
+    """A serialized JSON body plus its compressed variants and ETag, built once."""
+
+    __slots__ = ("raw", "gzip", "br", "etag")
+
+    def __init__(self, raw: bytes):
+        self.raw = raw
+        self.etag = '"' + hashlib.sha1(raw).hexdigest()[:20] + '"'
+        self.gzip: Optional[bytes] = None
+        self.br: Optional[bytes] = None
+        if len(raw) >= COMPRESS_MIN_BYTES:
+            self.gzip = gzip.compress(raw, compresslevel=9, mtime=0)
+            if brotli is not None:
+                self.br = brotli.compress(raw, quality=11)
+
+
+def json_response(body: bytes, status_code: int = 200) -> Response:
+    return Response(content=body, status_code=status_code, media_type="application/json")
+
+
+def _accepted(header: str) -> Dict[str, float]:
+    """Accept-Encoding as coding -> q-value; "*" covers codings not listed."""
+    accepted: Dict[str, float] = {}
+    for part in header.split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[coding] = q
+    return accepted
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    """Weak comparison against an If-None-Match list."""
+    for tag in header.split(","):
+        tag = tag.strip()
+        if tag == "*" or (tag[2:] if tag.startswith("W/") else tag) == etag:
+            return True
+    return False
+
+
+def encoded_response(
+    body: EncodedBody, request: Request, max_age: Optional[int] = None
+) -> Response:
+    """The body in the best encoding the client accepts (q=0 refuses one).
+
+    Each encoding is a different representation, so each gets its own ETag:
+    the identity tag with "-br" / "-gzip" appended inside the quotes.
+    """
+    accepted = _accepted(request.headers.get("accept-encoding", ""))
+    wildcard = accepted.get("*", 0.0)
+    encoding, content = None, body.raw
+    for name, compressed in (("br", body.br), ("gzip", body.gzip)):
+        if compressed is not None and accepted.get(name, wildcard) > 0:
+            encoding, content = name, compressed
+            break
+
+    etag = body.etag if encoding is None else f'{body.etag[:-1]}-{encoding}"'
+    headers = {"Vary": "Accept-Encoding", "ETag": etag}
+    if max_age is not None:
+        headers["Cache-Control"] = f"public, max-age={max_age}"
+    if _etag_matches(request.headers.get("if-none-match", ""), etag):
+        return Response(status_code=304, headers=headers)
+    if encoding is not None:
+        headers["Content-Encoding"] = encoding
+    return Response(content=content, media_type="application/json", headers=headers)
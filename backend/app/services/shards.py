@@ -0,0 +1,198 @@
+"""
+Per-city shards: a city's snapshot (with its indexes) and the Cafe Nomad
+cache entry behind it are loaded on first access and evicted when cold.
+
+Each access bumps the city's frequency score, which decays with a half-life
+so yesterday's traffic does not pin a city forever. When the estimated size
+of all loaded shards goes over CAFEPICK_SNAPSHOT_MEMORY_MB, the coldest
+unpinned cities are dropped; CAFEPICK_PINNED_CITIES are never evicted.
+Memory therefore follows the cities that are actually being queried.
+
+Other per-city derived data (name index, tiles, ...) lives in Shard.derived
+and is dropped with the shard or whenever its snapshot is rebuilt.
+
+An evicted city keeps a compressed copy of its Cafe Nomad data
+(cafenomad.evict), so loading it again costs a decompress and a snapshot
+build, not an upstream fetch. Copies count toward the memory cap (oldest
+dropped first) and expire once a TTL old. A city with no copy, e.g. one
+nobody has asked for since startup, is fetched from Cafe Nomad on its first
+request unless CAFEPICK_WARM_CITIES (warmup.py) loaded it beforehand.
+"""
+
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+from app.services import cafenomad, shared_cache
+from app.services.cafenomad import CITIES, fetch_cafes
+from app.services.hours import MASK_BYTES
+from app.services.snapshot import CitySnapshot
+
+MEMORY_CAP_BYTES = int(float(os.getenv("CAFEPICK_SNAPSHOT_MEMORY_MB", "256")) * 1024 * 1024)
+PINNED_CITIES = {
+    c.strip()
+    for c in os.getenv("CAFEPICK_PINNED_CITIES", "taipei,taichung").split(",")
+    if c.strip()
+}
+FREQUENCY_HALF_LIFE_SECONDS = 600.0
+# Resident size of one cached CafeRecord (see scripts/measure_cache_memory.py).
+RECORD_BYTES = 600
+
+
+def _estimate_bytes(snap: CitySnapshot) -> int:
+    n = len(snap.cafes)
+    bitmap_bytes = (n + 7) // 8
+    bitmaps = (
+        1
+        + sum(len(groups) for groups in snap.value_bitmaps.values())
+        + len(snap.flag_bitmaps)
+        + len(snap.price_bitmaps)
+    )
+    return (
+        sum(len(fragment) + 33 for fragment in snap.fragments)
+        + n * (RECORD_BYTES + MASK_BYTES + 100)  # record, hours mask, id -> position
+        + bitmaps * bitmap_bytes
+    )
+
+
+class Shard:
+    def __init__(self, city: str):
+        self.city = city
+        self.snapshot: Optional[CitySnapshot] = None
+        self.nbytes = 0
+        self.frequency = 0.0
+        self.last_access = 0.0
+        self.loaded_at: Optional[float] = None
+        # key -> (snapshot it was built from, value)
+        self.derived: Dict[str, Tuple[CitySnapshot, object]] = {}
+        self.lock = threading.Lock()
+
+    def touch(self, now: float) -> None:
+        if self.last_access:
+            self.frequency *= 0.5 ** ((now - self.last_access) / FREQUENCY_HALF_LIFE_SECONDS)
+        self.frequency += 1.0
+        self.last_access = now
+
+    def score(self, now: float) -> float:
+        return self.frequency * 0.5 ** ((now - self.last_access) / FREQUENCY_HALF_LIFE_SECONDS)
+
+
+class ShardManager:
+    def __init__(self, cap_bytes: int = MEMORY_CAP_BYTES, pinned=PINNED_CITIES):
+        self.cap_bytes = cap_bytes
+        self.pinned = set(pinned)
+        self._shards: Dict[str, Shard] = {city: Shard(city) for city in CITIES}
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, city: str, touch: bool = True) -> Optional[CitySnapshot]:
+        shard = self._shards.get(city)
+        if shard is None:
+            return None
+        if touch:
+            shard.touch(time.time())
+        cafes = fetch_cafes(city)
+        snap = shard.snapshot
+        if snap is None or snap.cafes is not cafes:
+            with shard.lock:
+                snap = shard.snapshot
+                if snap is None or snap.cafes is not cafes:
+                    snap = CitySnapshot(city, cafes)
+                    shard.snapshot = snap
+                    shard.nbytes = _estimate_bytes(snap)
+                    shard.derived = {}
+                    shard.loaded_at = time.time()
+            self._enforce_cap(keep=city)
+        return snap
+
+    def derived(self, city: str, key: str, build: Callable[[CitySnapshot], object]):
+        """Per-city value built from the current snapshot, cached with the shard."""
+        snap = self.get(city)
+        if snap is None:
+            return None
+        shard = self._shards[city]
+        entry = shard.derived.get(key)
+        if entry is None or entry[0] is not snap:
+            entry = (snap, build(snap))
+            shard.derived[key] = entry
+        return entry[1]
+
+    def _enforce_cap(self, keep: str) -> None:
+        with self._lock:
+            now = time.time()
+            loaded = [s for s in self._shards.values() if s.snapshot is not None]
+            # Parked copies of evicted cities count toward the cap too.
+            total = sum(s.nbytes for s in loaded) + cafenomad.parked_bytes()
+            if total <= self.cap_bytes:
+                return
+            victims = sorted(
+                (s for s in loaded if s.city not in self.pinned and s.city != keep),
+                key=lambda s: s.score(now),
+            )
+            for shard in victims:
+                if total <= self.cap_bytes:
+                    break
+                parked = cafenomad.parked_bytes()
+                total -= shard.nbytes
+                self._evict(shard)
+                total += cafenomad.parked_bytes() - parked
+            if total > self.cap_bytes:
+                cafenomad.drop_parked(total - self.cap_bytes)
+
+    def _evict(self, shard: Shard) -> None:
+        with shard.lock:
+            shard.snapshot = None
+            shard.derived = {}
+            shard.nbytes = 0
+            shard.loaded_at = None
+        cafenomad.evict(shard.city)
+        if isinstance(shared_cache.get_backend(), shared_cache.MemoryBackend):
+            # Same process: the shared entry would keep the records alive.
+            shared_cache.delete("cafenomad", shard.city)
+        self.evictions += 1
+
+    def loaded(self) -> List[Shard]:
+        return [s for s in self._shards.values() if s.snapshot is not None]
+
+    def is_loaded(self, city: str) -> bool:
+        shard = self._shards.get(city)
+        return shard is not None and shard.snapshot is not None
+
+    def status(self) -> Dict[str, object]:
+        now = time.time()
+        loaded = self.loaded()
+        return {
+            "cap_bytes": self.cap_bytes,
+            "loaded_bytes": sum(s.nbytes for s in loaded),
+            "parked_bytes": cafenomad.parked_bytes(),
+            "evictions": self.evictions,
+            "pinned": sorted(self.pinned),
+            "cities": {
+                s.city: {
+                    "bytes": s.nbytes,
+                    "cafes": len(s.snapshot.cafes) if s.snapshot else 0,
+                    "frequency": round(s.score(now), 2),
+                    "loaded_at": s.loaded_at,
+                }
+                for s in loaded
+            },
+        }
+
+
+_MANAGER = ShardManager()
+
+
+def get_manager() -> ShardManager:
+    return _MANAGER
+
+
+def get_snapshot(city: str, touch: bool = True) -> Optional[CitySnapshot]:
+    return _MANAGER.get(city, touch=touch)
+
+
+def derived(city: str, key: str, build: Callable[[CitySnapshot], object]):
+    return _MANAGER.derived(city, key, build)
+
+
+def loaded_snapshots() -> List[CitySnapshot]:
+    return [s.snapshot for s in _MANAGER.loaded() if s.snapshot is not None]
@@ -0,0 +1,177 @@
+"""
+Pluggable cache backend shared by the module-level caches.
+
+- "memory": per-process dict (default, same behavior as a single worker)
+- "sqlite": a WAL-mode SQLite file on local disk, shared by every worker
+  process on the host with no external service
+
+Each namespace has a generation counter. invalidate() bumps it, and workers
+compare it against their in-process memos via sync_local(), so one worker
+clearing a namespace clears it everywhere.
+
+Select with CAFEPICK_CACHE_BACKEND=memory|sqlite (CAFEPICK_CACHE_PATH to
+override the SQLite file).
+"""
+
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+from app.database import DB_DIR
+from app.services.serialize import encode_default
+
+CACHE_BACKEND = os.getenv("CAFEPICK_CACHE_BACKEND", "memory")
+CACHE_PATH = os.getenv("CAFEPICK_CACHE_PATH", os.path.join(DB_DIR, "shared_cache.db"))
+# How often a worker re-reads namespace generations.
+GENERATION_CHECK_SECONDS = 1.0
+
+
+class MemoryBackend:
+    def __init__(self):
+        self._data: Dict[str, Dict[str, tuple]] = {}
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        entry = self._data.get(namespace, {}).get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at < time.time():
+            return None
+        return value
+
+    def set(self, namespace: str, key: str, value: Any, ttl: float) -> None:
+        with self._lock:
+            self._data.setdefault(namespace, {})[key] = (value, time.time() + ttl)
+
+    def delete(self, namespace: str, key: str) -> None:
+        with self._lock:
+            self._data.get(namespace, {}).pop(key, None)
+
+    def invalidate(self, namespace: str) -> None:
+        with self._lock:
+            self._data.pop(namespace, None)
+            self._generations[namespace] = self._generations.get(namespace, 0) + 1
+
+    def generation(self, namespace: str) -> int:
+        return self._generations.get(namespace, 0)
+
+
+class SQLiteBackend:
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache_entries ("
+            " namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL,"
+            " expires_at REAL NOT NULL, PRIMARY KEY (namespace, key))"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache_generations ("
+            " namespace TEXT PRIMARY KEY, generation INTEGER NOT NULL)"
+        )
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        row = self._conn().execute(
+            "SELECT value FROM cache_entries WHERE namespace = ? AND key = ? AND expires_at >= ?",
+            (namespace, key, time.time()),
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, namespace: str, key: str, value: Any, ttl: float) -> None:
+        now = time.time()
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO cache_entries (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+            (namespace, key, json.dumps(value, ensure_ascii=False, default=encode_default), now + ttl),
+        )
+        if random.random() < 0.01:
+            conn.execute("DELETE FROM cache_entries WHERE expires_at < ?", (now,))
+
+    def delete(self, namespace: str, key: str) -> None:
+        self._conn().execute(
+            "DELETE FROM cache_entries WHERE namespace = ? AND key = ?", (namespace, key)
+        )
+
+    def invalidate(self, namespace: str) -> None:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM cache_entries WHERE namespace = ?", (namespace,))
+            conn.execute(
+                "INSERT INTO cache_generations (namespace, generation) VALUES (?, 1)"
+                " ON CONFLICT(namespace) DO UPDATE SET generation = generation + 1",
+                (namespace,),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def generation(self, namespace: str) -> int:
+        row = self._conn().execute(
+            "SELECT generation FROM cache_generations WHERE namespace = ?", (namespace,)
+        ).fetchone()
+        return row[0] if row else 0
+
+
+_BACKEND = None
+_BACKEND_LOCK = threading.Lock()
+_SEEN_GENERATIONS: Dict[str, Dict[str, float]] = {}
+
+
+def get_backend():
+    global _BACKEND
+    if _BACKEND is None:
+        with _BACKEND_LOCK:
+            if _BACKEND is None:
+                if CACHE_BACKEND == "sqlite":
+                    _BACKEND = SQLiteBackend(CACHE_PATH)
+                elif CACHE_BACKEND == "memory":
+                    _BACKEND = MemoryBackend()
+                else:
+                    raise RuntimeError(f"Unknown CAFEPICK_CACHE_BACKEND: {CACHE_BACKEND}")
+    return _BACKEND
+
+
+def get(namespace: str, key: str) -> Optional[Any]:
+    return get_backend().get(namespace, key)
+
+
+def put(namespace: str, key: str, value: Any, ttl: float) -> None:
+    get_backend().set(namespace, key, value, ttl)
+
+
+def delete(namespace: str, key: str) -> None:
+    get_backend().delete(namespace, key)
+
+
+def invalidate(namespace: str) -> None:
+    get_backend().invalidate(namespace)
+
+
+def sync_local(namespace: str, local: dict) -> None:
+    """Clear an in-process memo if another worker invalidated its namespace."""
+    now = time.time()
+    seen = _SEEN_GENERATIONS.get(namespace)
+    if seen and now - seen["checked"] < GENERATION_CHECK_SECONDS:
+        return
+    gen = get_backend().generation(namespace)
+    if seen and seen["generation"] != gen:
+        local.clear()
+    _SEEN_GENERATIONS[namespace] = {"generation": gen, "checked": now}
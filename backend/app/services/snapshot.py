@@ -0,0 +1,153 @@
+"""
+Per-city snapshots of the Cafe Nomad catalog.
+
+A snapshot is rebuilt whenever the cafenomad cache hands back a new list
+(shards.py loads, rebuilds and evicts them per city), and keeps every cafe
+pre-serialized so responses are assembled by joining bytes.
+
+Snapshots also carry bitmap indexes (Python ints, bit i = cafe i) for the
+filter_cafes attributes, so a filtered query is a few bitmap ANDs instead of
+a per-cafe scan. Results match cafenomad.matches_filters exactly.
+"""
+
+import threading
+from bisect import bisect_right
+from collections import defaultdict
+from typing import Dict, Iterable, Iterator, List, Optional
+from app.services.cafenomad import matches_filters
+from app.services.normalize import normalize_mrt
+from app.services.hours import parse_open_time
+from app.services.name_index import NameIndex
+from app.services.serialize import dumps, join_array
+
+
+# mrt / mrt_station filters are free text; cache this many substring bitmaps per snapshot.
+MAX_CACHED_STATION_BITMAPS = 256
+
+# Set bit offsets of every byte value, for walking bitmaps a byte at a time.
+_BYTE_BITS = [tuple(b for b in range(8) if value >> b & 1) for value in range(256)]
+
+
+def bitmap_from_positions(positions: Iterable[int], size: int) -> int:
+    buf = bytearray((size + 7) // 8)
+    for i in positions:
+        buf[i >> 3] |= 1 << (i & 7)
+    return int.from_bytes(buf, "little")
+
+
+def iter_bits(bitmap: int) -> Iterator[int]:
+    data = bitmap.to_bytes((bitmap.bit_length() + 7) // 8, "little")
+    for index, byte in enumerate(data):
+        if byte:
+            base = index << 3
+            for bit in _BYTE_BITS[byte]:
+                yield base + bit
+
+
+class CitySnapshot:
+    def __init__(self, city: str, cafes: List[dict]):
+        self.city = city
+        self.cafes = cafes
+        self.fragments = [dumps(cafe) for cafe in cafes]
+        self.positions = {cafe["id"]: i for i, cafe in enumerate(cafes)}
+        # Weekly opening-hours bitsets (see hours.py), parsed once per snapshot.
+        self.open_masks = [parse_open_time(cafe.get("open_time")) for cafe in cafes]
+        self._open_bitmaps: Dict[int, int] = {}
+        self._build_indexes()
+        self.name_index = NameIndex(cafes)
+
+    def _build_indexes(self) -> None:
+        n = len(self.cafes)
+        self.all_bitmap = (1 << n) - 1
+        values: Dict[str, Dict[object, List[int]]] = {
+            field: defaultdict(list)
+            for field in ("district", "mrt_station", "quiet_level", "limited_time")
+        }
+        flags: Dict[str, List[int]] = {"has_wifi": [], "has_socket": [], "reservable": []}
+        by_price: Dict[float, List[int]] = defaultdict(list)
+        for i, cafe in enumerate(self.cafes):
+            for field, groups in values.items():
+                groups[cafe.get(field)].append(i)
+            for field, positions in flags.items():
+                if cafe.get(field):
+                    positions.append(i)
+            if cafe.get("price") is not None:
+                by_price[cafe["price"]].append(i)
+
+        self.value_bitmaps = {
+            field: {value: bitmap_from_positions(pos, n) for value, pos in groups.items()}
+            for field, groups in values.items()
+        }
+        self.flag_bitmaps = {field: bitmap_from_positions(pos, n) for field, pos in flags.items()}
+        # price_bitmaps[k] = cafes priced at or below price_steps[k]
+        self.price_steps = sorted(by_price)
+        self.price_bitmaps: List[int] = []
+        running = 0
+        for price in self.price_steps:
+            running |= bitmap_from_positions(by_price[price], n)
+            self.price_bitmaps.append(running)
+        self._station_bitmaps: Dict[str, int] = {}
+        self._station_lock = threading.Lock()
+
+    def _station_bitmap(self, needle: str) -> int:
+        """Cafes whose mrt_station contains `needle` (substring, like filter_cafes)."""
+        bitmap = self._station_bitmaps.get(needle)
+        if bitmap is None:
+            bitmap = 0
+            for station, station_bitmap in self.value_bitmaps["mrt_station"].items():
+                if needle in (station or ""):
+                    bitmap |= station_bitmap
+            with self._station_lock:
+                if len(self._station_bitmaps) >= MAX_CACHED_STATION_BITMAPS:
+                    self._station_bitmaps.pop(next(iter(self._station_bitmaps)), None)
+                self._station_bitmaps[needle] = bitmap
+        return bitmap
+
+    def filter_bitmap(self, filters: dict, open_slot: Optional[int] = None) -> int:
+        bitmap = self.all_bitmap
+        if open_slot is not None:
+            bitmap &= self.open_bitmap(open_slot)
+        for field in ("district", "quiet_level", "limited_time"):
+            if filters.get(field):
+                bitmap &= self.value_bitmaps[field].get(filters[field], 0)
+        if filters.get("mrt_station"):
+            bitmap &= self._station_bitmap(filters["mrt_station"])
+        if filters.get("mrt"):
+            normalized = normalize_mrt(filters["mrt"])
+            if normalized:
+                bitmap &= self._station_bitmap(normalized)
+        for field in ("has_wifi", "has_socket", "reservable"):
+            if filters.get(field) is True:
+                bitmap &= self.flag_bitmaps[field]
+        if filters.get("max_price") is not None:
+            k = bisect_right(self.price_steps, filters["max_price"])
+            bitmap &= self.price_bitmaps[k - 1] if k else 0
+        return bitmap
+
+    def open_bitmap(self, slot: int) -> int:
+        """Bit i set when cafe i is open in week slot `slot`; built once per slot."""
+        bitmap = self._open_bitmaps.get(slot)
+        if bitmap is None:
+            bitmap = bitmap_from_positions(
+                (i for i, mask in enumerate(self.open_masks) if mask is not None and (mask >> slot) & 1),
+                len(self.open_masks),
+            )
+            self._open_bitmaps[slot] = bitmap
+        return bitmap
+
+    def filter_positions(self, filters: dict, open_slot: Optional[int] = None) -> List[int]:
+        positions = iter_bits(self.filter_bitmap(filters, open_slot))
+        if filters.get("bus_stop"):
+            # Free-text match over several fields; checked on the survivors only.
+            cafes = self.cafes
+            bus_only = {"bus_stop": filters["bus_stop"]}
+            return [i for i in positions if matches_filters(cafes[i], bus_only)]
+        return list(positions)
+
+    def render(self, positions: Iterable[int]) -> bytes:
+        fragments = self.fragments
+        return join_array(fragments[i] for i in positions)
+
+    def fragment(self, cafe_id: str) -> Optional[bytes]:
+        pos = self.positions.get(cafe_id)
+        return self.fragments[pos] if pos is not None else None
@@ -0,0 +1,228 @@
+"""
+Local transit station index and the nearest-station precompute job.
+
+Stations live in the `stations` table (see scripts/import_stations.py). A
+uniform lat/lng grid answers k-nearest and radius queries without touching
+Places, and refresh_nearest_stations() writes the results onto each cafe so
+walk-time filters become indexed column predicates.
+"""
+
+import json
+import math
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from app.models.cafe import Cafe
+from app.models.station import Station
+
+WALK_KM_PER_HOUR = 5.0
+# Cafes keep their nearest station plus this many runners-up.
+NEARBY_COUNT = 3
+# ~1.1 km cells; walk-time queries rarely span more than a few.
+GRID_DEGREES = 0.01
+
+
+def _haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    R = 6371
+    dlat = math.radians(lat2 - lat1)
+    dlon = math.radians(lon2 - lon1)
+    a = (
+        math.sin(dlat / 2) ** 2
+        + math.cos(math.radians(lat1))
+        * math.cos(math.radians(lat2))
+        * math.sin(dlon / 2) ** 2
+    )
+    return R * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+
+def walk_minutes(distance_km: float) -> int:
+    return int(round((distance_km / WALK_KM_PER_HOUR) * 60))
+
+
+def walk_km(minutes: float) -> float:
+    return (minutes / 60.0) * WALK_KM_PER_HOUR
+
+
+def _cell(lat: float, lng: float) -> Tuple[int, int]:
+    return (int(math.floor(lat / GRID_DEGREES)), int(math.floor(lng / GRID_DEGREES)))
+
+
+class StationIndex:
+    def __init__(self, stations: List[dict]):
+        self.stations = stations
+        self.by_id = {s["id"]: s for s in stations}
+        self._grid: Dict[Tuple[int, int], List[dict]] = defaultdict(list)
+        for s in stations:
+            self._grid[_cell(s["latitude"], s["longitude"])].append(s)
+
+    def __len__(self) -> int:
+        return len(self.stations)
+
+    def _ring(self, center: Tuple[int, int], r: int) -> List[dict]:
+        ci, cj = center
+        found: List[dict] = []
+        for i in range(ci - r, ci + r + 1):
+            for j in range(cj - r, cj + r + 1):
+                if max(abs(i - ci), abs(j - cj)) == r:
+                    found.extend(self._grid.get((i, j), ()))
+        return found
+
+    def nearest(self, lat: float, lng: float, k: int = 1, max_rings: int = 60) -> List[Tuple[dict, float]]:
+        """k nearest stations as (station, distance_km), closest first."""
+        if not self.stations:
+            return []
+        k = min(k, len(self.stations))
+        center = _cell(lat, lng)
+        # A cell is at least this wide in km at this latitude.
+        cell_km = GRID_DEGREES * 111.32 * math.cos(math.radians(lat))
+        hits: List[Tuple[dict, float]] = []
+        for r in range(max_rings + 1):
+            for s in self._ring(center, r):
+                hits.append((s, _haversine_km(lat, lng, s["latitude"], s["longitude"])))
+            if len(hits) >= k:
+                hits.sort(key=lambda h: h[1])
+                # Anything in ring r+1 is at least r cells away.
+                if hits[k - 1][1] <= r * cell_km:
+                    break
+        hits.sort(key=lambda h: h[1])
+        return hits[:k]
+
+    def within(self, lat: float, lng: float, max_km: float) -> List[Tuple[dict, float]]:
+        ci, cj = _cell(lat, lng)
+        dlat = max_km / 111.32
+        dlng = max_km / (111.32 * max(0.01, math.cos(math.radians(lat))))
+        ri = int(math.ceil(dlat / GRID_DEGREES))
+        rj = int(math.ceil(dlng / GRID_DEGREES))
+        hits = []
+        for i in range(ci - ri, ci + ri + 1):
+            for j in range(cj - rj, cj + rj + 1):
+                for s in self._grid.get((i, j), ()):
+                    d = _haversine_km(lat, lng, s["latitude"], s["longitude"])
+                    if d <= max_km:
+                        hits.append((s, d))
+        hits.sort(key=lambda h: h[1])
+        return hits
+
+
+def _station_dict(row: Station) -> dict:
+    return {
+        "id": row.id,
+        "name": row.name,
+        "city": row.city,
+        "latitude": row.latitude,
+        "longitude": row.longitude,
+    }
+
+
+def load_station_index(db: Session) -> StationIndex:
+    rows = db.query(Station).filter(Station.active.is_(True)).all()
+    return StationIndex([_station_dict(r) for r in rows])
+
+
+def station_version(db: Session) -> str:
+    count, latest = db.query(func.count(Station.id), func.max(Station.updated_at)).one()
+    return f"{count}:{latest or 0}"
+
+
+def _nearest_columns(index: StationIndex, lat: float, lng: float) -> dict:
+    hits = index.nearest(lat, lng, k=NEARBY_COUNT + 1)
+    if not hits:
+        return {
+            "nearest_station_id": None,
+            "nearest_station": None,
+            "nearest_station_km": None,
+            "nearest_station_walk_minutes": None,
+            "nearby_stations": None,
+        }
+    station, km = hits[0]
+    return {
+        "nearest_station_id": station["id"],
+        "nearest_station": station["name"],
+        "nearest_station_km": round(km, 3),
+        "nearest_station_walk_minutes": walk_minutes(km),
+        "nearby_stations": json.dumps(
+            [
+                {
+                    "id": s["id"],
+                    "name": s["name"],
+                    "distance_km": round(d, 3),
+                    "walk_minutes": walk_minutes(d),
+                }
+                for s, d in hits[1:]
+            ],
+            ensure_ascii=False,
+        ),
+    }
+
+
+def _affected_by(cafe: Cafe, changed: StationIndex, removed_ids: set) -> bool:
+    """Would any added/moved/removed station change this cafe's stored neighbours?"""
+    stored_ids = {cafe.nearest_station_id} if cafe.nearest_station_id else set()
+    farthest = cafe.nearest_station_km
+    if cafe.nearby_stations:
+        nearby = json.loads(cafe.nearby_stations)
+        stored_ids.update(s["id"] for s in nearby)
+        if nearby:
+            farthest = nearby[-1]["distance_km"]
+    if stored_ids & removed_ids:
+        return True
+    if any(station_id in changed.by_id for station_id in stored_ids):
+        # One of its stations moved, possibly away: only a recompute can tell.
+        return True
+    if farthest is None or len(stored_ids) < NEARBY_COUNT + 1:
+        return len(changed) > 0
+    return bool(changed.within(cafe.latitude, cafe.longitude, farthest))
+
+
+def refresh_nearest_stations(db: Session, city: Optional[str] = None, full: bool = False) -> int:
+    """Recompute nearest-station columns where needed. Returns rows rewritten.
+
+    New or moved cafes (station_version NULL) are always computed. After a
+    station import only cafes whose neighbour list a changed station could
+    alter are rewritten; the rest just get their version bumped.
+    """
+    index = load_station_index(db)
+    version = station_version(db)
+    now = time.time()
+
+    query = db.query(Cafe).filter(Cafe.latitude.isnot(None), Cafe.longitude.isnot(None))
+    if city:
+        query = query.filter(Cafe.city == city)
+    if not full:
+        query = query.filter((Cafe.station_version.is_(None)) | (Cafe.station_version != version))
+    cafes = query.all()
+    if not cafes:
+        return 0
+
+    oldest = min((c.stations_computed_at or 0) for c in cafes)
+    changed_rows = db.query(Station).filter(Station.updated_at > oldest).all()
+    # Cafes computed in the same run share a timestamp, so this stays tiny.
+    changes_since: Dict[float, Tuple[StationIndex, set]] = {}
+
+    updated = 0
+    for cafe in cafes:
+        if not (cafe.latitude and cafe.longitude):
+            continue
+        if not full and cafe.station_version is not None:
+            since = cafe.stations_computed_at or 0
+            if since not in changes_since:
+                recent = [r for r in changed_rows if r.updated_at > since]
+                changes_since[since] = (
+                    StationIndex([_station_dict(r) for r in recent if r.active]),
+                    {r.id for r in recent if not r.active},
+                )
+            changed, removed = changes_since[since]
+            if not _affected_by(cafe, changed, removed):
+                cafe.station_version = version
+                cafe.stations_computed_at = now
+                continue
+        for key, val in _nearest_columns(index, cafe.latitude, cafe.longitude).items():
+            setattr(cafe, key, val)
+        cafe.station_version = version
+        cafe.stations_computed_at = now
+        updated += 1
+
+    db.commit()
+    return updated
@@ -0,0 +1,150 @@
+"""
+Map tiles of clustered cafes, for /api/cafes/tiles/{z}/{x}/{y}.
+
+Cafes are projected to Web Mercator ([0, 1] on both axes) and clustered
+once per zoom level, bottom-up, the way supercluster does it: starting from
+the individual cafes at MAX_ZOOM + 1, each level merges everything within
+RADIUS_PX screen pixels at that zoom into a cluster at the weighted centre,
+and the next level up clusters those clusters. Each level is bucketed by
+tile, so a tile request reads one bucket instead of scanning the city.
+Every cluster or cafe falls in exactly one tile, so clients can merge the
+tiles of a viewport without duplicates.
+
+A ClusterIndex is built per city snapshot through shards.derived(), and
+caches the encoded tiles it has served; tiles past MAX_ZOOM show every
+cafe.
+"""
+
+import math
+import threading
+from collections import defaultdict
+from typing import Dict, Iterable, List, Tuple
+from app.services.serialize import EncodedBody, dumps
+
+MIN_ZOOM = 0
+MAX_ZOOM = 16
+MAX_TILE_ZOOM = 22
+TILE_PX = 256
+RADIUS_PX = 60
+MAX_CACHED_TILES = 4096
+
+# One entry per level: x, y, cafe count, cafe position (clusters: -1), and
+# the zoom at which it splits up.
+_Item = Tuple[float, float, int, int, int]
+
+
+def _x(lng: float) -> float:
+    return lng / 360 + 0.5
+
+
+def _y(lat: float) -> float:
+    s = math.sin(math.radians(lat))
+    y = 0.5 - 0.25 * math.log((1 + s) / (1 - s)) / math.pi
+    return min(1.0, max(0.0, y))
+
+
+def _lng(x: float) -> float:
+    return (x - 0.5) * 360
+
+
+def _lat(y: float) -> float:
+    return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y))))
+
+
+def _cluster(items: List[_Item], zoom: int) -> List[_Item]:
+    r = RADIUS_PX / (TILE_PX * 2**zoom)
+    cells: Dict[Tuple[int, int], List[int]] = defaultdict(list)
+    for i, item in enumerate(items):
+        cells[(int(item[0] / r), int(item[1] / r))].append(i)
+    taken = [False] * len(items)
+    out: List[_Item] = []
+    for i, item in enumerate(items):
+        if taken[i]:
+            continue
+        taken[i] = True
+        x, y = item[0], item[1]
+        cx, cy = int(x / r), int(y / r)
+        members = [item]
+        for gx in (cx - 1, cx, cx + 1):
+            for gy in (cy - 1, cy, cy + 1):
+                for j in cells.get((gx, gy), ()):
+                    other = items[j]
+                    if not taken[j] and (other[0] - x) ** 2 + (other[1] - y) ** 2 <= r * r:
+                        taken[j] = True
+                        members.append(other)
+        if len(members) == 1:
+            out.append(item)
+            continue
+        count = sum(m[2] for m in members)
+        out.append(
+            (
+                sum(m[0] * m[2] for m in members) / count,
+                sum(m[1] * m[2] for m in members) / count,
+                count,
+                -1,
+                zoom + 1,
+            )
+        )
+    return out
+
+
+class ClusterIndex:
+    def __init__(self, cafes: Iterable):
+        self.cafes: List[Tuple[str, str, float, float]] = []
+        items: List[_Item] = []
+        for cafe in cafes:
+            lat, lng = cafe.get("latitude"), cafe.get("longitude")
+            if not lat or not lng:
+                continue
+            items.append((_x(lng), _y(lat), 1, len(self.cafes), MAX_TILE_ZOOM))
+            self.cafes.append((cafe.get("id"), cafe.get("name") or "", lat, lng))
+        # levels[z] holds the items shown at zoom z; MAX_ZOOM + 1 is every cafe.
+        self.levels: Dict[int, List[_Item]] = {MAX_ZOOM + 1: items}
+        for zoom in range(MAX_ZOOM, MIN_ZOOM - 1, -1):
+            items = _cluster(items, zoom)
+            self.levels[zoom] = items
+        self.buckets: Dict[int, Dict[Tuple[int, int], List[_Item]]] = {}
+        for zoom, level in self.levels.items():
+            n = 2**zoom
+            buckets: Dict[Tuple[int, int], List[_Item]] = defaultdict(list)
+            for item in level:
+                buckets[(min(int(item[0] * n), n - 1), min(int(item[1] * n), n - 1))].append(item)
+            self.buckets[zoom] = buckets
+        # LRU of encoded tiles; requests for a city share this index across threads.
+        self._tiles: Dict[Tuple[int, int, int], EncodedBody] = {}
+        self._lock = threading.Lock()
+
+    def items(self, z: int, x: int, y: int) -> List[_Item]:
+        """Level items inside tile (z, x, y); each item is in exactly one tile."""
+        level = min(z, MAX_ZOOM + 1)
+        scale = 2 ** (z - level)
+        x0, x1 = x / 2**z, (x + 1) / 2**z
+        y0, y1 = y / 2**z, (y + 1) / 2**z
+        found = []
+        for item in self.buckets[level].get((x // scale, y // scale), ()):
+            if x0 <= item[0] < x1 and y0 <= item[1] < y1:
+                found.append(item)
+        return found
+
+    def tile(self, z: int, x: int, y: int) -> EncodedBody:
+        key = (z, x, y)
+        with self._lock:
+            body = self._tiles.pop(key, None)
+            if body is not None:
+                self._tiles[key] = body
+                return body
+        clusters, points = [], []
+        for item in self.items(z, x, y):
+            if item[3] >= 0:
+                cafe_id, name, lat, lng = self.cafes[item[3]]
+                points.append([cafe_id, name, lat, lng])
+            else:
+                clusters.append(
+                    [round(_lat(item[1]), 6), round(_lng(item[0]), 6), item[2], item[4]]
+                )
+        body = EncodedBody(dumps({"z": z, "x": x, "y": y, "clusters": clusters, "points": points}))
+        with self._lock:
+            if len(self._tiles) >= MAX_CACHED_TILES:
+                self._tiles.pop(next(iter(self._tiles)), None)
+            self._tiles[key] = body
+        return body
@@ -0,0 +1,118 @@
+"""
+Startup warm-up, run from the app lifespan.
+
+Checks the schema and preloads city snapshots, transit stations and the
+queries the frontend issues on first load, all in parallel and in the
+background rate-limit lane. /readyz reports ready only once this has
+finished, so load balancers skip cold workers.
+"""
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict
+from app.database import engine, Base
+from app.models import (  # noqa: F401 - registers tables for create_all
+    area,
+    cafe,
+    cafe_link,
+    cafe_tombstone,
+    recommendation,
+    station,
+)
+from app.services import ratelimit
+from app.services.resilience import submit
+from app.services.shards import get_snapshot
+from app.services.catchments import get_catchments
+from app.services.google_places import (
+    search_places,
+    search_transit_points,
+    has_cafes_near_transit,
+    find_nearest_mrt,
+)
+
+WARM_CITIES = [
+    c.strip()
+    for c in os.getenv("CAFEPICK_WARM_CITIES", "taipei,taichung").split(",")
+    if c.strip()
+]
+# Mirrors the frontend's first search (top 8, 10 walking minutes).
+HOT_TOP_N = 8
+HOT_WALK_MINUTES = 10
+
+_STATE: Dict[str, object] = {"ready": False, "started_at": None, "finished_at": None, "tasks": {}}
+
+
+def _check_schema() -> None:
+    Base.metadata.create_all(bind=engine)
+
+
+def _warm_snapshot(city: str) -> None:
+    get_snapshot(city)
+
+
+def _warm_stations(city: str) -> None:
+    catchments = get_catchments()
+    for point in search_transit_points(city, None, limit=20):
+        lat, lng = point["latitude"], point["longitude"]
+        # Like /transit: local stations are answered by their catchment, so
+        # only points without one warm the Places lookup.
+        station_id = catchments.station_for(point.get("id", ""), lat, lng)
+        if station_id is not None and (
+            catchments.has_cafes_within(station_id, HOT_WALK_MINUTES) is not None
+        ):
+            continue
+        has_cafes_near_transit(
+            city=city,
+            transit_lat=lat,
+            transit_lng=lng,
+            max_walk_minutes=HOT_WALK_MINUTES,
+        )
+
+
+def _warm_recommendations(city: str) -> None:
+    for cafe in search_places(city, None, limit=HOT_TOP_N):
+        if cafe.get("latitude") and cafe.get("longitude"):
+            find_nearest_mrt(cafe["latitude"], cafe["longitude"])
+
+
+def _tasks() -> Dict[str, Callable[[], None]]:
+    tasks: Dict[str, Callable[[], None]] = {"catchments": get_catchments}
+    for city in WARM_CITIES:
+        tasks[f"snapshot:{city}"] = lambda c=city: _warm_snapshot(c)
+        tasks[f"stations:{city}"] = lambda c=city: _warm_stations(c)
+        tasks[f"recommend:{city}"] = lambda c=city: _warm_recommendations(c)
+    return tasks
+
+
+def run_warmup() -> Dict[str, object]:
+    _STATE["started_at"] = time.time()
+    status: Dict[str, str] = {}
+    # Everything else may read the tables, so the schema goes first.
+    try:
+        _check_schema()
+        status["schema"] = "ok"
+    except Exception as e:
+        status["schema"] = f"error: {e}"
+    tasks = _tasks()
+    with ratelimit.lane("background"), ThreadPoolExecutor(max_workers=min(len(tasks), 8)) as pool:
+        futures = {name: submit(pool, fn) for name, fn in tasks.items()}
+        for name, future in futures.items():
+            try:
+                future.result()
+                status[name] = "ok"
+            except Exception as e:
+                status[name] = f"error: {e}"
+    _STATE["tasks"] = status
+    _STATE["finished_at"] = time.time()
+    # Upstream warm-ups are best effort; only a broken schema keeps us unready.
+    _STATE["ready"] = status.get("schema") == "ok"
+    return status
+
+
+def is_ready() -> bool:
+    return bool(_STATE["ready"])
+
+
+def state() -> Dict[str, object]:
+    return dict(_STATE)
@@ -0,0 +1,177 @@
+"""
+Scaling curves for the catalog paths on synthetic data (scripts/synthetic_cafes.py).
+
+For each size the rows are loaded into a fresh SQLite database through
+import_cafenomad.import_city, then timed:
+
+- import:        import_city for every city (rows/s matters most)
+- recommend:     recommend_cafes, cold (index build) and warm, over a mix of
+                 preference / location / MRT filters in Taipei and nationwide
+- filter_cafes:  cafenomad.filter_cafes over the Taipei catalog
+- build_area:    cafenomad.build_area("taipei"), cold (summary built) and warm
+
+The second table is the growth exponent between consecutive sizes,
+log(t2 / t1) / log(n2 / n1): about 1.0 is linear, clearly above 1.0 marks
+the size where a path stops scaling linearly.
+
+Usage:
+    cd backend && python -m scripts.benchmark_scaling
+    cd backend && python -m scripts.benchmark_scaling --sizes 10000,100000,1000000 --output curves.json
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import math
+import os
+import statistics
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base
+from app.models.area import AreaSummary  # noqa: F401 - registers the table
+from app.models.cafe_tombstone import CafeTombstone  # noqa: F401 - registers the table
+from app.services import area_summary, cafenomad
+from app.services.cafenomad import CafeRecord, build_area, filter_cafes
+from app.services.recommend import invalidate_index, recommend_cafes
+from scripts.import_cafenomad import import_city
+from scripts.synthetic_cafes import generate
+
+RECOMMEND_FILTERS = [
+    {"city": "taipei", "wifi": 4, "socket": 4, "quiet": 4},
+    {"city": "taipei", "wifi": 4, "latitude": 25.0418, "longitude": 121.5437},
+    {"city": "taipei", "quiet": 4, "mrt": "忠孝"},
+    {"city": "taipei", "cheap": 4, "limited_time": "no"},
+    {"city": None, "wifi": 4, "socket": 4},
+]
+CATALOG_FILTERS = [
+    {"district": "大安區"},
+    {"mrt": "捷運忠孝復興站"},
+    {"has_wifi": True, "quiet_level": "quiet"},
+    {"max_price": 150},
+    {"bus_stop": "光復南路"},
+]
+COLUMNS = [
+    ("import_s", "import s"),
+    ("import_us_per_row", "import us/row"),
+    ("recommend_cold_ms", "rec cold ms"),
+    ("recommend_warm_ms", "rec warm ms"),
+    ("filter_cafes_ms", "filter ms"),
+    ("build_area_cold_ms", "area cold ms"),
+    ("build_area_warm_ms", "area warm ms"),
+]
+
+
+def _median_seconds(fn: Callable[[], object], repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples)
+
+
+def run_size(rows: int, seed: int, repeat: int) -> Dict[str, float]:
+    data = generate(rows, seed=seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        Base.metadata.create_all(bind=engine)
+        db = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+        try:
+            started = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                for city, items in data.items():
+                    if items:
+                        import_city(db, city, items)
+            import_s = time.perf_counter() - started
+
+            cold = []
+            for filters in RECOMMEND_FILTERS:
+                invalidate_index(filters["city"])
+                started = time.perf_counter()
+                recommend_cafes(db, filters, 5)
+                cold.append(time.perf_counter() - started)
+            warm = [
+                _median_seconds(lambda f=filters: recommend_cafes(db, f, 5), repeat)
+                for filters in RECOMMEND_FILTERS
+            ]
+        finally:
+            db.close()
+            engine.dispose()
+
+    records = [CafeRecord.from_item(item, "taipei") for item in data["taipei"]]
+    filtering = [
+        _median_seconds(lambda f=filters: filter_cafes(records, f), repeat)
+        for filters in CATALOG_FILTERS
+    ]
+
+    # build_area reads the live Cafe Nomad cache; hand it the synthetic city.
+    cafenomad._CACHE["taipei"] = {"ts": time.time(), "data": records}
+    area_summary._SUMMARIES.pop("taipei", None)
+    started = time.perf_counter()
+    build_area("taipei")
+    area_cold = time.perf_counter() - started
+    area_warm = _median_seconds(lambda: build_area("taipei"), repeat)
+    cafenomad._CACHE.pop("taipei", None)
+    area_summary._SUMMARIES.pop("taipei", None)
+
+    return {
+        "rows": rows,
+        "import_s": import_s,
+        "import_us_per_row": import_s / rows * 1e6,
+        "recommend_cold_ms": statistics.mean(cold) * 1000,
+        "recommend_warm_ms": statistics.mean(warm) * 1000,
+        "filter_cafes_ms": statistics.mean(filtering) * 1000,
+        "build_area_cold_ms": area_cold * 1000,
+        "build_area_warm_ms": area_warm * 1000,
+    }
+
+
+def _print(results: List[Dict[str, float]]) -> None:
+    header = f"{'rows':>9}" + "".join(f"{label:>15}" for _, label in COLUMNS)
+    print(header)
+    for result in results:
+        print(f"{result['rows']:>9}" + "".join(f"{result[key]:>15.3f}" for key, _ in COLUMNS))
+    if len(results) < 2:
+        return
+    print("\ngrowth exponent vs previous size (1.0 = linear)")
+    print(header)
+    for before, after in zip(results, results[1:]):
+        scale = math.log(after["rows"] / before["rows"])
+        cells = []
+        for key, _ in COLUMNS:
+            if key == "import_us_per_row" or before[key] <= 0 or after[key] <= 0:
+                cells.append(f"{'-':>15}")
+            else:
+                cells.append(f"{math.log(after[key] / before[key]) / scale:>15.2f}")
+        print(f"{after['rows']:>9}" + "".join(cells))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="10000,30000,100000", help="comma-separated row counts")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=5, help="runs per warm measurement")
+    parser.add_argument("--output", help="write the results as JSON")
+    args = parser.parse_args()
+
+    results = []
+    for rows in sorted(int(size) for size in args.sizes.split(",")):
+        print(f"{rows} rows...", file=sys.stderr)
+        results.append(run_size(rows, args.seed, args.repeat))
+    _print(results)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+"""
+Evict expired / least-recently-used Places cache entries and reclaim disk space.
+
+Usage:
+    cd backend && python -m scripts.compact_places_cache
+    cd backend && python -m scripts.compact_places_cache --max-mb 32
+"""
+
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.services import places_cache
+
+
+def main():
+    if len(sys.argv) > 2 and sys.argv[1] == "--max-mb":
+        removed = places_cache.evict(int(float(sys.argv[2]) * 1024 * 1024))
+        print(f"Evicted {removed} entries to fit {sys.argv[2]} MB.")
+
+    stats = places_cache.compact()
+    print(
+        f"Removed {stats['removed']} entries; "
+        f"{stats['entries']} entries ({stats['bytes'] / 1024:.0f} KB) remain."
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+"""
+Precompute nearest transit station, distance and walk minutes for every cafe.
+
+Only new or moved cafes, and cafes near stations that changed since their
+last run, are rewritten unless --full is given.
+
+Usage:
+    cd backend && python -m scripts.compute_nearest_stations
+    cd backend && python -m scripts.compute_nearest_stations --city taipei
+    cd backend && python -m scripts.compute_nearest_stations --full
+"""
+
+import sys
+import os
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.database import engine, Base, SessionLocal
+from app.models.station import Station  # noqa: F401 - registers the table
+from app.services.stations import refresh_nearest_stations
+
+
+def main():
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+
+    city = None
+    if "--city" in sys.argv:
+        city = sys.argv[sys.argv.index("--city") + 1]
+    full = "--full" in sys.argv
+
+    started = time.time()
+    updated = refresh_nearest_stations(db, city=city, full=full)
+    db.close()
+    print(f"Updated {updated} cafes in {time.time() - started:.1f}s.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+"""
+Local stand-in for Google Places (searchText / searchNearby) and the Cafe
+Nomad API, for load tests that must not spend quota or depend on the network.
+
+Every city gets a seeded catalog of synthetic cafes around its centre. Cafe
+Nomad requests return that catalog; Places requests return the catalog cafes
+(or synthetic stations, for transit types) closest to the requested circle,
+so entity matching and walk-time filters see realistic data. Responses are
+delayed by --latency-ms plus an exponential tail of mean --jitter-ms, and
+--error-rate of them fail with 503.
+
+Usage:
+    cd backend && python -m scripts.fake_upstream --port 9100
+
+Point the app at it with:
+    PLACES_API_BASE=http://127.0.0.1:9100/places/v1
+    CAFENOMAD_API=http://127.0.0.1:9100/cafenomad/cafes
+    GOOGLE_MAPS_API_KEY=fake
+"""
+
+import argparse
+import asyncio
+import hashlib
+import math
+import random
+import sys
+import os
+import uuid
+from typing import Callable, Dict, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+from app.services.cafenomad import CITIES
+from app.services.google_places import CITY_COORDS, CITY_DISTRICTS, CITY_NAMES
+
+_BRANDS = ["路易莎咖啡", "Louisa Coffee", "cama café", "星巴克", "伯朗咖啡館", "85度C"]
+_WORDS = ["日光", "貓", "森林", "巷弄", "晴天", "小島", "慢活", "木", "白", "Brew", "Roast", "Slow"]
+_SUFFIXES = ["咖啡", "咖啡館", "Cafe", "Coffee", "珈琲", "咖啡廳"]
+_HOURS = ["", "07:00-22:00", "週一至週五 08:00-18:00；週六日 10:00-20:00", "12:00~02:00 週二公休"]
+_YES_NO = ["yes", "no", "maybe", ""]
+_TRANSIT_TYPES = {
+    "transit_station",
+    "bus_stop",
+    "subway_station",
+    "light_rail_station",
+    "train_station",
+}
+# Spread of the synthetic catalog around the city centre, in degrees.
+_SPREAD = 0.05
+_STATIONS_PER_CITY = 60
+# Catalog cafes looked at per Places request before picking the nearest.
+_SAMPLE = 400
+
+
+def _name(rng: random.Random, district: str) -> str:
+    if rng.random() < 0.2:
+        return f"{rng.choice(_BRANDS)} ({district.rstrip('區')}門市)"
+    return f"{rng.choice(_WORDS)}{rng.choice(_WORDS)}{rng.choice(_SUFFIXES)}"
+
+
+def _score(rng: random.Random) -> float:
+    return rng.choice([0, 3, 3.5, 4, 4.5, 5, 3.6666666666667, 4.3333333333333])
+
+
+def _build_city(city: str, count: int) -> Dict[str, list]:
+    rng = random.Random(f"{city}:{count}")
+    lat0, lng0 = CITY_COORDS.get(city, (23.7, 121.0))
+    districts = CITY_DISTRICTS.get(city) or [f"{CITY_NAMES.get(city, city)}區"]
+    stations = []
+    for i in range(_STATIONS_PER_CITY):
+        district = districts[i % len(districts)]
+        stations.append(
+            {
+                "id": f"fake-station-{city}-{i}",
+                "name": f"{district.rstrip('區')}{i}站",
+                "latitude": lat0 + rng.gauss(0, _SPREAD / 2),
+                "longitude": lng0 + rng.gauss(0, _SPREAD / 2),
+            }
+        )
+    cafes = []
+    for _ in range(count):
+        # Cafes cluster around stations, like the real catalog.
+        anchor = rng.choice(stations)
+        district = rng.choice(districts)
+        cafe_id = str(uuid.UUID(int=rng.getrandbits(128)))
+        item = {
+            "id": cafe_id,
+            "name": _name(rng, district),
+            "city": city,
+            "address": f"{CITY_NAMES.get(city, city)}{district}某某路{rng.randint(1, 300)}號",
+            "latitude": f"{anchor['latitude'] + rng.gauss(0, 0.004):.7f}",
+            "longitude": f"{anchor['longitude'] + rng.gauss(0, 0.004):.7f}",
+            "url": "",
+            "mrt": rng.choice(["", f"捷運{anchor['name']}", anchor["name"]]),
+            "open_time": rng.choice(_HOURS),
+            "limited_time": rng.choice(_YES_NO),
+            "standing_desk": rng.choice(_YES_NO),
+            "socket": rng.choice(_YES_NO),
+        }
+        for field in ("wifi", "seat", "quiet", "tasty", "cheap", "music"):
+            item[field] = _score(rng)
+        cafes.append(item)
+    return {"cafes": cafes, "stations": stations}
+
+
+def _area(payload: dict) -> Tuple[float, float, Callable[[float, float], bool]]:
+    """Centre of the requested area, and a test for "inside the restriction"."""
+    restriction = payload.get("locationRestriction") or {}
+    box = restriction.get("rectangle")
+    if box:
+        low, high = box["low"], box["high"]
+
+        def in_box(lat: float, lng: float) -> bool:
+            return (
+                low["latitude"] <= lat <= high["latitude"]
+                and low["longitude"] <= lng <= high["longitude"]
+            )
+
+        return (
+            (low["latitude"] + high["latitude"]) / 2,
+            (low["longitude"] + high["longitude"]) / 2,
+            in_box,
+        )
+    circle = (restriction or payload.get("locationBias") or {}).get("circle") or {}
+    center = circle.get("center") or {}
+    lat0, lng0 = CITY_COORDS["taipei"]
+    lat = float(center.get("latitude", lat0))
+    lng = float(center.get("longitude", lng0))
+    radius_km = float(circle.get("radius", 5000.0)) / 1000
+    if restriction:
+        return lat, lng, lambda a, b: _km(lat, lng, a, b) <= radius_km
+    return lat, lng, lambda a, b: True
+
+
+def _nearest_city(lat: float, lng: float) -> str:
+    return min(
+        CITY_COORDS,
+        key=lambda c: (CITY_COORDS[c][0] - lat) ** 2 + (CITY_COORDS[c][1] - lng) ** 2,
+    )
+
+
+def _km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    x = math.radians(lng2 - lng1) * math.cos(math.radians((lat1 + lat2) / 2))
+    y = math.radians(lat2 - lat1)
+    return 6371.0 * math.hypot(x, y)
+
+
+def create_app(
+    cafes_per_city: int = 1500,
+    latency_ms: float = 80.0,
+    jitter_ms: float = 40.0,
+    error_rate: float = 0.0,
+    seed: int = 0,
+) -> FastAPI:
+    app = FastAPI(title="CaféPick fake upstream")
+    catalogs: Dict[str, Dict[str, list]] = {}
+    rng = random.Random(seed)
+    counters = {"places": 0, "cafenomad": 0, "errors": 0}
+
+    def catalog(city: str) -> Dict[str, list]:
+        if city not in catalogs:
+            catalogs[city] = _build_city(city, cafes_per_city)
+        return catalogs[city]
+
+    async def delay() -> bool:
+        """Sleep like a real upstream; False when this call should fail."""
+        ms = latency_ms + (rng.expovariate(1 / jitter_ms) if jitter_ms else 0.0)
+        await asyncio.sleep(ms / 1000)
+        if error_rate and rng.random() < error_rate:
+            counters["errors"] += 1
+            return False
+        return True
+
+    def places_response(payload: dict) -> dict:
+        lat, lng, inside = _area(payload)
+        limit = int(payload.get("pageSize") or payload.get("maxResultCount") or 20)
+        offset = int(payload.get("pageToken") or 0)
+        types = set(payload.get("includedTypes") or []) | {payload.get("includedType")}
+        query = payload.get("textQuery") or ""
+        data = catalog(_nearest_city(lat, lng))
+        if types & _TRANSIT_TYPES or "站" in query:
+            rows = data["stations"]
+        else:
+            # Restricted searches see every cafe in the area; biased ones a
+            # repeatable per-query slice of the city.
+            cafes = data["cafes"]
+            if not payload.get("locationRestriction"):
+                key = {k: v for k, v in payload.items() if k != "pageToken"}
+                digest = hashlib.sha1(repr(sorted(key.items())).encode()).digest()
+                cafes = random.Random(digest).sample(cafes, min(_SAMPLE, len(cafes)))
+            rows = [
+                {
+                    "id": f"fake-{c['id'][:12]}",
+                    "name": c["name"],
+                    "address": c["address"],
+                    "latitude": float(c["latitude"]),
+                    "longitude": float(c["longitude"]),
+                    "rating": 3.5 + (int(c["id"][:4], 16) % 16) / 10,
+                    "count": int(c["id"][4:8], 16) % 2000 + 5,
+                }
+                for c in cafes
+            ]
+        rows = [r for r in rows if inside(r["latitude"], r["longitude"])]
+        rows.sort(key=lambda r: _km(lat, lng, r["latitude"], r["longitude"]))
+        places = []
+        for row in rows[offset : offset + limit]:
+            place = {
+                "id": row["id"],
+                "displayName": {"text": row["name"], "languageCode": "zh-TW"},
+                "location": {"latitude": row["latitude"], "longitude": row["longitude"]},
+            }
+            if "rating" in row:
+                place["formattedAddress"] = row["address"]
+                place["rating"] = row["rating"]
+                place["userRatingCount"] = row["count"]
+            places.append(place)
+        body = {"places": places} if places else {}
+        if "pageSize" in payload and offset + limit < len(rows):
+            body["nextPageToken"] = str(offset + limit)
+        return body
+
+    @app.post("/places/v1/places:searchText")
+    @app.post("/places/v1/places:searchNearby")
+    async def places(request: Request):
+        counters["places"] += 1
+        payload = await request.json()
+        if not await delay():
+            return JSONResponse({"error": {"code": 503, "status": "UNAVAILABLE"}}, status_code=503)
+        return places_response(payload)
+
+    @app.get("/cafenomad/cafes/{city}")
+    async def cafenomad(city: str):
+        counters["cafenomad"] += 1
+        if city not in CITIES:
+            return []
+        if not await delay():
+            return JSONResponse({"error": "unavailable"}, status_code=503)
+        return catalog(city)["cafes"]
+
+    @app.get("/stats")
+    def stats():
+        return counters
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--cafes-per-city", type=int, default=1500)
+    parser.add_argument("--latency-ms", type=float, default=80.0)
+    parser.add_argument("--jitter-ms", type=float, default=40.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    app = create_app(
+        cafes_per_city=args.cafes_per_city,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        seed=args.seed,
+    )
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -13,10 +13,22 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
 
 import httpx
 import re
+import time
+from typing import Dict, Optional
 from app.database import engine, Base, SessionLocal
 from app.models.cafe import Cafe
-
-CAFENOMAD_API = "https://cafenomad.tw/api/v1.2/cafes"
+from app.models.cafe_tombstone import CafeTombstone
+from app.models.recommendation import PrecomputedRecommendation  # noqa: F401 - registers the table
+from app.models.station import Station  # noqa: F401 - registers the table
+from app.models.area import AreaSummary  # noqa: F401 - registers the table
+from app.services.area_summary import CitySummary, load_or_build_summary, save_summary
+from app.services.catalog_export import city_version
+from app.services.recommend_cache import precompute_city
+from app.services.stations import refresh_nearest_stations
+
+CAFENOMAD_API = os.getenv("CAFENOMAD_API", "https://cafenomad.tw/api/v1.2/cafes").rstrip("/")
+# Ids per IN (...) query; SQLite allows 999 parameters in older builds.
+LOOKUP_CHUNK = 500
 
 CITIES = [
     "taipei",
@@ -49,36 +61,106 @@ def fetch_cafes(city: str) -> list:
     return resp.json()
 
 
-def import_city(db, city: str) -> int:
-    """Import cafes for a single city. Returns count of imported cafes."""
-    print(f"Fetching {city}...")
-    try:
-        data = fetch_cafes(city)
-    except Exception as e:
-        print(f"  Failed to fetch {city}: {e}")
+def import_city(db, city: str, data: Optional[list] = None) -> int:
+    """Import cafes for a single city. Returns count of imported cafes.
+
+    `data` is a Cafe Nomad response to import instead of fetching one
+    (scripts/synthetic_cafes.py). Added and changed cafes are stamped with
+    the city's next catalog version, and cafes missing from the response
+    are deleted with a tombstone, so /api/cafes/snapshot?since= can serve
+    the difference.
+    """
+    if data is None:
+        print(f"Fetching {city}...")
+        try:
+            data = fetch_cafes(city)
+        except Exception as e:
+            print(f"  Failed to fetch {city}: {e}")
+            return 0
+    if not data:
+        # Treat an empty list as a bad response rather than a closed city.
+        print(f"  No cafes returned for {city}; keeping the current catalog")
         return 0
 
-    count = 0
+    summary = load_or_build_summary(db, city)
+    version = city_version(db, city) + 1
+    now = time.time()
+    existing_rows = {cafe.id: cafe for cafe in db.query(Cafe).filter(Cafe.city == city)}
+    # Rows listed under another city so far, looked up in chunks rather than one by one.
+    other_ids = [item["id"] for item in data if item.get("id") and item["id"] not in existing_rows]
+    elsewhere = {}
+    for start in range(0, len(other_ids), LOOKUP_CHUNK):
+        chunk = other_ids[start : start + LOOKUP_CHUNK]
+        elsewhere.update({cafe.id: cafe for cafe in db.query(Cafe).filter(Cafe.id.in_(chunk))})
+    tombstones = {
+        cafe_id for (cafe_id,) in db.query(CafeTombstone.id).filter(CafeTombstone.city == city)
+    }
+    # Summaries of the cities that cafes moved away from.
+    left: Dict[str, CitySummary] = {}
+    seen = set()
+    count = changed = 0
     for item in data:
         cafe_id = item.get("id")
         if not cafe_id:
             continue
+        seen.add(cafe_id)
 
-        existing = db.query(Cafe).filter(Cafe.id == cafe_id).first()
+        fields = _map_fields(item, city)
+        existing = existing_rows.get(cafe_id) or elsewhere.get(cafe_id)
         if existing:
+            if all(getattr(existing, key) == val for key, val in fields.items()):
+                count += 1
+                continue
+            if existing.city != city:
+                # Moved from another city: that city's clients and summary must drop it.
+                _add_tombstone(db, existing, city_version(db, existing.city) + 1, now)
+                if existing.city not in left:
+                    left[existing.city] = load_or_build_summary(db, existing.city)
+                left[existing.city].remove(existing)
+            else:
+                summary.remove(existing)
             # Update existing record
-            for key, val in _map_fields(item, city).items():
+            if (existing.latitude, existing.longitude) != (fields["latitude"], fields["longitude"]):
+                # Moved: nearest-station columns must be recomputed.
+                existing.station_version = None
+            for key, val in fields.items():
                 setattr(existing, key, val)
+            existing.version = version
+            summary.add(existing)
         else:
-            cafe = Cafe(id=cafe_id, **_map_fields(item, city))
+            cafe = Cafe(id=cafe_id, version=version, **fields)
             db.add(cafe)
+            existing_rows[cafe_id] = cafe
+            summary.add(cafe)
+        if cafe_id in tombstones:
+            # A cafe that comes back replaces its tombstone here; other cities keep theirs.
+            db.query(CafeTombstone).filter(
+                CafeTombstone.city == city, CafeTombstone.id == cafe_id
+            ).delete()
         count += 1
+        changed += 1
 
+    removed = [cafe for cafe_id, cafe in existing_rows.items() if cafe_id not in seen]
+    for cafe in removed:
+        summary.remove(cafe)
+        _add_tombstone(db, cafe, version, now)
+        db.delete(cafe)
+
+    save_summary(db, summary)
+    for other in left.values():
+        save_summary(db, other)
     db.commit()
-    print(f"  Imported {count} cafes from {city}")
+    print(
+        f"  Imported {count} cafes from {city}: {changed} changed, {len(removed)} removed"
+        + (f" (version {version})" if changed or removed else "")
+    )
     return count
 
 
+def _add_tombstone(db, cafe: Cafe, version: int, now: float) -> None:
+    db.merge(CafeTombstone(id=cafe.id, city=cafe.city, version=version, deleted_at=now))
+
+
 def _map_fields(item: dict, city: str) -> dict:
     """Map Cafe Nomad API fields to our Cafe model."""
     wifi_score = _to_float(item.get("wifi"))
@@ -219,8 +301,13 @@ def main():
     for city in cities:
         total += import_city(db, city)
 
+    updated = refresh_nearest_stations(db)
+    # After the station refresh, so the entries carry the final data version.
+    precomputed = sum(precompute_city(db, city) for city in cities)
     db.close()
     print(f"\nDone! Total: {total} cafes imported.")
+    print(f"Nearest stations refreshed for {updated} cafes.")
+    print(f"Precomputed {precomputed} recommendation entries.")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,132 @@
+"""
+Import transit stations (MRT / light rail / train) from Google Places into the
+local `stations` table, then refresh nearest-station columns for affected cafes.
+
+Stations that no city's sweep finds any more are deactivated, not deleted.
+
+Usage:
+    cd backend && python -m scripts.import_stations
+    cd backend && python -m scripts.import_stations --city taipei
+"""
+
+import sys
+import os
+import time
+from typing import List, Optional, Set
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.database import engine, Base, SessionLocal
+from app.models.station import Station
+from app.services.google_places import CITY_COORDS, search_stations_near
+from app.services.stations import refresh_nearest_stations
+
+# searchNearby returns at most 20 places, so each city is swept as a grid of
+# small circles around its center.
+SWEEP_RADIUS_KM = 15.0
+STEP_KM = 4.0
+CIRCLE_RADIUS_M = 3000.0
+# Ids per IN (...) query.
+LOOKUP_CHUNK = 500
+
+
+def _sweep_points(lat: float, lng: float):
+    steps = int(SWEEP_RADIUS_KM // STEP_KM)
+    dlat = STEP_KM / 111.32
+    dlng = STEP_KM / 101.0  # ~111.32 * cos(25°)
+    for i in range(-steps, steps + 1):
+        for j in range(-steps, steps + 1):
+            yield lat + i * dlat, lng + j * dlng
+
+
+def fetch_stations(city: str) -> dict:
+    lat, lng = CITY_COORDS[city]
+    found = {}
+    for p_lat, p_lng in _sweep_points(lat, lng):
+        for station in search_stations_near(p_lat, p_lng, CIRCLE_RADIUS_M):
+            found[station.pop("id")] = station
+    return found
+
+
+def import_city(db, city: str, seen: Set[str]) -> Optional[int]:
+    """Upsert the stations the city's sweep finds; returns rows changed.
+
+    Sweeps of neighbouring cities overlap, so a station may already be
+    stored under another city; it is updated in place and keeps that city.
+    Ids found are added to `seen`. Returns None when the sweep failed.
+    """
+    print(f"Fetching stations for {city}...")
+    try:
+        found = fetch_stations(city)
+    except Exception as e:
+        print(f"  Failed to fetch {city}: {e}")
+        return None
+
+    now = time.time()
+    changed = 0
+    existing = {s.id: s for s in db.query(Station).filter(Station.city == city).all()}
+    others = [station_id for station_id in found if station_id not in existing]
+    for start in range(0, len(others), LOOKUP_CHUNK):
+        chunk = others[start : start + LOOKUP_CHUNK]
+        existing.update({s.id: s for s in db.query(Station).filter(Station.id.in_(chunk))})
+    for station_id, fields in found.items():
+        seen.add(station_id)
+        row = existing.get(station_id)
+        if row is None:
+            db.add(Station(id=station_id, city=city, active=True, updated_at=now, **fields))
+            changed += 1
+            continue
+        moved = (row.latitude, row.longitude) != (fields["latitude"], fields["longitude"])
+        if moved or row.name != fields["name"] or not row.active:
+            for key, val in fields.items():
+                setattr(row, key, val)
+            row.active = True
+            row.updated_at = now
+            changed += 1
+
+    db.commit()
+    print(f"  {len(found)} stations, {changed} changed")
+    return changed
+
+
+def deactivate_missing(db, cities: List[str], seen: Set[str]) -> int:
+    """Deactivate the cities' stations that no sweep of this run found."""
+    now = time.time()
+    changed = 0
+    rows = db.query(Station).filter(Station.city.in_(cities), Station.active.is_(True))
+    for row in rows:
+        if row.id not in seen:
+            row.active = False
+            row.updated_at = now
+            changed += 1
+    db.commit()
+    return changed
+
+
+def main():
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+
+    cities = list(CITY_COORDS.keys())
+    if len(sys.argv) > 2 and sys.argv[1] == "--city":
+        cities = [sys.argv[2]]
+
+    # Deactivation waits for every sweep: a neighbouring city may find the station.
+    seen: Set[str] = set()
+    swept = []
+    changed = 0
+    for city in cities:
+        result = import_city(db, city, seen)
+        if result is not None:
+            swept.append(city)
+            changed += result
+    changed += deactivate_missing(db, swept, seen)
+
+    if changed:
+        updated = refresh_nearest_stations(db)
+        print(f"Refreshed nearest stations for {updated} cafes.")
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+"""
+Invalidate a shared cache namespace for every worker on this host.
+
+Usage:
+    cd backend && CAFEPICK_CACHE_BACKEND=sqlite python -m scripts.invalidate_cache cafenomad
+    cd backend && CAFEPICK_CACHE_BACKEND=sqlite python -m scripts.invalidate_cache places mrt
+"""
+
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.services import shared_cache
+from app.services.google_places import clear_places_cache
+
+NAMESPACES = ["cafenomad", "places", "mrt"]
+
+
+def main():
+    namespaces = sys.argv[1:] or NAMESPACES
+    for namespace in namespaces:
+        if namespace not in NAMESPACES:
+            print(f"Unknown namespace: {namespace} (expected one of {', '.join(NAMESPACES)})")
+            continue
+        if namespace == "places":
+            # Also drops the persistent on-disk Places cache.
+            clear_places_cache()
+        else:
+            shared_cache.invalidate(namespace)
+        print(f"Invalidated {namespace}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,405 @@
+"""
+Drive concurrent traffic at the API and report latency percentiles.
+
+Runs a weighted mix of /api/cafes, /api/cafes/recommend (with and without a
+transit point), /api/transit and /api/areas for --duration seconds at each
+--concurrency level, and reports throughput and p50/p95/p99 per endpoint.
+
+Against a running app:
+    cd backend && python -m scripts.loadtest --base-url http://127.0.0.1:8000
+
+Or let the harness start scripts/fake_upstream.py and the app itself, once
+per --workers count, with its data and caches in a temporary directory:
+    cd backend && python -m scripts.loadtest --spawn --workers 1,2,4 \\
+        --concurrency 8,32,64 --duration 20 --output loadtest.json
+
+Results are written as JSON (--output) so runs can be compared, and printed
+as a table. Keep in mind that the generator is a single Python process: at
+high concurrency compare its own CPU use with the server's before blaming
+the app.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import httpx
+
+from app.services.google_places import CITY_COORDS, CITY_DISTRICTS
+
+BACKEND_DIR = os.path.join(os.path.dirname(__file__), "..")
+DEFAULT_MIX = "cafes=3,recommend=3,recommend_transit=2,transit=1,areas=1"
+DEFAULT_CITIES = "taipei=6,taichung=2,kaohsiung=1,tainan=1"
+READY_TIMEOUT_SECONDS = 180
+
+
+def _weights(spec: str) -> Dict[str, float]:
+    weights = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip():
+            weights[name.strip()] = float(weight or 1)
+    return weights
+
+
+def _ints(spec: str) -> List[int]:
+    return [int(v) for v in spec.split(",") if v.strip()]
+
+
+def percentile(sorted_values: List[float], p: float) -> Optional[float]:
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return None
+    rank = max(1, int(-(-p * len(sorted_values) // 100)))
+    return sorted_values[rank - 1]
+
+
+class Traffic:
+    """Picks the next request of the mix."""
+
+    def __init__(self, mix: Dict[str, float], cities: Dict[str, float], seed: int):
+        unknown = set(mix) - set(ENDPOINTS)
+        if unknown:
+            raise SystemExit(f"Unknown endpoints in --mix: {', '.join(sorted(unknown))}")
+        self.rng = random.Random(seed)
+        self.names = list(mix)
+        self.weights = [mix[n] for n in self.names]
+        self.cities = list(cities)
+        self.city_weights = [cities[c] for c in self.cities]
+        self.transit: Dict[str, List[dict]] = {}
+
+    def city(self) -> str:
+        return self.rng.choices(self.cities, self.city_weights)[0]
+
+    def district(self, city: str) -> Optional[str]:
+        districts = CITY_DISTRICTS.get(city) or []
+        if not districts or self.rng.random() < 0.2:
+            return None
+        return self.rng.choice(districts)
+
+    def transit_point(self, city: str) -> dict:
+        points = self.transit.get(city)
+        if points:
+            return self.rng.choice(points)
+        lat, lng = CITY_COORDS[city]
+        return {"name": "", "latitude": lat, "longitude": lng}
+
+    def next(self) -> Tuple[str, str, dict]:
+        name = self.rng.choices(self.names, self.weights)[0]
+        path, params = ENDPOINTS[name](self)
+        return name, path, {k: v for k, v in params.items() if v is not None}
+
+
+def _cafes(t: Traffic):
+    city = t.city()
+    return "/api/cafes", {"city": city, "district": t.district(city), "limit": 20}
+
+
+def _recommend(t: Traffic):
+    city = t.city()
+    return "/api/cafes/recommend", {"city": city, "district": t.district(city), "top_n": 5}
+
+
+def _recommend_transit(t: Traffic):
+    city = t.city()
+    point = t.transit_point(city)
+    return "/api/cafes/recommend", {
+        "city": city,
+        "transit_lat": point["latitude"],
+        "transit_lng": point["longitude"],
+        "transit_name": point.get("name") or None,
+        "max_walk_minutes": t.rng.choice([5, 10, 15]),
+        "top_n": 5,
+    }
+
+
+def _transit(t: Traffic):
+    city = t.city()
+    return "/api/transit", {"city": city, "district": t.district(city), "limit": 20}
+
+
+def _areas(t: Traffic):
+    return "/api/areas", {"city": t.city() if t.rng.random() < 0.7 else None}
+
+
+ENDPOINTS = {
+    "cafes": _cafes,
+    "recommend": _recommend,
+    "recommend_transit": _recommend_transit,
+    "transit": _transit,
+    "areas": _areas,
+}
+
+
+async def _load_transit_points(client: httpx.AsyncClient, traffic: Traffic) -> None:
+    for city in traffic.cities:
+        try:
+            resp = await client.get(
+                "/api/transit", params={"city": city, "only_with_cafes": "false"}
+            )
+            resp.raise_for_status()
+            traffic.transit[city] = resp.json().get("transit_points", [])
+        except Exception as e:
+            print(f"  no transit points for {city} ({e}); using the city centre")
+
+
+async def _run(
+    base_url: str, traffic: Traffic, concurrency: int, duration: float, record: bool = True
+) -> dict:
+    samples: Dict[str, List[float]] = {name: [] for name in traffic.names}
+    errors: Dict[str, Dict[str, int]] = {name: {} for name in traffic.names}
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        if not traffic.transit:
+            await _load_transit_points(client, traffic)
+        started = time.perf_counter()
+        deadline = started + duration
+
+        async def user():
+            while time.perf_counter() < deadline:
+                name, path, params = traffic.next()
+                t0 = time.perf_counter()
+                try:
+                    resp = await client.get(path, params=params)
+                    status = str(resp.status_code) if resp.status_code >= 400 else None
+                except httpx.HTTPError as e:
+                    status = type(e).__name__
+                elapsed_ms = (time.perf_counter() - t0) * 1000
+                if status is None:
+                    samples[name].append(elapsed_ms)
+                else:
+                    errors[name][status] = errors[name].get(status, 0) + 1
+
+        await asyncio.gather(*(user() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    if not record:
+        return {}
+    endpoints = {}
+    for name in traffic.names:
+        values = sorted(samples[name])
+        failed = sum(errors[name].values())
+        endpoints[name] = {
+            "requests": len(values) + failed,
+            "errors": failed,
+            "error_kinds": errors[name],
+            "throughput_rps": round(len(values) / elapsed, 2),
+            "p50_ms": _round(percentile(values, 50)),
+            "p95_ms": _round(percentile(values, 95)),
+            "p99_ms": _round(percentile(values, 99)),
+            "max_ms": _round(values[-1] if values else None),
+        }
+    ok = sum(len(v) for v in samples.values())
+    every = sorted(v for values in samples.values() for v in values)
+    return {
+        "concurrency": concurrency,
+        "duration_s": round(elapsed, 2),
+        "requests": ok + sum(e["errors"] for e in endpoints.values()),
+        "errors": sum(e["errors"] for e in endpoints.values()),
+        "throughput_rps": round(ok / elapsed, 2),
+        "p50_ms": _round(percentile(every, 50)),
+        "p95_ms": _round(percentile(every, 95)),
+        "p99_ms": _round(percentile(every, 99)),
+        "endpoints": endpoints,
+    }
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return None if value is None else round(value, 2)
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_ready(url: str, proc: subprocess.Popen, log_path: str) -> None:
+    deadline = time.time() + READY_TIMEOUT_SECONDS
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            break
+        try:
+            if httpx.get(url, timeout=2).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    with open(log_path, errors="replace") as f:
+        tail = f.read()[-4000:]
+    raise SystemExit(f"{url} did not become ready. Log tail:\n{tail}")
+
+
+def _start(cmd: List[str], env: dict, log_path: str) -> subprocess.Popen:
+    log = open(log_path, "w")
+    return subprocess.Popen(cmd, cwd=BACKEND_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+
+def _stop(proc: Optional[subprocess.Popen]) -> None:
+    if proc is not None and proc.poll() is None:
+        proc.terminate()
+        try:
+            proc.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def print_summary(report: dict) -> None:
+    header = f"{'workers':>7} {'conc':>5} {'endpoint':<18} {'req':>7} {'err':>5} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8}"
+    print(header)
+    print("-" * len(header))
+
+    def fmt(v):
+        return "-" if v is None else f"{v:.1f}"
+
+    for run in report["runs"]:
+        rows = [("ALL", run)] + list(run["endpoints"].items())
+        for name, row in rows:
+            print(
+                f"{str(run.get('workers', '-')):>7} {run['concurrency']:>5} {name:<18} "
+                f"{row['requests']:>7} {row['errors']:>5} {row['throughput_rps']:>8.1f} "
+                f"{fmt(row['p50_ms']):>8} {fmt(row['p95_ms']):>8} {fmt(row['p99_ms']):>8}"
+            )
+        print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--concurrency", default="8,32", help="comma-separated levels")
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds per level")
+    parser.add_argument("--warmup", type=float, default=5.0, help="unrecorded seconds first")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"endpoint weights ({DEFAULT_MIX})")
+    parser.add_argument("--cities", default=DEFAULT_CITIES, help="city weights")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument("--spawn", action="store_true", help="start fake upstream and app")
+    parser.add_argument("--workers", default="1", help="uvicorn worker counts, with --spawn")
+    parser.add_argument("--upstream-latency-ms", type=float, default=80.0)
+    parser.add_argument("--upstream-error-rate", type=float, default=0.0)
+    parser.add_argument("--cafes-per-city", type=int, default=1500)
+    args = parser.parse_args()
+
+    mix = _weights(args.mix)
+    cities = _weights(args.cities)
+    unknown = set(cities) - set(CITY_COORDS)
+    if unknown:
+        raise SystemExit(f"Unknown cities: {', '.join(sorted(unknown))}")
+    levels = _ints(args.concurrency)
+    report = {
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "config": {
+            "mix": mix,
+            "cities": cities,
+            "duration_s": args.duration,
+            "warmup_s": args.warmup,
+            "seed": args.seed,
+            "spawn": args.spawn,
+            "upstream_latency_ms": args.upstream_latency_ms if args.spawn else None,
+            "upstream_error_rate": args.upstream_error_rate if args.spawn else None,
+        },
+        "runs": [],
+    }
+
+    def measure(base_url: str, workers: Optional[int]) -> None:
+        traffic = Traffic(mix, cities, args.seed)
+        if args.warmup:
+            asyncio.run(_run(base_url, traffic, max(levels), args.warmup, record=False))
+        for level in levels:
+            print(f"workers={workers or '?'} concurrency={level} ...")
+            run = asyncio.run(_run(base_url, traffic, level, args.duration))
+            if workers is not None:
+                run = {"workers": workers, **run}
+            report["runs"].append(run)
+
+    if not args.spawn:
+        measure(args.base_url.rstrip("/"), None)
+    else:
+        workdir = tempfile.mkdtemp(prefix="cafepick-loadtest-")
+        upstream_port = _free_port()
+        upstream = None
+        try:
+            upstream = _start(
+                [
+                    sys.executable,
+                    "-m",
+                    "scripts.fake_upstream",
+                    "--port",
+                    str(upstream_port),
+                    "--cafes-per-city",
+                    str(args.cafes_per_city),
+                    "--latency-ms",
+                    str(args.upstream_latency_ms),
+                    "--jitter-ms",
+                    str(args.upstream_latency_ms / 2),
+                    "--error-rate",
+                    str(args.upstream_error_rate),
+                ],
+                dict(os.environ),
+                os.path.join(workdir, "upstream.log"),
+            )
+            upstream_url = f"http://127.0.0.1:{upstream_port}"
+            _wait_ready(f"{upstream_url}/stats", upstream, os.path.join(workdir, "upstream.log"))
+            for workers in _ints(args.workers):
+                data_dir = os.path.join(workdir, f"data-{workers}")
+                os.makedirs(data_dir)
+                env = {
+                    **os.environ,
+                    "PLACES_API_BASE": f"{upstream_url}/places/v1",
+                    "CAFENOMAD_API": f"{upstream_url}/cafenomad/cafes",
+                    "GOOGLE_MAPS_API_KEY": "fake",
+                    "CAFEPICK_DATA_DIR": data_dir,
+                    "CAFEPICK_WARM_CITIES": ",".join(cities),
+                }
+                if workers > 1:
+                    # Workers only share Cafe Nomad data through the SQLite backend.
+                    env.setdefault("CAFEPICK_CACHE_BACKEND", "sqlite")
+                port = _free_port()
+                log_path = os.path.join(workdir, f"app-{workers}.log")
+                app = _start(
+                    [
+                        sys.executable,
+                        "-m",
+                        "uvicorn",
+                        "app.main:app",
+                        "--port",
+                        str(port),
+                        "--workers",
+                        str(workers),
+                        "--log-level",
+                        "warning",
+                    ],
+                    env,
+                    log_path,
+                )
+                try:
+                    base_url = f"http://127.0.0.1:{port}"
+                    _wait_ready(f"{base_url}/readyz", app, log_path)
+                    measure(base_url, workers)
+                finally:
+                    _stop(app)
+        finally:
+            _stop(upstream)
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print()
+    print_summary(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Link Google Places results to Cafe Nomad cafes (cafe_links table).
+
+Searches Places for the city and each of its districts, then matches the
+results against the city's cafes with entity_match. Places that are already
+linked are skipped unless --full is given, which rematches the whole city.
+
+Usage:
+    cd backend && python -m scripts.match_places --city taipei
+    cd backend && python -m scripts.match_places --city taipei --full
+"""
+
+import sys
+import os
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.database import engine, Base, SessionLocal
+from app.models.cafe import Cafe
+from app.models.cafe_link import CafeLink
+from app.services.cafenomad import fetch_cafes
+from app.services.entity_match import MatchIndex, match_all, save_links
+from app.services.google_places import get_city_districts, search_places
+
+
+def _places(city: str) -> list:
+    places = {}
+    for keyword in [None] + get_city_districts(city):
+        try:
+            for place in search_places(city, keyword, limit=20):
+                places[place["id"]] = place
+        except Exception as e:
+            print(f"  Places search failed for {keyword or city}: {e}")
+    return list(places.values())
+
+
+def main():
+    args = sys.argv[1:]
+    if "--city" not in args:
+        print(__doc__)
+        return
+    city = args[args.index("--city") + 1]
+    full = "--full" in args
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+
+    cafes = db.query(Cafe).filter(Cafe.city == city).all()
+    if not cafes:
+        # Nothing imported for this city yet: match the live catalog.
+        cafes = fetch_cafes(city)
+    places = _places(city)
+    print(f"{city}: {len(cafes)} cafes, {len(places)} places")
+
+    started = time.time()
+    index = MatchIndex(cafes)
+    existing = db.query(CafeLink).filter(CafeLink.city == city)
+    if full:
+        existing.delete()
+        taken = set()
+    else:
+        linked = {link.place_id: link.cafe_id for link in existing}
+        places = [p for p in places if p["id"] not in linked]
+        taken = set(linked.values())
+    links = match_all(index, places, taken=taken)
+    save_links(db, city, links)
+    db.commit()
+    db.close()
+    print(f"Linked {len(links)} of {len(places)} places in {time.time() - started:.2f}s.")
+
+
+if __name__ == "__main__":
+    main()
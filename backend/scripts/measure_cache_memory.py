@@ -0,0 +1,101 @@
+"""
+Measure the resident size of the Cafe Nomad cache for all cities, as plain
+_map_fields dicts vs. compact CafeRecords.
+
+Usage:
+    cd backend && python -m scripts.measure_cache_memory
+    cd backend && python -m scripts.measure_cache_memory --synthetic 2000
+
+--synthetic N builds N fake API rows per city instead of calling Cafe Nomad.
+"""
+
+import gc
+import json
+import random
+import sys
+import os
+import tracemalloc
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import httpx
+
+from app.services.cafenomad import CAFENOMAD_API, CITIES, CafeRecord, _map_fields
+
+_DISTRICTS = ["大安區", "中山區", "信義區", "松山區", "中正區", "萬華區", "西區", "北區"]
+_STATIONS = ["捷運忠孝復興站", "捷運中山站", "捷運市政府站", "捷運古亭站", "", "台鐵車站"]
+_HOURS = ["", "07:00-22:00", "週一至週五 08:00-18:00；週六日 10:00-20:00", "12:00~02:00 週二公休"]
+_YES_NO = ["yes", "no", "maybe", ""]
+
+
+def _fake_item(rng: random.Random) -> dict:
+    district = rng.choice(_DISTRICTS)
+    item = {
+        "id": str(uuid.UUID(int=rng.getrandbits(128))),
+        "name": f"咖啡廳{rng.randint(1, 99999)}號店",
+        "address": f"台北市{district}某某路{rng.randint(1, 300)}巷{rng.randint(1, 60)}號",
+        "latitude": f"{25.0 + rng.random() * 0.1:.7f}",
+        "longitude": f"{121.5 + rng.random() * 0.1:.7f}",
+        "url": rng.choice(["", "", f"https://example.com/{rng.randint(1, 99999)}"]),
+        "mrt": rng.choice(_STATIONS),
+        "open_time": rng.choice(_HOURS),
+        "limited_time": rng.choice(_YES_NO),
+        "standing_desk": rng.choice(_YES_NO),
+        "socket": rng.choice(_YES_NO),
+    }
+    for field in ("wifi", "seat", "quiet", "tasty", "cheap", "music"):
+        item[field] = rng.choice([0, 3, 3.5, 4, 4.5, 5, 3.6666666666667, 4.3333333333333])
+    return item
+
+
+def _load_raw(synthetic: int) -> dict:
+    if synthetic:
+        rng = random.Random(0)
+        return {city: [_fake_item(rng) for _ in range(synthetic)] for city in CITIES}
+    raw = {}
+    for city in CITIES:
+        resp = httpx.get(f"{CAFENOMAD_API}/{city}", timeout=30)
+        resp.raise_for_status()
+        raw[city] = resp.json()
+    return raw
+
+
+def _measure(build) -> int:
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    data = build()
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del data
+    return size
+
+
+def main():
+    synthetic = 0
+    if len(sys.argv) > 2 and sys.argv[1] == "--synthetic":
+        synthetic = int(sys.argv[2])
+    # Round-trip through JSON so every row owns fresh strings, like an API response.
+    raw_json = json.dumps(_load_raw(synthetic), ensure_ascii=False)
+    count = sum(len(items) for items in json.loads(raw_json).values())
+
+    def as_dicts():
+        raw = json.loads(raw_json)
+        return {city: [_map_fields(item, city) for item in raw.pop(city)] for city in CITIES}
+
+    def as_records():
+        raw = json.loads(raw_json)
+        return {city: [CafeRecord.from_item(item, city) for item in raw.pop(city)] for city in CITIES}
+
+    dict_bytes = _measure(as_dicts)
+    record_bytes = _measure(as_records)
+    print(f"{count} cafes across {len(CITIES)} cities")
+    print(f"dicts:   {dict_bytes / 1024 / 1024:8.2f} MB ({dict_bytes / count:.0f} B/cafe)")
+    print(f"records: {record_bytes / 1024 / 1024:8.2f} MB ({record_bytes / count:.0f} B/cafe)")
+    print(f"ratio:   {dict_bytes / record_bytes:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,7 +7,9 @@ Usage:
 import os
 import re
 import sqlite3
-from app.database import DB_PATH
+from app.database import DB_PATH, Base, engine
+from app.models.cafe_tombstone import CafeTombstone
+from app.models.recommendation import PrecomputedRecommendation
 
 
 def _normalize_mrt_station(mrt: str) -> str:
@@ -114,6 +116,19 @@ def main() -> None:
         ("has_wifi", "INTEGER"),
         ("has_socket", "INTEGER"),
         ("reservable", "INTEGER"),
+        ("nearest_station_id", "TEXT"),
+        ("nearest_station", "TEXT"),
+        ("nearest_station_km", "REAL"),
+        ("nearest_station_walk_minutes", "INTEGER"),
+        ("nearby_stations", "TEXT"),
+        ("station_version", "TEXT"),
+        ("stations_computed_at", "REAL"),
+        ("version", "INTEGER"),
+    ]
+    indexes = [
+        ("ix_cafes_nearest_station_id", "nearest_station_id"),
+        ("ix_cafes_nearest_station_walk_minutes", "nearest_station_walk_minutes"),
+        ("ix_cafes_version", "version"),
     ]
 
     added = 0
@@ -128,6 +143,9 @@ def main() -> None:
     else:
         print("No new columns added.")
 
+    for index_name, column in indexes:
+        cur.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON cafes ({column})")
+
     # Backfill basic derived fields for existing rows
     cur.execute(
         "SELECT id, address, mrt, wifi, socket, quiet, cheap, has_wifi, has_socket, quiet_level, price, district, mrt_station FROM cafes"
@@ -167,8 +185,30 @@ def main() -> None:
             params = list(updates.values()) + [cafe_id]
             cur.execute(f"UPDATE cafes SET {sets} WHERE id = ?", params)
 
+    # Tombstones used to be keyed by cafe id alone; rebuild them keyed by (city, id).
+    cur.execute("PRAGMA table_info(cafe_tombstones)")
+    keyed = [row[1] for row in cur.fetchall() if row[5]]
+    rebuild = keyed == ["id"]
+    if rebuild:
+        cur.execute("ALTER TABLE cafe_tombstones RENAME TO cafe_tombstones_old")
+        cur.execute("DROP INDEX IF EXISTS ix_cafe_tombstones_city")
+        cur.execute("DROP INDEX IF EXISTS ix_cafe_tombstones_version")
+
     conn.commit()
     conn.close()
+    Base.metadata.create_all(
+        bind=engine, tables=[CafeTombstone.__table__, PrecomputedRecommendation.__table__]
+    )
+    if rebuild:
+        conn = sqlite3.connect(DB_PATH)
+        conn.execute(
+            "INSERT INTO cafe_tombstones (city, id, version, deleted_at) "
+            "SELECT city, id, version, deleted_at FROM cafe_tombstones_old"
+        )
+        conn.execute("DROP TABLE cafe_tombstones_old")
+        conn.commit()
+        conn.close()
+        print("Rebuilt cafe_tombstones keyed by (city, id).")
     print("Migration complete.")
 
 
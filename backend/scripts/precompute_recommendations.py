@@ -0,0 +1,47 @@
+"""
+Precompute /api/cafes/recommend/local results for the common filter sets
+(recommend_cache.PRESETS) in each city's busiest districts.
+
+Entries are tagged with the city's data version, so after an import or a
+nearest-station refresh they are ignored until this runs again (the
+importer runs it for the cities it imported).
+
+Usage:
+    cd backend && python -m scripts.precompute_recommendations
+    cd backend && python -m scripts.precompute_recommendations --city taipei
+"""
+
+import sys
+import os
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.database import engine, Base, SessionLocal
+from app.models.cafe import Cafe
+from app.models.cafe_tombstone import CafeTombstone  # noqa: F401 - registers the table
+from app.models.recommendation import PrecomputedRecommendation  # noqa: F401 - registers the table
+from app.services.recommend_cache import precompute_city
+
+
+def main():
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+
+    if "--city" in sys.argv:
+        cities = [sys.argv[sys.argv.index("--city") + 1]]
+    else:
+        cities = [city for (city,) in db.query(Cafe.city).distinct().order_by(Cafe.city)]
+
+    started = time.time()
+    total = 0
+    for city in cities:
+        stored = precompute_city(db, city)
+        print(f"  {city}: {stored} entries")
+        total += stored
+    db.close()
+    print(f"Precomputed {total} entries in {time.time() - started:.1f}s.")
+
+
+if __name__ == "__main__":
+    main()
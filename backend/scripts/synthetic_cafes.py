@@ -0,0 +1,294 @@
+"""
+Seeded generator of realistic Cafe Nomad API rows, from one city to a
+national catalog (10k - 1M rows), for loading and scaling tests.
+
+- Cities get rows in proportion to CITY_WEIGHTS (Taipei-heavy, outlying
+  islands nearly empty); Taipei rows include New Taipei addresses.
+- Inside a city, cafes cluster around hotspots (stations and town centres)
+  whose popularity follows a Zipf law, so a few districts are dense and the
+  rest sparse. About 1% have blank or zero coordinates.
+- Addresses mix 台北市 / 臺北市 / no city, postal codes, 段 / 巷 / 弄 / 樓,
+  English-style addresses and county towns that have no 區.
+- MRT strings look like what people type: exits, walking times, line
+  names, two stations at once, English, 無 and blanks.
+- Ratings: about a quarter of cafes are unrated (0); the rest are averages
+  of a few 1-5 votes around a per-cafe quality skewed high, so values like
+  3.6666666666667 occur the way they do upstream.
+
+The same --rows and --seed always give the same rows (ids included).
+
+Usage:
+    cd backend && python -m scripts.synthetic_cafes --rows 100000 --out /tmp/cafes.json
+    cd backend && python -m scripts.synthetic_cafes --rows 100000 --import
+"""
+
+import argparse
+import json
+import random
+import sys
+import os
+import uuid
+from typing import Dict, List, Optional, Sequence, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.services.cafenomad import CITIES, CITY_NAMES
+from app.services.google_places import CITY_COORDS, CITY_DISTRICTS
+
+CITY_WEIGHTS = {
+    "taipei": 42.0,
+    "taichung": 12.0,
+    "kaohsiung": 9.0,
+    "tainan": 9.0,
+    "taoyuan": 6.0,
+    "hsinchu": 5.0,
+    "keelung": 1.5,
+    "miaoli": 1.0,
+    "changhua": 2.0,
+    "nantou": 1.0,
+    "yunlin": 1.0,
+    "chiayi": 2.0,
+    "pingtung": 1.5,
+    "yilan": 2.5,
+    "hualien": 2.0,
+    "taitung": 1.0,
+    "penghu": 0.6,
+    "kinmen": 0.5,
+    "lienchiang": 0.1,
+}
+# Cities and counties whose addresses have no CITY_DISTRICTS entry.
+TOWNS = {
+    "keelung": ["仁愛區", "信義區", "中正區", "中山區", "安樂區", "暖暖區", "七堵區"],
+    "hsinchu": ["東區", "北區", "香山區", "竹北市", "湖口鄉"],
+    "miaoli": ["苗栗市", "頭份市", "竹南鎮", "苑裡鎮"],
+    "changhua": ["彰化市", "員林市", "鹿港鎮", "和美鎮"],
+    "nantou": ["南投市", "埔里鎮", "草屯鎮", "魚池鄉"],
+    "yunlin": ["斗六市", "虎尾鎮", "西螺鎮", "北港鎮"],
+    "chiayi": ["東區", "西區", "太保市", "民雄鄉"],
+    "tainan": ["中西區", "東區", "北區", "安平區", "南區", "永康區", "安南區", "新營區"],
+    "pingtung": ["屏東市", "潮州鎮", "東港鎮", "恆春鎮"],
+    "yilan": ["宜蘭市", "羅東鎮", "礁溪鄉", "頭城鎮"],
+    "hualien": ["花蓮市", "吉安鄉", "新城鄉", "壽豐鄉"],
+    "taitung": ["台東市", "池上鄉", "成功鎮", "鹿野鄉"],
+    "penghu": ["馬公市", "湖西鄉", "白沙鄉"],
+    "kinmen": ["金城鎮", "金湖鎮", "金沙鎮"],
+    "lienchiang": ["南竿鄉", "北竿鄉"],
+}
+COUNTIES = {
+    "miaoli", "changhua", "nantou", "yunlin", "pingtung", "yilan", "hualien", "taitung",
+    "penghu", "kinmen", "lienchiang",
+}
+MRT_STATIONS = {
+    "taipei": [
+        "台北車站", "中山", "忠孝復興", "忠孝敦化", "大安", "科技大樓", "公館", "台電大樓",
+        "古亭", "東門", "雙連", "民權西路", "西門", "市政府", "國父紀念館", "松江南京",
+        "南京復興", "行天宮", "六張犁", "善導寺", "龍山寺", "圓山", "劍潭", "士林",
+        "北投", "新北投", "內湖", "南港", "景美", "大坪林", "永安市場", "頂溪", "板橋",
+        "府中", "新埔", "三重", "淡水", "象山", "信義安和", "中山國中",
+    ],
+    "taichung": ["市政府", "文心森林公園", "水安宮", "南屯", "豐樂公園", "台中車站", "大慶"],
+    "kaohsiung": ["美麗島", "中央公園", "三多商圈", "左營", "巨蛋", "凹子底", "鹽埕埔", "西子灣"],
+    "taoyuan": ["桃園高鐵站", "A8長庚醫院", "機場第一航廈", "中壢"],
+}
+MRT_LINES = ["板南", "淡水信義", "松山新店", "中和新蘆", "文湖", "環狀"]
+ROADS = [
+    "中山路", "中正路", "民生東路", "忠孝東路", "復興南路", "和平東路", "光復南路", "信義路",
+    "敦化南路", "羅斯福路", "師大路", "永康街", "文化路", "民族路", "建國路", "公園路",
+    "南京東路", "八德路", "長安東路", "民權東路", "成功路", "自由路", "五權路", "中華路",
+]
+ENGLISH_ROADS = [
+    "Zhongxiao E. Rd.", "Zhongshan N. Rd.", "Minsheng E. Rd.", "Heping E. Rd.", "Xinyi Rd.",
+]
+SECTIONS = ["一段", "二段", "三段", "四段", "五段"]
+BRANDS = ["路易莎咖啡", "Louisa Coffee", "cama café", "星巴克", "伯朗咖啡館", "85度C", "丹堤咖啡"]
+WORDS = [
+    "日光", "貓", "森林", "巷弄", "晴天", "小島", "慢活", "木", "白", "日常", "山", "島嶼",
+    "Brew", "Roast", "Slow", "Good", "Little", "Fika",
+]
+SUFFIXES = ["咖啡", "咖啡館", "Cafe", "Coffee", "珈琲", "咖啡廳", "咖啡工作室", "café"]
+HOURS = [
+    "", "", "07:00-22:00", "08:00~18:00", "週一至週五 08:00-18:00；週六日 10:00-20:00",
+    "12:00~02:00 週二公休", "11:00-19:00 (週一休)", "24小時", "不定休，請見粉專",
+]
+YES_NO = ["yes", "no", "maybe", ""]
+RATING_FIELDS = ("wifi", "seat", "quiet", "tasty", "cheap", "music")
+ZIP_CODES = {"taipei": ["100", "103", "104", "105", "106", "108", "110", "111", "112", "114"]}
+
+
+def _zipf_weights(n: int, s: float = 1.1) -> List[float]:
+    return [1 / (rank ** s) for rank in range(1, n + 1)]
+
+
+def _split(rows: int, cities: Sequence[str]) -> Dict[str, int]:
+    """Rows per city by CITY_WEIGHTS, largest remainder first; sums to `rows`."""
+    total = sum(CITY_WEIGHTS.get(c, 1.0) for c in cities)
+    shares = {c: rows * CITY_WEIGHTS.get(c, 1.0) / total for c in cities}
+    counts = {c: int(share) for c, share in shares.items()}
+    for c in sorted(cities, key=lambda c: counts[c] - shares[c])[: rows - sum(counts.values())]:
+        counts[c] += 1
+    return counts
+
+
+def _hotspots(city: str, rng: random.Random) -> List[Tuple[str, str, float, float, float]]:
+    """(station, town, lat, lng, spread in degrees), most popular first."""
+    lat0, lng0 = CITY_COORDS.get(city, (23.7, 121.0))
+    towns = CITY_DISTRICTS.get(city) or TOWNS.get(city) or [f"{CITY_NAMES.get(city, city)}市"]
+    stations = MRT_STATIONS.get(city) or [
+        f"{town[:-1] if len(town) > 2 else town}{kind}"
+        for town in towns
+        for kind in ("火車站", "轉運站")
+    ]
+    spread = 0.05 if CITY_WEIGHTS.get(city, 1.0) >= 5 else 0.025
+    spots = []
+    for i, station in enumerate(stations):
+        town = towns[i % len(towns)]
+        lat, lng = lat0 + rng.gauss(0, spread), lng0 + rng.gauss(0, spread)
+        spots.append((station, town, lat, lng, rng.uniform(0.002, 0.008)))
+    rng.shuffle(spots)
+    return spots
+
+
+def _address(city: str, town: str, rng: random.Random) -> str:
+    name = CITY_NAMES.get(city, city)
+    road = rng.choice(ROADS)
+    section = rng.choice(SECTIONS) if rng.random() < 0.4 else ""
+    number = f"{rng.randint(1, 400)}號"
+    lane = f"{rng.randint(1, 300)}巷" if rng.random() < 0.35 else ""
+    alley = f"{rng.randint(1, 40)}弄" if lane and rng.random() < 0.3 else ""
+    floor = rng.choice(["", "", "", "2樓", "1F", "B1", "之1"])
+    if rng.random() < 0.04:
+        # English-style address, no Chinese district.
+        section_no = f"Sec. {rng.randint(1, 5)}, " if section else ""
+        road = rng.choice(ENGLISH_ROADS)
+        return f"No. {rng.randint(1, 400)}, {section_no}{road}, {city.title()} City"
+    if city == "taipei" and town in CITY_DISTRICTS.get("newtaipei", []):
+        prefix = "新北市"
+    elif city == "taipei":
+        prefix = rng.choices(["台北市", "臺北市", ""], weights=[70, 20, 10])[0]
+    else:
+        prefix = f"{name}{'縣' if city in COUNTIES else '市'}"
+        if rng.random() < 0.15:
+            prefix = prefix.replace("台", "臺")
+    zip_code = rng.choice(ZIP_CODES.get(city, ["", ""])) if rng.random() < 0.2 else ""
+    return f"{zip_code}{prefix}{town}{road}{section}{lane}{alley}{number}{floor}"
+
+
+def _mrt(city: str, station: str, others: Sequence[str], rng: random.Random) -> str:
+    if city not in MRT_STATIONS:
+        return rng.choice(["", "", "", station, f"{station}旁", "無"])
+    kind = rng.random()
+    exit_no = rng.randint(1, 8)
+    if kind < 0.30:
+        return ""
+    if kind < 0.45:
+        return f"捷運{station}站"
+    if kind < 0.57:
+        return f"{station}站 {exit_no}號出口"
+    if kind < 0.67:
+        return f"捷運{station}站{exit_no}號出口步行{rng.randint(1, 12)}分鐘"
+    if kind < 0.74:
+        return f"{station} ({rng.choice(MRT_LINES)}線)"
+    if kind < 0.80:
+        return f"MRT {station} Station Exit {exit_no}"
+    if kind < 0.87:
+        return f"{station}站/{rng.choice(others)}站"
+    if kind < 0.92:
+        return f"捷運{station}站、{rng.choice(others)}站"
+    if kind < 0.96:
+        return f"{station}，約{rng.randint(3, 15)}分鐘"
+    return rng.choice(["無", "-", "捷運站附近", station])
+
+
+def _ratings(rng: random.Random) -> Dict[str, float]:
+    if rng.random() < 0.25:
+        return {field: 0 for field in RATING_FIELDS}
+    quality = min(5.0, max(1.0, rng.gauss(3.9, 0.6)))
+    votes = min(12, 1 + int(rng.expovariate(0.45)))
+    ratings = {}
+    for field in RATING_FIELDS:
+        total = sum(min(5, max(1, round(quality + rng.gauss(0, 0.8)))) for _ in range(votes))
+        ratings[field] = round(total / votes, 13)
+    return ratings
+
+
+def _name(town: str, rng: random.Random) -> str:
+    if rng.random() < 0.15:
+        return f"{rng.choice(BRANDS)} ({town.rstrip('區鄉鎮市')}{rng.choice(['', '二', '站前'])}門市)"
+    return f"{rng.choice(WORDS)}{rng.choice(WORDS)}{rng.choice(SUFFIXES)}"
+
+
+def generate_city(city: str, count: int, rng: random.Random) -> List[dict]:
+    spots = _hotspots(city, rng)
+    weights = _zipf_weights(len(spots))
+    stations = [spot[0] for spot in spots]
+    rows = []
+    for spot in rng.choices(spots, weights=weights, k=count):
+        station, town, lat, lng, spread = spot
+        if city == "taipei" and rng.random() < 0.2:
+            town = rng.choice(CITY_DISTRICTS["newtaipei"])
+        # Heavy tail: a few cafes well away from any hotspot.
+        scale = spread * (6 if rng.random() < 0.05 else 1)
+        latitude, longitude = f"{lat + rng.gauss(0, scale):.7f}", f"{lng + rng.gauss(0, scale):.7f}"
+        if rng.random() < 0.01:
+            latitude, longitude = rng.choice([("0", "0"), ("", "")])
+        item = {
+            "id": str(uuid.UUID(int=rng.getrandbits(128))),
+            "name": _name(town, rng),
+            "city": city,
+            "address": _address(city, town, rng),
+            "latitude": latitude,
+            "longitude": longitude,
+            "url": rng.choice(["", "", f"https://www.facebook.com/cafe{rng.randint(1, 10**6)}"]),
+            "mrt": _mrt(city, station, stations, rng),
+            "open_time": rng.choice(HOURS),
+            "limited_time": rng.choice(YES_NO),
+            "socket": rng.choice(YES_NO),
+            "standing_desk": rng.choice(YES_NO),
+        }
+        item.update(_ratings(rng))
+        rows.append(item)
+    return rows
+
+
+def generate(
+    rows: int, seed: int = 0, cities: Optional[Sequence[str]] = None
+) -> Dict[str, List[dict]]:
+    """Cafe Nomad API rows per city, `rows` in total."""
+    cities = list(cities or CITIES)
+    out = {}
+    for city, count in _split(rows, cities).items():
+        # Seeded per city, so adding a city does not reshuffle the others.
+        out[city] = generate_city(city, count, random.Random(f"{seed}:{city}:{count}"))
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--cities", help="comma-separated; default every city")
+    parser.add_argument("--out", help="write {city: [rows]} JSON here")
+    parser.add_argument(
+        "--import", dest="do_import", action="store_true", help="load through import_city"
+    )
+    args = parser.parse_args()
+
+    cities = args.cities.split(",") if args.cities else None
+    data = generate(args.rows, seed=args.seed, cities=cities)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        print(f"Wrote {args.rows} rows to {args.out}")
+    if args.do_import:
+        from app.database import Base, SessionLocal, engine
+        from scripts.import_cafenomad import import_city
+
+        Base.metadata.create_all(bind=engine)
+        db = SessionLocal()
+        total = sum(import_city(db, city, items) for city, items in data.items() if items)
+        db.close()
+        print(f"Imported {total} synthetic cafes.")
+
+
+if __name__ == "__main__":
+    main()
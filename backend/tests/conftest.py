@@ -0,0 +1,24 @@
+import os
+import tempfile
+
+# Keep app.database (imported at module level everywhere) off the real data dir.
+os.environ.setdefault("CAFEPICK_DATA_DIR", tempfile.mkdtemp(prefix="cafepick-tests-"))
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base
+from app.models import area, cafe, cafe_link, cafe_tombstone, recommendation, station  # noqa: F401
+
+
+@pytest.fixture
+def db(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    try:
+        yield session
+    finally:
+        session.close()
+        engine.dispose()
@@ -0,0 +1,114 @@
+import json
+import random
+
+from app.services import catalog_export
+from app.services.catalog_export import export_city
+from scripts.import_cafenomad import import_city
+from scripts.synthetic_cafes import generate_city
+
+
+def _export(db, city, since=None):
+    return json.loads(export_city(db, city, since).raw)
+
+
+def _apply(state, export):
+    """A client's id -> row map after applying `export`."""
+    rows = {} if export["full"] else dict(state)
+    for cafe_id in export["deleted"]:
+        rows.pop(cafe_id, None)
+    for row in export["cafes"]:
+        rows[row[0]] = row
+    return rows
+
+
+def test_since_delta_brings_a_client_up_to_date(db):
+    catalog_export._CACHE.clear()
+    rng = random.Random(6)
+    taipei = generate_city("taipei", 100, rng)
+    keelung = generate_city("keelung", 30, rng)
+    import_city(db, "taipei", taipei)
+    import_city(db, "keelung", keelung)
+    clients = {city: _export(db, city) for city in ("taipei", "keelung")}
+    assert clients["taipei"]["fields"][0] == "id"
+
+    # Edit, drop and add taipei cafes; one keelung cafe moves to taipei.
+    changed = [dict(item) for item in taipei[10:]]
+    for item in changed[:15]:
+        item["wifi"] = 5
+    changed += generate_city("taipei", 5, rng)
+    moved = dict(keelung[0], city="taipei")
+    import_city(db, "taipei", changed + [moved])
+    import_city(db, "keelung", keelung[1:])
+
+    for city, before in clients.items():
+        delta = _export(db, city, since=before["version"])
+        assert not delta["full"] and delta["version"] > before["version"]
+        assert len(delta["cafes"]) < len(_export(db, city)["cafes"])
+        caught_up = _apply({row[0]: row for row in before["cafes"]}, delta)
+        assert caught_up == {row[0]: row for row in _export(db, city)["cafes"]}
+
+    taipei_delta = _export(db, "taipei", since=clients["taipei"]["version"])
+    assert len(taipei_delta["deleted"]) == 10
+    assert moved["id"] in _export(db, "keelung", since=clients["keelung"]["version"])["deleted"]
+    # An unknown or future version falls back to a full export.
+    assert _export(db, "taipei", since=10**6)["full"]
+
+
+def _versions(db):
+    return {city: _export(db, city)["version"] for city in ("taipei", "keelung")}
+
+
+def _check_versions(db, history):
+    now = _versions(db)
+    for city, version in now.items():
+        assert version >= history[-1][city], (city, history, now)
+    history.append(now)
+
+
+def test_move_then_delete_keeps_every_city_deletion(db):
+    catalog_export._CACHE.clear()
+    rng = random.Random(7)
+    taipei = generate_city("taipei", 20, rng)
+    keelung = generate_city("keelung", 10, rng)
+    import_city(db, "taipei", taipei)
+    import_city(db, "keelung", keelung)
+    synced = _export(db, "keelung")
+    history = [_versions(db)]
+
+    # keelung -> taipei, then deleted from taipei.
+    moved = dict(keelung[0], city="taipei")
+    import_city(db, "taipei", taipei + [moved])
+    import_city(db, "keelung", keelung[1:])
+    _check_versions(db, history)
+    import_city(db, "taipei", taipei)
+    _check_versions(db, history)
+
+    delta = _export(db, "keelung", since=synced["version"])
+    assert moved["id"] in delta["deleted"]
+    assert moved["id"] not in {row[0] for row in _export(db, "keelung")["cafes"]}
+    assert moved["id"] in _export(db, "taipei", since=history[1]["taipei"])["deleted"]
+
+
+def test_return_to_a_city_keeps_the_tombstone_of_the_city_it_left(db):
+    catalog_export._CACHE.clear()
+    rng = random.Random(8)
+    taipei = generate_city("taipei", 20, rng)
+    keelung = generate_city("keelung", 10, rng)
+    import_city(db, "taipei", taipei)
+    import_city(db, "keelung", keelung)
+    history = [_versions(db)]
+
+    # Deleted from taipei, reappears in keelung, then moves back to taipei.
+    returning = taipei[0]
+    import_city(db, "taipei", taipei[1:])
+    import_city(db, "keelung", keelung + [dict(returning, city="keelung")])
+    _check_versions(db, history)
+    synced = _export(db, "keelung")
+    import_city(db, "taipei", taipei)
+    import_city(db, "keelung", keelung)
+    _check_versions(db, history)
+
+    assert returning["id"] in _export(db, "keelung", since=synced["version"])["deleted"]
+    taipei_now = _export(db, "taipei")
+    assert returning["id"] in {row[0] for row in taipei_now["cafes"]}
+    assert returning["id"] not in _export(db, "taipei", since=history[1]["taipei"])["deleted"]
@@ -0,0 +1,29 @@
+from unittest import mock
+
+from sqlalchemy.orm import sessionmaker
+
+from app.models.cafe_link import CafeLink
+from app.services import entity_match
+from app.services.entity_match import MatchIndex, attach_local
+
+CAFE = {"id": "nomad-1", "name": "好咖啡 大安店", "latitude": 25.0330, "longitude": 121.5430}
+
+
+def _attach(db, places):
+    factory = sessionmaker(autocommit=False, autoflush=False, bind=db.get_bind())
+    with mock.patch.object(entity_match, "SessionLocal", factory), mock.patch.object(
+        entity_match, "_match_index", return_value=MatchIndex([CAFE])
+    ):
+        return attach_local("taipei", places)
+
+
+def test_attach_local_keeps_links_one_to_one(db):
+    first = {"id": "place-a", "name": "好咖啡 大安店", "latitude": 25.0331, "longitude": 121.5431}
+    second = {"id": "place-b", "name": "好咖啡大安", "latitude": 25.0332, "longitude": 121.5429}
+
+    assert _attach(db, [first])[0]["local"]["cafenomad_id"] == "nomad-1"
+    # A later request must not link the same cafe to another place.
+    assert "local" not in _attach(db, [second])[0]
+    assert [link.place_id for link in db.query(CafeLink)] == ["place-a"]
+    # The stored link is still reused for the original place.
+    assert _attach(db, [second, first])[1]["local"]["cafenomad_id"] == "nomad-1"
@@ -0,0 +1,28 @@
+from unittest import mock
+
+from app.services import google_places
+from app.services.snapshot import CitySnapshot
+
+CAFES = [
+    {"id": "near-1", "name": "路易莎咖啡 市府店", "latitude": 25.0405, "longitude": 121.5650},
+    {"id": "near-2", "name": "好咖啡", "latitude": 25.0410, "longitude": 121.5660},
+    {"id": "far-1", "name": "路易莎咖啡 淡水店", "latitude": 25.1700, "longitude": 121.4400},
+    {"id": "far-2", "name": "路易莎咖啡 板橋店", "latitude": 25.0140, "longitude": 121.4630},
+]
+
+
+def _local(*args, **kwargs):
+    snap = CitySnapshot("taipei", CAFES)
+    manager = mock.Mock(is_loaded=lambda city: True)
+    with mock.patch.object(google_places.shards, "get_manager", return_value=manager), \
+            mock.patch.object(google_places.shards, "get_snapshot", return_value=snap):
+        return [cafe["id"] for cafe in google_places._local_cafes("taipei", *args, **kwargs)]
+
+
+def test_local_keyword_search_around_a_point_stays_near_it():
+    assert _local("路易莎", 25.0400, 121.5650, limit=5) == ["near-1"]
+    assert _local(None, 25.0400, 121.5650, limit=2) == ["near-1", "near-2"]
+
+
+def test_local_keyword_search_without_a_point_covers_the_city():
+    assert set(_local("路易莎", limit=5)) == {"near-1", "far-1", "far-2"}
@@ -0,0 +1,100 @@
+from datetime import datetime
+
+import pytest
+
+from app.services.hours import parse_open_time, slot_of
+
+DAYS = ["週一", "週二", "週三", "週四", "週五", "週六", "週日"]
+
+
+def _is_open(mask, day, hhmm):
+    # 2025-03-03 is a Monday.
+    hour, minute = map(int, hhmm.split(":"))
+    return bool((mask >> slot_of(datetime(2025, 3, 3 + DAYS.index(day), hour, minute))) & 1)
+
+
+@pytest.mark.parametrize(
+    "text, open_at, closed_at",
+    [
+        ("07:00-22:00", [("週一", "07:00"), ("週日", "21:45")], [("週三", "22:00")]),
+        (
+            "週一至週五 08:00-18:00；週六日 10:00-20:00",
+            [("週五", "08:30"), ("週六", "19:00")],
+            [("週六", "09:00"), ("週一", "19:00")],
+        ),
+        (
+            "週一至週五 08:00-18:00, 週六日 10:00-20:00",
+            [("週一", "08:00"), ("週日", "19:45")],
+            [("週六", "08:30"), ("週三", "19:00")],
+        ),
+        (
+            "週一至週五 08:00-18:00，週六日 10:00-20:00",
+            [("週二", "17:00"), ("週六", "10:00")],
+            [("週日", "09:00"), ("週二", "18:30")],
+        ),
+        (
+            "11:30-21:00(週一至週四), 11:30-22:00(週五至週日)",
+            [("週四", "20:45"), ("週五", "21:30")],
+            [("週四", "21:30"), ("週一", "11:00")],
+        ),
+        (
+            "平日 09:00-18:00 假日 10:00-20:00",
+            [("週一", "09:00"), ("週六", "19:00")],
+            [("週日", "09:30"), ("週五", "19:00")],
+        ),
+        (
+            "週二至週日 11:00-14:00 17:00-21:00",
+            [("週二", "12:00"), ("週日", "18:00")],
+            [("週三", "15:00"), ("週一", "12:00")],
+        ),
+        (
+            "12:00~02:00 週二公休",
+            [("週一", "23:00"), ("週二", "01:30"), ("週三", "12:00")],
+            [("週二", "13:00"), ("週三", "01:00")],
+        ),
+        (
+            "公休：週一 週二至週日 10:00-18:00",
+            [("週二", "10:00")],
+            [("週一", "12:00")],
+        ),
+        (
+            "08:00-20:00；週日 10:00-18:00",
+            [("週六", "08:00"), ("週日", "17:00")],
+            [("週日", "09:00"), ("週日", "19:00")],
+        ),
+        (
+            "9:00-18:00 (週一休)",
+            [("週二", "09:00"), ("週日", "17:45")],
+            [("週一", "10:00"), ("週二", "18:00")],
+        ),
+        (
+            "週二至週日 10:00-20:00 週一休",
+            [("週二", "10:00"), ("週日", "19:00")],
+            [("週一", "12:00")],
+        ),
+        ("24小時", [("週三", "03:00"), ("週日", "23:45")], []),
+    ],
+)
+def test_parse_open_time(text, open_at, closed_at):
+    mask = parse_open_time(text)
+    assert mask is not None
+    for day, hhmm in open_at:
+        assert _is_open(mask, day, hhmm), (day, hhmm)
+    for day, hhmm in closed_at:
+        assert not _is_open(mask, day, hhmm), (day, hhmm)
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        None,
+        "",
+        "不定時",
+        "週一至週五",
+        # Which days do the middle hours belong to?
+        "週一至週三 10:00-18:00 12:00-20:00 週四至週日",
+        "週一 週二 10:00-18:00 週三",
+    ],
+)
+def test_parse_open_time_unparseable_or_ambiguous(text):
+    assert parse_open_time(text) is None
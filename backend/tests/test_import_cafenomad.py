@@ -0,0 +1,51 @@
+import random
+
+from app.models.cafe import Cafe
+from app.services.area_summary import CitySummary, load_summary
+from scripts.import_cafenomad import import_city
+from scripts.synthetic_cafes import generate_city
+
+
+def _summary_state(summary):
+    return {
+        district: (scope.count, dict(scope.mrts), scope.attribute_counts())
+        for district, scope in summary.scopes.items()
+        if scope.count
+    }
+
+
+def _assert_summaries_match_rows(db, *cities):
+    for city in cities:
+        rows = db.query(Cafe).filter(Cafe.city == city).all()
+        assert _summary_state(load_summary(db, city)) == _summary_state(
+            CitySummary.build(city, rows)
+        )
+
+
+def test_summary_diff_tracks_changes_and_removals(db):
+    rng = random.Random(1)
+    items = generate_city("taipei", 200, rng)
+    import_city(db, "taipei", items)
+    _assert_summaries_match_rows(db, "taipei")
+
+    changed = [dict(item) for item in items[20:]]
+    for item in changed[:50]:
+        item["quiet"] = 5 - float(item.get("quiet") or 0)
+        item["mrt"] = "捷運忠孝復興站"
+    import_city(db, "taipei", changed)
+    _assert_summaries_match_rows(db, "taipei")
+    assert load_summary(db, "taipei").cafe_count == 180
+
+
+def test_cafe_moving_city_leaves_its_old_summary(db):
+    taipei = generate_city("taipei", 30, random.Random(2))
+    keelung = generate_city("keelung", 10, random.Random(3))
+    import_city(db, "taipei", taipei)
+    import_city(db, "keelung", keelung)
+
+    moved = dict(taipei[0], city="keelung")
+    import_city(db, "keelung", keelung + [moved])
+    assert db.get(Cafe, moved["id"]).city == "keelung"
+    assert load_summary(db, "keelung").cafe_count == 11
+    assert load_summary(db, "taipei").cafe_count == 29
+    _assert_summaries_match_rows(db, "taipei", "keelung")
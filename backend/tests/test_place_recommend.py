@@ -0,0 +1,51 @@
+import random
+import time
+from unittest import mock
+
+from app.services import place_recommend
+
+
+def test_planned_search_uses_district_when_no_query():
+    with mock.patch.object(place_recommend, "find_near", return_value=[]) as find_near, \
+            mock.patch.object(place_recommend, "attach_local", side_effect=lambda city, p: p):
+        place_recommend.search_candidates(
+            "taipei", "大安區", None, 25.04, 121.54, 5, transit_name="忠孝復興", max_walk_minutes=8
+        )
+        place_recommend.recommend_batch(
+            [
+                {
+                    "id": "a",
+                    "city": "taipei",
+                    "district": "信義區",
+                    "transit_lat": 25.03,
+                    "transit_lng": 121.56,
+                    "transit_name": "市政府",
+                    "max_walk_minutes": 8,
+                    "top_n": 5,
+                }
+            ]
+        )
+    assert [call.args[1] for call in find_near.call_args_list] == ["大安區", "信義區"]
+
+
+def test_stream_yields_the_same_entries_as_recommend():
+    rng = random.Random(0)
+    for _ in range(20):
+        n = rng.randint(1, 15)
+        top_n = rng.randint(1, 10)
+        keep = {i: rng.random() < 0.6 for i in range(n)}
+        delays = {i: rng.random() * 0.005 for i in range(n)}
+
+        def fake_enrich(cafe, *args):
+            time.sleep(delays[cafe["id"]])
+            return {"cafe": cafe, "score": None, "distance_km": None} if keep[cafe["id"]] else None
+
+        cafes = [{"id": i} for i in range(n)]
+        with mock.patch.object(place_recommend, "enrich", side_effect=fake_enrich):
+            entries = place_recommend.recommend(cafes, None, None, None, None, top_n)
+            expected = [e["cafe"]["id"] for e in entries]
+            streamed = [
+                e["rank"]
+                for e in place_recommend.stream_recommendations(cafes, None, None, None, None, top_n)
+            ]
+        assert sorted(streamed) == expected
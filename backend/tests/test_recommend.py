@@ -0,0 +1,92 @@
+import random
+import time
+
+from sqlalchemy.orm import sessionmaker
+
+from app.models.cafe import Cafe
+from app.models.station import Station
+from app.services.recommend import invalidate_index, recommend_cafes, recommend_cafes_sql
+from app.services.stations import refresh_nearest_stations
+from scripts.import_cafenomad import import_city
+from scripts.synthetic_cafes import generate_city
+
+CITIES = ("taipei", "keelung")
+
+
+def _load(db, rng):
+    for city, count in zip(CITIES, (400, 120)):
+        import_city(db, city, generate_city(city, count, rng))
+    for i, cafe in enumerate(db.query(Cafe).limit(40)):
+        db.add(
+            Station(
+                id=f"st-{i}",
+                name=f"站{i}",
+                city=cafe.city,
+                latitude=cafe.latitude + rng.gauss(0, 0.005),
+                longitude=cafe.longitude + rng.gauss(0, 0.005),
+                active=True,
+                updated_at=time.time(),
+            )
+        )
+    db.commit()
+    refresh_nearest_stations(db)
+    for city in (*CITIES, None):
+        invalidate_index(city)
+
+
+def _random_filters(cafes, rng):
+    sample = rng.choice(cafes)
+    filters = {"city": rng.choice([sample.city, sample.city, None])}
+    for key in ("wifi", "socket", "quiet", "cheap"):
+        if rng.random() < 0.5:
+            filters[key] = rng.choice([1, 3, 4, 5])
+    if rng.random() < 0.3:
+        filters["district"] = sample.district
+    if rng.random() < 0.2 and sample.mrt:
+        filters["mrt"] = sample.mrt[: rng.randint(1, len(sample.mrt))]
+    if rng.random() < 0.3:
+        filters["limited_time"] = "no"
+    if rng.random() < 0.3:
+        filters["max_walk_minutes"] = rng.choice([3, 5, 10, 20])
+    if rng.random() < 0.5:
+        filters["latitude"] = sample.latitude + rng.gauss(0, 0.02)
+        filters["longitude"] = sample.longitude + rng.gauss(0, 0.02)
+    return filters
+
+
+def _ranked(entries):
+    return [(entry["cafe"]["id"], entry["score"], entry["distance_km"]) for entry in entries]
+
+
+def test_threshold_recommend_matches_sql(db):
+    rng = random.Random(5)
+    _load(db, rng)
+    cafes = db.query(Cafe).all()
+    for _ in range(200):
+        filters = _random_filters(cafes, rng)
+        top_n = rng.choice([1, 3, 5, 10, 50])
+        assert _ranked(recommend_cafes(db, filters, top_n)) == _ranked(
+            recommend_cafes_sql(db, filters, top_n)
+        ), filters
+
+
+def test_index_follows_imports_from_another_session(db):
+    rng = random.Random(9)
+    items = generate_city("taipei", 200, rng)
+    import_city(db, "taipei", items)
+    invalidate_index("taipei")
+    filters = {"city": "taipei", "wifi": 4, "quiet": 3}
+    recommend_cafes(db, filters, 10)
+
+    # Another process drops the current top results and rescores the rest.
+    top = {entry["cafe"]["id"] for entry in recommend_cafes_sql(db, filters, 10)}
+    remaining = [dict(item, wifi=rng.choice([1, 5])) for item in items if item["id"] not in top]
+    other = sessionmaker(autocommit=False, autoflush=False, bind=db.get_bind())()
+    try:
+        import_city(other, "taipei", remaining)
+    finally:
+        other.close()
+
+    assert _ranked(recommend_cafes(db, filters, 10)) == _ranked(
+        recommend_cafes_sql(db, filters, 10)
+    )
@@ -0,0 +1,48 @@
+import gzip
+
+import pytest
+from starlette.requests import Request
+
+from app.services import serialize
+from app.services.serialize import EncodedBody, encoded_response
+
+BODY = EncodedBody(serialize.dumps({"cafes": ["x" * 40] * 100}))
+
+
+def _request(**headers):
+    raw = [(name.replace("_", "-").encode(), value.encode()) for name, value in headers.items()]
+    return Request({"type": "http", "method": "GET", "headers": raw})
+
+
+@pytest.mark.parametrize(
+    "accept, encoding",
+    [
+        ("", None),
+        ("gzip", "gzip"),
+        ("gzip, deflate", "gzip"),
+        ("gzip;q=0", None),
+        ("gzip;q=0, *;q=0.5", None),
+        ("identity", None),
+        ("*", "br" if serialize.brotli else "gzip"),
+        ("br;q=0, gzip;q=0.8", "gzip"),
+        ("br", "br" if serialize.brotli else None),
+    ],
+)
+def test_encoding_follows_q_values(accept, encoding):
+    response = encoded_response(BODY, _request(accept_encoding=accept))
+    assert response.headers.get("content-encoding") == encoding
+    if encoding == "gzip":
+        assert gzip.decompress(response.body) == BODY.raw
+
+
+def test_each_encoding_has_its_own_etag():
+    plain = encoded_response(BODY, _request()).headers["etag"]
+    zipped = encoded_response(BODY, _request(accept_encoding="gzip")).headers["etag"]
+    assert plain == BODY.etag and zipped != plain and zipped.endswith('-gzip"')
+
+    revalidated = encoded_response(
+        BODY, _request(accept_encoding="gzip", if_none_match=f'W/{zipped}, "other"')
+    )
+    assert revalidated.status_code == 304
+    # A tag for another encoding does not validate this representation.
+    assert encoded_response(BODY, _request(if_none_match=zipped)).status_code == 200
@@ -0,0 +1,72 @@
+import random
+import time
+from unittest import mock
+
+import pytest
+
+from app.services import cafenomad, shards
+from scripts.synthetic_cafes import generate_city
+
+
+def test_evicted_city_reloads_without_cafe_nomad():
+    items = generate_city("keelung", 50, random.Random(4))
+    cafenomad._CACHE["keelung"] = {
+        "ts": time.time(),
+        "data": [cafenomad.CafeRecord.from_item(item, "keelung") for item in items],
+    }
+    manager = shards.ShardManager(cap_bytes=1 << 30, pinned=())
+    try:
+        before = [cafe.to_dict() for cafe in manager.get("keelung").cafes]
+        manager._evict(manager._shards["keelung"])
+        assert not manager.is_loaded("keelung") and "keelung" not in cafenomad._CACHE
+
+        with mock.patch.object(cafenomad.httpx, "get", side_effect=AssertionError("fetched")):
+            after = [cafe.to_dict() for cafe in manager.get("keelung").cafes]
+        assert after == before
+        assert cafenomad.parked_bytes() == 0
+    finally:
+        cafenomad._CACHE.pop("keelung", None)
+        cafenomad._PARKED.pop("keelung", None)
+
+
+def _load(city, n, ts):
+    items = generate_city(city, n, random.Random(n))
+    cafenomad._CACHE[city] = {
+        "ts": ts,
+        "data": [cafenomad.CafeRecord.from_item(item, city) for item in items],
+    }
+
+
+def test_parked_copy_older_than_a_ttl_is_refetched():
+    _load("keelung", 50, time.time() - cafenomad._CACHE_TTL_SECONDS - 1)
+    cafenomad.evict("keelung")
+    manager = shards.ShardManager(cap_bytes=1 << 30, pinned=())
+    try:
+        assert cafenomad.parked_bytes() == 0
+        with mock.patch.object(cafenomad.httpx, "get", side_effect=AssertionError("fetched")):
+            with pytest.raises(AssertionError, match="fetched"):
+                manager.get("keelung")
+    finally:
+        cafenomad._CACHE.pop("keelung", None)
+        cafenomad._PARKED.pop("keelung", None)
+
+
+def test_parked_copies_count_toward_the_memory_cap():
+    now = time.time()
+    cities = ["keelung", "hsinchu", "yilan"]
+    for offset, city in enumerate(cities):
+        _load(city, 200, now - 10 + offset)
+        cafenomad.evict(city)
+    _load("taichung", 50, now)
+    manager = shards.ShardManager(cap_bytes=1 << 30, pinned=())
+    try:
+        manager.get("taichung")
+        manager.cap_bytes = manager._shards["taichung"].nbytes + len(cafenomad._PARKED["yilan"][1])
+        manager._enforce_cap(keep="taichung")
+        # The oldest copies go first, until live shards and copies fit the cap.
+        assert sorted(cafenomad._PARKED) == ["yilan"]
+        assert manager.is_loaded("taichung")
+    finally:
+        for city in cities + ["taichung"]:
+            cafenomad._CACHE.pop(city, None)
+            cafenomad._PARKED.pop(city, None)
@@ -0,0 +1,110 @@
+import time
+from unittest import mock
+
+from app.models.cafe import Cafe
+from app.models.station import Station
+from app.services.stations import refresh_nearest_stations
+from scripts import import_stations
+
+
+def _fields(name, lat, lng):
+    return {"name": name, "latitude": lat, "longitude": lng}
+
+
+def _sweep(db, results):
+    """Run an import over {city: found} the way import_stations.main does."""
+    seen, swept = set(), []
+    with mock.patch.object(import_stations, "fetch_stations", side_effect=results.get):
+        for city in results:
+            if import_stations.import_city(db, city, seen) is not None:
+                swept.append(city)
+    return import_stations.deactivate_missing(db, swept, seen)
+
+
+def test_overlapping_sweeps_upsert_by_id(db):
+    shared = _fields("Shared", 25.03, 121.50)
+    _sweep(db, {"taipei": {"s1": shared}})
+    _sweep(db, {"taipei": {"s1": shared}, "newtaipei": {"s1": shared, "s2": _fields("B", 25.0, 121.4)}})
+
+    rows = {s.id: s for s in db.query(Station)}
+    assert set(rows) == {"s1", "s2"}
+    assert rows["s1"].city == "taipei"
+    assert rows["s2"].city == "newtaipei"
+
+
+def test_station_found_only_by_neighbour_sweep_stays_active(db):
+    _sweep(db, {"taipei": {"s1": _fields("Shared", 25.03, 121.50)}})
+    _sweep(db, {"taipei": {}, "newtaipei": {"s1": _fields("Shared", 25.03, 121.50)}})
+    assert db.get(Station, "s1").active
+
+    _sweep(db, {"taipei": {}, "newtaipei": {}})
+    assert not db.get(Station, "s1").active
+
+
+def test_failed_sweep_deactivates_nothing(db):
+    _sweep(db, {"taipei": {"s1": _fields("A", 25.03, 121.50)}})
+
+    def fail(city):
+        raise RuntimeError("quota")
+
+    with mock.patch.object(import_stations, "fetch_stations", side_effect=fail):
+        assert import_stations.import_city(db, "taipei", set()) is None
+    assert db.get(Station, "s1").active
+
+
+def _station(db, station_id, lat, lng):
+    row = db.get(Station, station_id)
+    if row is None:
+        row = Station(id=station_id, name=station_id, city="taipei", active=True)
+        db.add(row)
+    row.latitude, row.longitude = lat, lng
+    row.updated_at = time.time()
+    db.commit()
+
+
+def _nearest(db, cafe_id):
+    cafe = db.get(Cafe, cafe_id)
+    db.refresh(cafe)
+    return cafe.nearest_station_id, round(cafe.nearest_station_km, 3)
+
+
+def test_incremental_refresh_matches_full(db):
+    for i in range(5):
+        _station(db, f"S{i}", 25.0400 + 0.002 * i, 121.5000 + 0.002 * i)
+    _station(db, "far", 25.1000, 121.6000)
+    db.add(Cafe(id="c1", name="c1", city="taipei", latitude=25.0401, longitude=121.5001))
+    db.add(Cafe(id="c2", name="c2", city="taipei", latitude=25.0990, longitude=121.5990))
+    db.commit()
+    assert refresh_nearest_stations(db) == 2
+    assert _nearest(db, "c1")[0] == "S0"
+
+    # The cafe's own nearest station moves away, outside its neighbour radius.
+    time.sleep(0.01)
+    _station(db, "S0", 25.2000, 121.8000)
+    refresh_nearest_stations(db)
+    incremental = {cafe_id: _nearest(db, cafe_id) for cafe_id in ("c1", "c2")}
+    assert incremental["c1"][0] == "S1"
+
+    refresh_nearest_stations(db, full=True)
+    assert incremental == {cafe_id: _nearest(db, cafe_id) for cafe_id in ("c1", "c2")}
+
+
+def test_incremental_refresh_picks_up_new_and_removed_stations(db):
+    _station(db, "S0", 25.0400, 121.5000)
+    _station(db, "S1", 25.0600, 121.5200)
+    db.add(Cafe(id="c1", name="c1", city="taipei", latitude=25.0450, longitude=121.5050))
+    db.commit()
+    refresh_nearest_stations(db)
+
+    time.sleep(0.01)
+    _station(db, "S2", 25.0451, 121.5051)
+    refresh_nearest_stations(db)
+    assert _nearest(db, "c1")[0] == "S2"
+
+    time.sleep(0.01)
+    row = db.get(Station, "S2")
+    row.active = False
+    row.updated_at = time.time()
+    db.commit()
+    refresh_nearest_stations(db)
+    assert _nearest(db, "c1")[0] == "S0"
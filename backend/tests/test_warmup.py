@@ -0,0 +1,22 @@
+from unittest import mock
+
+from app.services import warmup
+from app.services.catchments import CatchmentIndex
+from app.services.stations import StationIndex
+
+
+def test_station_warmup_calls_places_only_without_a_catchment():
+    catchments = CatchmentIndex(
+        StationIndex([{"id": "local", "name": "Local", "latitude": 25.04, "longitude": 121.51}])
+    )
+    catchments.add_cafe("c1", 25.041, 121.511)
+    points = [
+        {"id": "local", "latitude": 25.04, "longitude": 121.51},
+        {"id": "remote", "latitude": 24.5, "longitude": 121.0},
+    ]
+    with mock.patch.object(warmup, "get_catchments", return_value=catchments), mock.patch.object(
+        warmup, "search_transit_points", return_value=points
+    ), mock.patch.object(warmup, "has_cafes_near_transit", return_value=False) as places:
+        warmup._warm_stations("taipei")
+    assert [call.kwargs["transit_lat"] for call in places.call_args_list] == [24.5]
+
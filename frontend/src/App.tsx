@@ -1,8 +1,8 @@
-import { useState, useEffect } from "react";
+import { useState, useEffect, useRef } from "react";
 import { GoogleMap } from "@/components/GoogleMap";
 import { FilterPanel } from "@/components/FilterPanel";
 import { PlaceCard } from "@/components/PlaceCard";
-import { getRecommendations, getAreas, getArea, getTransitPoints } from "@/services/api";
+import { streamRecommendations, getAreas, getArea, getTransitPoints } from "@/services/api";
 import type { Filters, Area } from "@/types/cafe";
 import type { PlaceRecommendation, Place } from "@/types/place";
 
@@ -35,6 +35,8 @@ function App() {
   const [loading, setLoading] = useState(false);
   const [highlightedId, setHighlightedId] = useState<string | null>(null);
   const [hasSearched, setHasSearched] = useState(false);
+  // The in-flight recommendation stream; a new search aborts it.
+  const searchRef = useRef<AbortController | null>(null);
 
   useEffect(() => {
     getAreas()
@@ -76,12 +78,23 @@ function App() {
   }, [filters.city, filters.district]);
 
   const handleSearch = async (overrideTransit?: Place) => {
+    searchRef.current?.abort();
+    const controller = new AbortController();
+    searchRef.current = controller;
     setLoading(true);
     setHasSearched(true);
     try {
       const transit =
         overrideTransit ?? transitPoints.find((p) => p.id === selectedTransitId);
-      const results = await getRecommendations(
+      setRecommendations([]);
+      const results = await streamRecommendations(
+        (item) => {
+          if (controller.signal.aborted) return;
+          setLoading(false);
+          setRecommendations((prev) =>
+            [...prev, item].sort((a, b) => (a.rank ?? 0) - (b.rank ?? 0))
+          );
+        },
         filters.city,
         filters.district,
         filters.keyword,
@@ -89,13 +102,14 @@ function App() {
         transit
           ? { name: transit.name, latitude: transit.latitude, longitude: transit.longitude }
           : undefined,
-        10
+        10,
+        controller.signal
       );
-      setRecommendations(results);
+      if (!controller.signal.aborted) setRecommendations(results);
     } catch (err) {
-      console.error("Failed to fetch recommendations:", err);
+      if (!controller.signal.aborted) console.error("Failed to fetch recommendations:", err);
     } finally {
-      setLoading(false);
+      if (searchRef.current === controller) setLoading(false);
     }
   };
 
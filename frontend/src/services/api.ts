@@ -1,4 +1,4 @@
-import type { Area } from "@/types/cafe";
+import type { Area, Cafe, CafeSnapshotPayload, CafeTile } from "@/types/cafe";
 import type { PlaceRecommendation, Place } from "@/types/place";
 
 const API_BASE = import.meta.env.VITE_API_URL || "http://localhost:8000";
@@ -9,7 +9,7 @@ async function fetchJSON<T>(url: string): Promise<T> {
   return res.json();
 }
 
-export async function getRecommendations(
+function recommendationParams(
   city: string,
   district?: string,
   keyword?: string,
@@ -28,13 +28,195 @@ export async function getRecommendations(
   }
   if (maxWalkMinutes) params.set("max_walk_minutes", String(maxWalkMinutes));
   params.set("top_n", String(topN));
+  return params;
+}
 
+export async function getRecommendations(
+  city: string,
+  district?: string,
+  keyword?: string,
+  topN = 5,
+  transit?: { name: string; latitude: number; longitude: number },
+  maxWalkMinutes?: number
+) {
+  const params = recommendationParams(city, district, keyword, topN, transit, maxWalkMinutes);
   const data = await fetchJSON<{ recommendations: PlaceRecommendation[] }>(
     `${API_BASE}/api/cafes/recommend?${params}`
   );
   return data.recommendations;
 }
 
+/**
+ * Streams recommendations as NDJSON, calling onItem as each cafe arrives.
+ * Resolves with all items ordered by their search rank.
+ */
+export async function streamRecommendations(
+  onItem: (item: PlaceRecommendation) => void,
+  city: string,
+  district?: string,
+  keyword?: string,
+  topN = 5,
+  transit?: { name: string; latitude: number; longitude: number },
+  maxWalkMinutes?: number,
+  signal?: AbortSignal
+) {
+  const params = recommendationParams(city, district, keyword, topN, transit, maxWalkMinutes);
+  const res = await fetch(`${API_BASE}/api/cafes/recommend/stream?${params}`, { signal });
+  if (!res.ok || !res.body) throw new Error(`API error: ${res.status}`);
+
+  const items: PlaceRecommendation[] = [];
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+  const flush = (line: string) => {
+    if (!line.trim()) return;
+    const item = JSON.parse(line) as PlaceRecommendation;
+    items.push(item);
+    onItem(item);
+  };
+  for (;;) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    const lines = buffer.split("\n");
+    buffer = lines.pop() ?? "";
+    lines.forEach(flush);
+  }
+  flush(buffer + decoder.decode());
+  return items.sort((a, b) => (a.rank ?? 0) - (b.rank ?? 0));
+}
+
+export interface RecommendSpec {
+  id?: string;
+  city: string;
+  district?: string;
+  query?: string;
+  transit_lat?: number;
+  transit_lng?: number;
+  transit_name?: string;
+  max_walk_minutes?: number;
+  top_n?: number;
+}
+
+/** Recommendations for several locations in one call, keyed by spec id (or index). */
+export async function getBatchRecommendations(specs: RecommendSpec[]) {
+  const res = await fetch(`${API_BASE}/api/cafes/recommend/batch`, {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({ specs }),
+  });
+  if (!res.ok) throw new Error(`API error: ${res.status}`);
+  const data: {
+    results: Record<string, { recommendations: PlaceRecommendation[]; error?: string }>;
+  } = await res.json();
+  return data.results;
+}
+
+/** Fuzzy name search over the Cafe Nomad catalog; prefix=true for autocomplete. */
+export async function searchCafes(q: string, city?: string, prefix = false, limit = 10) {
+  const params = new URLSearchParams({ q, limit: String(limit) });
+  if (city) params.set("city", city);
+  if (prefix) params.set("prefix", "true");
+  const data = await fetchJSON<{ query: string; results: { score: number; cafe: Cafe }[] }>(
+    `${API_BASE}/api/cafes/search?${params}`
+  );
+  return data.results;
+}
+
+const MAX_TILE_ZOOM = 22;
+
+/** Web Mercator tiles (as in map tile URLs) covering a lat/lng box at a zoom level. */
+export function tilesForBounds(
+  south: number,
+  west: number,
+  north: number,
+  east: number,
+  zoom: number
+) {
+  const z = Math.max(0, Math.min(MAX_TILE_ZOOM, Math.floor(zoom)));
+  const n = 2 ** z;
+  const clamp = (v: number) => Math.max(0, Math.min(n - 1, Math.floor(v)));
+  const tileX = (lng: number) => clamp(((lng + 180) / 360) * n);
+  const tileY = (lat: number) => {
+    const s = Math.sin((lat * Math.PI) / 180);
+    return clamp((0.5 - Math.log((1 + s) / (1 - s)) / (4 * Math.PI)) * n);
+  };
+  const tiles: { z: number; x: number; y: number }[] = [];
+  for (let x = tileX(west); x <= tileX(east); x++) {
+    for (let y = tileY(north); y <= tileY(south); y++) tiles.push({ z, x, y });
+  }
+  return tiles;
+}
+
+// Tiles only change when the catalog does; panning back reuses them.
+const tileCache = new Map<string, Promise<CafeTile>>();
+
+export function getCafeTile(city: string, z: number, x: number, y: number) {
+  const url = `${API_BASE}/api/cafes/tiles/${z}/${x}/${y}?city=${encodeURIComponent(city)}`;
+  let tile = tileCache.get(url);
+  if (!tile) {
+    tile = fetchJSON<CafeTile>(url);
+    tile.catch(() => tileCache.delete(url));
+    tileCache.set(url, tile);
+  }
+  return tile;
+}
+
+/** Clusters and cafes for the visible map area, one cached request per tile. */
+export async function getCafeTiles(
+  city: string,
+  bounds: { south: number; west: number; north: number; east: number },
+  zoom: number
+) {
+  const tiles = tilesForBounds(bounds.south, bounds.west, bounds.north, bounds.east, zoom);
+  return Promise.all(tiles.map(({ z, x, y }) => getCafeTile(city, z, x, y)));
+}
+
+const SNAPSHOT_STORAGE_PREFIX = "cafepick:snapshot:";
+const snapshots = new Map<string, { version: number; cafes: Map<string, Cafe> }>();
+
+function loadStoredSnapshot(city: string) {
+  try {
+    const stored = localStorage.getItem(SNAPSHOT_STORAGE_PREFIX + city);
+    if (!stored) return undefined;
+    const { version, cafes } = JSON.parse(stored) as { version: number; cafes: Cafe[] };
+    return { version, cafes: new Map(cafes.map((cafe) => [cafe.id, cafe])) };
+  } catch {
+    return undefined;
+  }
+}
+
+/**
+ * Every catalog cafe in a city, kept locally and brought up to date with a
+ * delta (?since=) so the list can be filtered client-side.
+ */
+export async function getCitySnapshot(city: string): Promise<Cafe[]> {
+  let local = snapshots.get(city) ?? loadStoredSnapshot(city);
+  const params = new URLSearchParams({ city });
+  if (local) params.set("since", String(local.version));
+  const data = await fetchJSON<CafeSnapshotPayload>(`${API_BASE}/api/cafes/snapshot?${params}`);
+  if (!local || data.full) local = { version: 0, cafes: new Map() };
+  for (const id of data.deleted) local.cafes.delete(id);
+  for (const row of data.cafes) {
+    const cafe = Object.fromEntries(data.fields.map((field, i) => [field, row[i]])) as Cafe;
+    local.cafes.set(cafe.id, cafe);
+  }
+  const changed = local.version !== data.version;
+  local.version = data.version;
+  snapshots.set(city, local);
+  if (changed) {
+    try {
+      localStorage.setItem(
+        SNAPSHOT_STORAGE_PREFIX + city,
+        JSON.stringify({ version: local.version, cafes: [...local.cafes.values()] })
+      );
+    } catch {
+      // Storage full or unavailable: the in-memory copy still works.
+    }
+  }
+  return [...local.cafes.values()];
+}
+
 export async function getAreas() {
   const data = await fetchJSON<{ areas: Area[] }>(`${API_BASE}/api/areas`);
   return data.areas;
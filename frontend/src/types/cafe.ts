@@ -33,17 +33,48 @@ export interface CafeRecommendation {
   distance_km: number | null;
 }
 
+/** [lat, lng, cafe count, zoom at which the cluster splits] */
+export type TileCluster = [number, number, number, number];
+/** [id, name, lat, lng] */
+export type TilePoint = [string, string, number, number];
+
+/** One map tile of /api/cafes/tiles/{z}/{x}/{y}. */
+export interface CafeTile {
+  z: number;
+  x: number;
+  y: number;
+  clusters: TileCluster[];
+  points: TilePoint[];
+}
+
+/** /api/cafes/snapshot: cafes are arrays in the order of `fields`. */
+export interface CafeSnapshotPayload {
+  city: string;
+  version: number;
+  since: number | null;
+  full: boolean;
+  fields: (keyof Cafe)[];
+  cafes: unknown[][];
+  deleted: string[];
+}
+
+/** attribute -> value -> cafe count */
+export type AttributeCounts = Record<string, Record<string, number>>;
+
 export interface District {
   name: string;
+  cafe_count?: number;
   mrt_stations: string[];
+  attributes?: AttributeCounts;
 }
 
 export interface Area {
   city: string;
-  cafe_count: number;
+  cafe_count: number | null;
   city_name: string;
   districts: District[];
   mrt_stations: string[];
+  attributes?: AttributeCounts;
 }
 
 export interface Filters {
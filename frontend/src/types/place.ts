@@ -1,3 +1,23 @@
+/** Cafe Nomad attributes of the cafe a Places result was matched to. */
+export interface LocalAttributes {
+  cafenomad_id: string;
+  wifi: number;
+  socket: number;
+  quiet: number;
+  tasty: number;
+  cheap: number;
+  music: number;
+  seat: number;
+  has_wifi: boolean;
+  has_socket: boolean;
+  quiet_level: string;
+  price: number;
+  limited_time: string;
+  standing_desk: string;
+  open_time: string;
+  mrt_station: string;
+}
+
 export interface Place {
   id: string;
   name: string;
@@ -16,10 +36,12 @@ export interface Place {
   transit_name?: string;
   transit_distance_km?: number;
   transit_walk_minutes?: number;
+  local?: LocalAttributes;
 }
 
 export interface PlaceRecommendation {
   cafe: Place;
   score: number | null;
   distance_km: number | null;
+  rank?: number;
 }